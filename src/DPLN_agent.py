@@ -1,30 +1,55 @@
 import json
-from pyexpat.errors import messages
+import logging
+import time
 import utilities.config as config
-import pprint
+from utilities.ContextPacker import ContextPacker
+from utilities.Metrics import MetricsCallbackHandler, registry
 
 #Langchain core
 import langchain
 import langchain_core
-from langchain.tools import tool
+from langchain_core.messages import AIMessageChunk, ToolMessage
+from langchain_core.tools import StructuredTool
 import langchain.agents
 ## LLM and Embeddings
-from langchain_mistralai import MistralAIEmbeddings, ChatMistralAI
-from utilities.MyEmbeddings import MyEmbeddings
+from langchain_mistralai import ChatMistralAI
 
 
 
 ## Custom tools
-import RAG_tool
+import rag_tool as RAG_tool
+from pydantic import BaseModel, Field
+from typing import AsyncIterator, Iterator, List, Tuple
+
+
+class RetrievalRequest(BaseModel):
+    """Une recherche de l'outil retrieve_documents."""
+    query: str = Field(description="La requête de l'utilisateur.")
+    type: str = Field(description="Le type d'information à récupérer (dungeon ou quest).")
+    subject_name: str = Field(default="", description="(optionel) Le nom du donjon ou de la quête à filtrer.")
 
 class DPLNAgent:
-    def __init__(self, model_name="magistral-small-latest", config_file="config/config.json", **kwargs):
+    def __init__(self, model_name="magistral-small-latest", config_file="config/config.json", async_db: bool = False, embeddings=None, warmup: bool = False, result_cache_size: int = 0, semantic_cache_threshold: float = None, context_token_budget: int = 1500, context_candidates: int = 3, subject_cache_size: int = 0, shared_chunks: bool = False, **kwargs):
         """Initialise l'agent RAG avec les outils et configurations spécifiés.
         
         Args:
+            async_db: Ouvre aussi la base avec le pilote asynchrone, pour ainvoke.
+            embeddings: Instance de MyEmbeddings préchargée (voir preload.py), partagée entre workers.
+            warmup: Charge le modèle d'embedding et les index en arrière-plan dès la construction.
+            result_cache_size: Taille du cache de résultats de RAGTool (0 = désactivé, par défaut). Une fois
+                activé, un résultat peut rester servi jusqu'à `RAGTool.generation_check_interval` secondes (5) après
+                une réingestion de sa collection, le temps que RAGTool relise la génération.
+            semantic_cache_threshold: Seuil cosinus du niveau sémantique de ce cache (None = désactivé).
+            context_token_budget: Budget de tokens du contexte retourné par chaque appel d'outil.
+            context_candidates: Nombre de chunks récupérés par recherche, avant déduplication et MMR (3 par défaut,
+                comme RAGTool ; davantage de candidats laisse à MMR de quoi diversifier le contexte).
+            subject_cache_size: Nombre de donjons et quêtes dont les chunks restent en mémoire pour les
+                recherches filtrées (0 = désactivé, par défaut : toujours interroger Atlas).
+            shared_chunks: Collections ingérées avec déduplication des chunks (filtre sur "titles").
             **kwargs: Arguments additionnels pour la création de l'agent.
         """
         self.mongo_connection = config.setup_PATH_and_connect_to_local_mongodb_db(config_file)
+        self.async_mongo_connection = config.connect_async_db(config_file) if async_db else None
         self.mistral_model = ChatMistralAI(
             model="mistral-large-latest",
             temperature=0,
@@ -33,8 +58,20 @@ class DPLNAgent:
         )
         self.retriver = RAG_tool.RAGTool(
             embedding_model="bert-base-nli-mean-tokens",
-            database=self.mongo_connection
+            k=context_candidates,
+            database=self.mongo_connection,
+            async_database=self.async_mongo_connection,
+            embeddings=embeddings,
+            warmup=warmup,
+            result_cache_size=result_cache_size,
+            semantic_cache_threshold=semantic_cache_threshold,
+            subject_cache_size=subject_cache_size,
+            shared_chunks=shared_chunks
         )
+        # Déduplication, MMR et budget de tokens des résultats envoyés au LLM
+        self.context_packer = ContextPacker(token_budget=context_token_budget)
+        # Durée des appels au LLM, à comparer aux spans rag_* des outils
+        self.metrics_callback = MetricsCallbackHandler(registry)
         self.agent = langchain.agents.create_agent(
             model=self.mistral_model,
             tools=self.get_tools(),  # Ajouter d'autres outils si nécessaire
@@ -50,12 +87,106 @@ class DPLNAgent:
         Returns:
             La réponse de l'agent.
         """
-        return self.agent.invoke(message, **kwargs)
+        with registry.span("agent_invoke"):
+            return self.agent.invoke(message, **self._with_metrics(kwargs))
+
+    async def ainvoke(self, message: str, **kwargs) -> str:
+        """Invoke l'agent avec un message de manière asynchrone.
+
+        Les outils utilisent alors leur variante asynchrone (RAGTool.aretrieve),
+        ce qui permet à un seul processus de servir de nombreuses conversations.
+        
+        Args:
+            message: Le message de l'utilisateur.
+            **kwargs: Arguments additionnels pour l'agent.
+            
+        Returns:
+            La réponse de l'agent.
+        """
+        with registry.span("agent_invoke"):
+            return await self.agent.ainvoke(message, **self._with_metrics(kwargs))
+
+    def stream(self, message, **kwargs) -> Iterator[dict]:
+        """Exécute l'agent en produisant ses événements au fil de l'eau.
+
+        Événements produits (dictionnaires, champ "type") :
+          - "tool_call" : appel d'outil décidé par le LLM (name, args, id) ;
+          - "sources" : chunks retenus par un outil (tool, id, sources [{title, section, URL}]) ;
+          - "token" : morceau de texte de la réponse (text) ;
+          - "end" : réponse complète (answer), délai du premier token et durée totale, en secondes.
+
+        Args:
+            message: L'entrée de l'agent, comme pour invoke ({"messages": [...]}).
+            **kwargs: Arguments additionnels pour l'agent.
+        """
+        state = {"start": time.perf_counter(), "first_token": None, "answer": []}
+        with registry.span("agent_stream"):
+            for mode, chunk in self.agent.stream(message, stream_mode=["updates", "messages"], **self._with_metrics(kwargs)):
+                for event in self._stream_events(mode, chunk):
+                    yield self._track(event, state)
+        yield self._end_event(state)
+
+    async def astream(self, message, **kwargs) -> AsyncIterator[dict]:
+        """Version asynchrone de stream (outils asynchrones, comme ainvoke)."""
+        state = {"start": time.perf_counter(), "first_token": None, "answer": []}
+        with registry.span("agent_stream"):
+            async for mode, chunk in self.agent.astream(message, stream_mode=["updates", "messages"], **self._with_metrics(kwargs)):
+                for event in self._stream_events(mode, chunk):
+                    yield self._track(event, state)
+        yield self._end_event(state)
+
+    @staticmethod
+    def _stream_events(mode: str, chunk) -> List[dict]:
+        """Traduit un élément du flux LangGraph en événements de `stream`."""
+        if mode == "messages":
+            message, metadata = chunk
+            # Tokens du LLM ; les messages d'outils arrivent par le mode "updates"
+            if metadata.get("langgraph_node") == "model" and isinstance(message, AIMessageChunk) and message.text:
+                return [{"type": "token", "text": message.text}]
+            return []
+
+        events = []
+        for node, update in chunk.items():
+            messages = update.get("messages", []) if isinstance(update, dict) else []
+            for msg in messages:
+                if node == "model":
+                    events.extend({"type": "tool_call", "name": call["name"], "args": call["args"], "id": call["id"]} for call in getattr(msg, "tool_calls", []))
+                elif isinstance(msg, ToolMessage):
+                    events.append({"type": "sources", "tool": msg.name, "id": msg.tool_call_id, "sources": msg.artifact or []})
+        return events
+
+    @staticmethod
+    def _track(event: dict, state: dict) -> dict:
+        """Met à jour la réponse en cours et mesure le délai du premier token."""
+        if event["type"] == "token":
+            if state["first_token"] is None:
+                state["first_token"] = time.perf_counter() - state["start"]
+                registry.observe("agent_time_to_first_token_seconds", state["first_token"])
+            state["answer"].append(event["text"])
+        elif event["type"] == "tool_call":
+            # Le texte produit avant un appel d'outil ne fait pas partie de la réponse finale
+            state["answer"] = []
+        return event
+
+    @staticmethod
+    def _end_event(state: dict) -> dict:
+        return {
+            "type": "end",
+            "answer": "".join(state["answer"]),
+            "time_to_first_token": state["first_token"],
+            "latency": time.perf_counter() - state["start"],
+        }
+
+    def _with_metrics(self, kwargs: dict) -> dict:
+        """Ajoute le callback de mesure du LLM à la configuration d'appel, sans modifier celle de l'appelant."""
+        call_config = dict(kwargs.get("config") or {})
+        call_config["callbacks"] = list(call_config.get("callbacks") or []) + [self.metrics_callback]
+        return {**kwargs, "config": call_config}
 
     def get_tools(self):
         # ---- you must wrap in a closure like this ↓ ----
-        @tool
-        def retrieve_document(query: str, type: str, subject_name: str = "") -> str:
+        # Chaque outil a une variante synchrone (invoke) et asynchrone (ainvoke)
+        def retrieve_document(query: str, type: str, subject_name: str = "") -> Tuple[str, List[dict]]:
             """Récupère des informations sur les donjons depuis la base de données MongoDB.
             
             Args:
@@ -63,15 +194,47 @@ class DPLNAgent:
                 type: Le type d'information à récupérer (dungeon ou quest).
                 subject_name: (optionel) Le nom du donjon ou de la quête à filtrer si spécifié.
             Returns:
-                Les informations récupérées sous forme de chaîne JSON.
+                Les extraits retenus, chacun précédé de sa page, sa section et son URL.
             """
             documents = self.retriver.retrieve(store_name=type, question=query, subject_name=subject_name)
 
-            return documents
+            return self.context_packer.pack_with_sources(documents)
+
+        async def aretrieve_document(query: str, type: str, subject_name: str = "") -> Tuple[str, List[dict]]:
+            documents = await self.retriver.aretrieve(store_name=type, question=query, subject_name=subject_name)
+
+            return self.context_packer.pack_with_sources(documents)
+
+        def label(r: RetrievalRequest) -> str:
+            return f"{r.type} · {r.subject_name} : {r.query}" if r.subject_name else f"{r.type} : {r.query}"
+
+        def retrieve_documents(requests: List[RetrievalRequest]) -> Tuple[str, List[dict]]:
+            """Récupère en une seule fois les informations de plusieurs recherches (donjons et/ou quêtes).
+            
+            À préférer à plusieurs appels de retrieve_document, par exemple pour un donjon et les quêtes qui le débloquent.
+            
+            Args:
+                requests: La liste des recherches, chacune avec query, type (dungeon ou quest) et subject_name optionnel.
+            Returns:
+                Les extraits retenus pour chaque recherche, dans l'ordre des recherches.
+            """
+            results = self.retriver.retrieve_many([(r.type, r.query, r.subject_name) for r in requests])
+
+            return self.context_packer.pack_many_with_sources([(label(r), docs) for r, docs in zip(requests, results)])
+
+        async def aretrieve_documents(requests: List[RetrievalRequest]) -> Tuple[str, List[dict]]:
+            results = await self.retriver.aretrieve_many([(r.type, r.query, r.subject_name) for r in requests])
+
+            return self.context_packer.pack_many_with_sources([(label(r), docs) for r, docs in zip(requests, results)])
 
-        return [retrieve_document]
+        # Le LLM ne reçoit que le contexte ; les sources retenues sont l'artefact du ToolMessage (voir stream)
+        return [
+            StructuredTool.from_function(func=retrieve_document, coroutine=aretrieve_document, response_format="content_and_artifact"),
+            StructuredTool.from_function(func=retrieve_documents, coroutine=aretrieve_documents, response_format="content_and_artifact"),
+        ]
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     agent = DPLNAgent()
     response = agent.invoke({
         "messages": [{ 
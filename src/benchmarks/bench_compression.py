@@ -0,0 +1,109 @@
+# ============================================================================
+# Benchmark - Rappel@k et mémoire des vecteurs compressés
+# ============================================================================
+#
+# Compare chaque configuration (type de stockage x dimension) à la recherche
+# exacte sur les vecteurs pleine précision : rappel@k des k plus proches
+# voisins, mémoire de la matrice locale et taille du vecteur stocké dans MongoDB.
+#
+# Usage (depuis src/):
+#   python -m benchmarks.bench_compression --texts 5000 --queries 200 --dims 384 256 128
+#   python -m benchmarks.bench_compression --synthetic 50000 --dim 768
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.bench_embeddings import make_texts
+from utilities.LocalVectorStore import LocalVectorStore
+from utilities.VectorCompression import VectorCompressor
+
+
+def load_vectors(args) -> tuple:
+    """Retourne (vecteurs des documents, vecteurs des requêtes) en pleine précision."""
+    if args.synthetic:
+        # Vecteurs de rang faible bruités, proches de la structure d'embeddings réels
+        rng = np.random.default_rng(0)
+        basis = rng.normal(size=(64, args.dim)).astype(np.float32)
+        docs = rng.normal(size=(args.synthetic, 64)).astype(np.float32) @ basis
+        docs += 0.5 * rng.normal(size=docs.shape).astype(np.float32)
+        picked = rng.choice(len(docs), args.queries, replace=False)
+        queries = docs[picked] + 0.5 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+        return docs, queries
+
+    from utilities.MyEmbeddings import MyEmbeddings
+
+    embedder = MyEmbeddings(args.model, batch_size=64)
+    docs = embedder.embed_array(make_texts(args.texts))
+    queries = embedder.embed_queries(make_texts(args.queries, seed=1))
+    return docs, queries
+
+
+def top_ids(store: LocalVectorStore, queries: np.ndarray, k: int) -> list:
+    return [[doc.id for doc in store.similarity_search_by_vector(q, k=k)] for q in queries]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rappel@k et mémoire des vecteurs compressés")
+    parser.add_argument("--model", default="bert-base-nli-mean-tokens")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--synthetic", type=int, default=0, help="Nombre de vecteurs synthétiques (0 = utiliser le modèle)")
+    parser.add_argument("--dim", type=int, default=768, help="Dimension des vecteurs synthétiques")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dtypes", nargs="+", default=["float32", "float16", "int8"])
+    parser.add_argument("--dims", nargs="+", type=int, default=[256, 128])
+    parser.add_argument("--reduction", default="pca", choices=VectorCompressor.REDUCTIONS)
+    parser.add_argument("--output", default=None, help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    docs, queries = load_vectors(args)
+    ids = [str(i) for i in range(len(docs))]
+    # Recherche exacte, sans index IVF, pour isoler l'effet de la compression
+    ann_threshold = len(docs) + 1
+
+    reference = LocalVectorStore(embedding=None, ann_threshold=ann_threshold)
+    reference.add_vectors(ids, docs, ids=ids)
+    expected = top_ids(reference, queries, args.k)
+    baseline_bytes = reference._matrix[:len(reference)].nbytes
+    print(f"Référence float32 : {docs.shape[1]} dimensions, {baseline_bytes / 2**20:.1f} Mo, {docs.shape[1] * 8} octets/vecteur dans MongoDB")
+
+    results = []
+    for dim in [None] + args.dims:
+        for dtype in args.dtypes:
+            if dim is None and dtype == "float32":
+                continue
+            compressor = VectorCompressor(dtype, dim=dim, reduction=args.reduction).fit(docs)
+            store = LocalVectorStore(embedding=None, ann_threshold=ann_threshold, dtype=dtype)
+            store.add_vectors(ids, compressor.transform(docs), ids=ids)
+
+            start = time.perf_counter()
+            found = top_ids(store, compressor.transform(queries), args.k)
+            elapsed = time.perf_counter() - start
+
+            recall = float(np.mean([len(set(e) & set(f)) / len(e) for e, f in zip(expected, found)]))
+            memory = store._matrix[:len(store)].nbytes + (store._scales[:len(store)].nbytes if dtype == "int8" else 0)
+            # Le float16 est stocké en float32 dans MongoDB (pas de float16 en BSON)
+            mongo_bytes = compressor.output_dim * (1 if dtype == "int8" else 4)
+            result = {
+                "dtype": dtype,
+                "dim": compressor.output_dim,
+                "reduction": args.reduction if dim is not None else None,
+                f"recall@{args.k}": recall,
+                "matrix_bytes": memory,
+                "memory_ratio": memory / baseline_bytes,
+                "mongo_bytes_per_vector": mongo_bytes,
+                "query_ms": 1000 * elapsed / len(queries),
+            }
+            results.append(result)
+            print(f"{dtype:<8} dim={compressor.output_dim:<5} rappel@{args.k}={recall:.3f}  mémoire x{result['memory_ratio']:.3f}  {mongo_bytes} octets/vecteur MongoDB  {result['query_ms']:.2f} ms/requête")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
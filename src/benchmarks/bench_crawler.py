@@ -0,0 +1,134 @@
+# ============================================================================
+# Benchmark - Crawl complet contre un serveur HTTP local (hors ligne)
+# ============================================================================
+#
+# Génère un faux site au format dofuspourlesnoobs, le sert en local avec
+# ETag / Last-Modified, puis mesure un crawl à froid et un recrawl conditionnel.
+#
+# Usage (depuis src/):
+#   python -m benchmarks.bench_crawler --dungeons 200 --successes 40 --quests-per-success 10
+
+import argparse
+import hashlib
+import json
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from benchmarks.corpus import PAGE_TEMPLATE
+from utilities.Crawler import DPLNCrawler
+
+
+def build_site(root: Path, dungeons: int, successes: int, quests_per_success: int, section_words: int = 200):
+    """Écrit un faux site statique dans `root`."""
+    filler = " ".join(["Le boss invoque des monstres et pousse les alliés."] * (section_words // 9))
+
+    rows = []
+    for d in range(dungeons):
+        link = f"/donjon-{d}.html"
+        rows.append(f"<tr><td>{d}</td><td><a href=\"{link}\">Donjon {d}</a></td><td>{10 + d % 190}</td></tr>")
+        sections = "".join(f"<h3>Salle {s}</h3><p>{filler}</p>" for s in range(4))
+        (root / link.lstrip("/")).write_text(PAGE_TEMPLATE.format(title=f"Donjon {d}", body=sections), encoding="utf-8")
+    (root / "donjons.html").write_text(
+        f"<html><body><table id=\"trier\"><tbody>{''.join(rows)}</tbody></table></body></html>", encoding="utf-8"
+    )
+
+    groups = []
+    for s in range(successes):
+        success_link = f"/succes-{s}.html"
+        groups.append(f"<div class=\"paragraph\"><a href=\"{success_link}\">Succès {s}</a></div>")
+        quest_links = []
+        for q in range(quests_per_success):
+            quest_link = f"/quete-{s}-{q}.html"
+            quest_links.append(f"<a href=\"{quest_link}\">Quête {s}-{q}</a>")
+            steps = "".join(f"<h3>Étape {e}</h3><p>{filler}</p>" for e in range(3))
+            (root / quest_link.lstrip("/")).write_text(PAGE_TEMPLATE.format(title=f"Quête {s}-{q}", body=steps), encoding="utf-8")
+        (root / success_link.lstrip("/")).write_text(PAGE_TEMPLATE.format(title=f"Succès {s}", body=" ".join(quest_links)), encoding="utf-8")
+
+    column = f"<td class=\"wsite-multicol-col\"><div class=\"paragraph\">Groupe</div>{''.join(groups)}</td>"
+    tables = "".join(f"<table class=\"wsite-multicol-table\"><tr>{column if i == 0 else ''}</tr></table>" for i in range(3))
+    tables += "<table class=\"wsite-multicol-table\"><tr><td class=\"wsite-multicol-col\"></td></tr></table>"
+    (root / "classeacutees-par-succegraves.html").write_text(f"<html><body>{tables}</body></html>", encoding="utf-8")
+
+
+class ConditionalHandler(SimpleHTTPRequestHandler):
+    """Sert des fichiers statiques avec ETag et réponses 304."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        path = Path(self.translate_path(self.path))
+        if path.is_file():
+            data = path.read_bytes()
+            etag = '"' + hashlib.md5(data).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return None
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", formatdate(path.stat().st_mtime, usegmt=True))
+            self.end_headers()
+            self.wfile.write(data)
+            return None
+        return super().send_head()
+
+
+def serve(root: Path) -> ThreadingHTTPServer:
+    """Démarre le serveur local sur un port libre."""
+    handler = lambda *args, **kwargs: ConditionalHandler(*args, directory=str(root), **kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du crawler contre un serveur local")
+    parser.add_argument("--dungeons", type=int, default=100)
+    parser.add_argument("--successes", type=int, default=20)
+    parser.add_argument("--quests-per-success", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rps", type=float, default=0, help="Débit max par hôte (0 = illimité)")
+    parser.add_argument("--output", default=None, help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        site = tmp / "site"
+        site.mkdir()
+        build_site(site, args.dungeons, args.successes, args.quests_per_success)
+        server = serve(site)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        results = []
+        for label in ["cold", "conditional"]:
+            crawler = DPLNCrawler(
+                output_dir=str(tmp / "out"),
+                base_url=base_url,
+                cache_dir=str(tmp / "cache"),
+                concurrency=args.concurrency,
+                requests_per_second=args.rps,
+            )
+            start = time.perf_counter()
+            stats = crawler.run()
+            elapsed = time.perf_counter() - start
+            stats.update({"run": label, "pages_per_sec": stats["requests"] / elapsed})
+            results.append(stats)
+            print(f"{label:<12} {stats['requests']} requêtes, {stats['not_modified']} x 304, {stats['pages_per_sec']:.1f} pages/s")
+
+        server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# ============================================================================
+# Benchmark - Débit d'encodage de MyEmbeddings (textes/seconde)
+# ============================================================================
+#
+# Usage (depuis src/):
+#   python -m benchmarks.bench_embeddings --texts 2000 --batch-size 64 --workers 4
+
+import argparse
+import json
+import random
+import time
+
+from utilities.MyEmbeddings import MyEmbeddings
+
+
+WORDS = [
+    "donjon", "quête", "boss", "salle", "monstre", "sort", "invocation", "pa", "pm",
+    "résistance", "tacle", "poussée", "bouclier", "Aquadôme", "Merkator", "Katrepat",
+    "succès", "idole", "challenge", "zone", "kralamoure", "dofus", "parchemin", "clef",
+]
+
+
+def make_texts(count: int, seed: int = 0) -> list:
+    """Génère des textes pseudo-aléatoires de longueurs variées."""
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(20, 300))) for _ in range(count)]
+
+
+def run(texts: list, embedder: MyEmbeddings, label: str, fn) -> dict:
+    """Mesure le débit d'une fonction d'encodage."""
+    start = time.perf_counter()
+    fn(texts)
+    elapsed = time.perf_counter() - start
+    result = {"mode": label, "texts": len(texts), "seconds": elapsed, "texts_per_sec": len(texts) / elapsed}
+    print(f"{label:<24} {result['texts_per_sec']:>10.1f} textes/s ({elapsed:.2f}s)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du débit d'encodage de MyEmbeddings")
+    parser.add_argument("--model", default="bert-base-nli-mean-tokens")
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts)
+    embedder = MyEmbeddings(args.model, batch_size=args.batch_size, num_workers=0)
+    # Échauffement pour ne pas mesurer le premier chargement des poids
+    embedder.embed_array(texts[:8])
+
+    results = [
+        run(texts, embedder, "per-text (legacy)", lambda ts: [embedder.model.encode(t).tolist() for t in ts]),
+        run(texts, embedder, f"batched bs={args.batch_size}", embedder.embed_array),
+    ]
+    if args.workers > 1:
+        embedder.num_workers = args.workers
+        # Démarrage du pool hors mesure
+        embedder.embed_array(texts[:args.batch_size + 1])
+        results.append(run(texts, embedder, f"pool x{args.workers}", embedder.embed_array))
+        embedder.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
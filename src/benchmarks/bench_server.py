@@ -0,0 +1,147 @@
+# ============================================================================
+# Benchmark - Serveur de recherche en micro-lots face à retrieve par requête
+# ============================================================================
+#
+# Même corpus synthétique et même magasin local que bench_suite. Pour chaque
+# niveau de concurrence, N clients envoient des questions en boucle :
+#   - "direct" : chaque requête appelle RAGTool.retrieve dans un thread, comme
+#     les appels d'outils concurrents de l'agent (un encodage par question) ;
+#   - "server" : chaque client passe par retrieval_server (socket Unix), qui
+#     regroupe les requêtes concurrentes en micro-lots.
+# Le débit (requêtes/s) et la latence p50/p95/p99 sont comparés. L'écart n'est
+# représentatif qu'avec un vrai modèle (--model), l'encodage des embeddings
+# déterministes étant presque gratuit.
+#
+# Usage (depuis src/):
+#   python -m benchmarks.bench_server --model sentence-transformers/all-MiniLM-L6-v2 --concurrency 1 8 32 64
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks.bench_suite import LISTS, STORES, ingest, percentiles
+from benchmarks.corpus import make_corpus
+from benchmarks.fakes import FakeEmbeddings, InMemoryDatabase
+from rag_tool import RAGTool
+from retrieval_server import MicroBatcher, RetrievalClient, serve
+from utilities.MyEmbeddings import MyEmbeddings
+
+
+async def run_clients(concurrency: int, requests_per_client: int, questions: list, send) -> dict:
+    """Lance `concurrency` clients qui envoient chacun `requests_per_client` questions à la suite."""
+    timings, batch_sizes = [], []
+
+    async def client(index: int):
+        rng = random.Random(index)
+        for _ in range(requests_per_client):
+            q = rng.choice(questions)
+            start = time.perf_counter()
+            batch_size = await send(index, q)
+            timings.append(time.perf_counter() - start)
+            if batch_size is not None:
+                batch_sizes.append(batch_size)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(i) for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    result = {"requests": len(timings), "throughput_rps": len(timings) / elapsed, **percentiles(timings)}
+    if batch_sizes:
+        result["mean_batch_size"] = sum(batch_sizes) / len(batch_sizes)
+    return result
+
+
+async def bench_direct(tool: RAGTool, concurrency: int, requests_per_client: int, questions: list) -> dict:
+    """Chemin actuel : un appel à retrieve (donc un encodage) par requête, dans un pool de threads."""
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        async def send(_, q):
+            await loop.run_in_executor(executor, tool.retrieve, q["store"], q["question"], q["subject"])
+        return await run_clients(concurrency, requests_per_client, questions, send)
+
+
+async def bench_server(tool: RAGTool, concurrency: int, requests_per_client: int, questions: list, socket_path: str, args) -> dict:
+    """Chemin serveur : une connexion par client, requêtes regroupées en micro-lots."""
+    batcher = MicroBatcher(tool, max_batch_size=args.max_batch, max_wait=args.max_wait_ms / 1000)
+    server = await serve(batcher, unix_path=socket_path)
+    clients = [await RetrievalClient.connect(unix_path=socket_path) for _ in range(concurrency)]
+
+    async def send(index, q):
+        response = await clients[index].retrieve_raw(q["store"], q["question"], q["subject"])
+        return response["batch_size"]
+
+    try:
+        return await run_clients(concurrency, requests_per_client, questions, send)
+    finally:
+        for client in clients:
+            await client.close()
+        server.close()
+        await server.wait_closed()
+        await batcher.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit et latence du serveur en micro-lots face à retrieve par requête")
+    parser.add_argument("--pages", type=int, default=200, help="Pages par magasin")
+    parser.add_argument("--sections", type=int, default=4)
+    parser.add_argument("--model", default=None, help="Modèle SentenceTransformer local (défaut : embeddings déterministes)")
+    parser.add_argument("--dim", type=int, default=256, help="Dimension des embeddings déterministes")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests-per-client", type=int, default=20)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--hybrid", action="store_true", help="Recherche hybride (BM25 + vecteurs)")
+    parser.add_argument("--output", default=None, help="Fichier JSON de sortie")
+    args = parser.parse_args()
+    # Options attendues par bench_suite.ingest
+    args.conversion_workers, args.chunk_max_tokens, args.dedup_threshold = 1, None, None
+
+    embeddings = MyEmbeddings(args.model) if args.model else FakeEmbeddings(args.dim)
+    results = {"config": vars(args), "embedding_model": embeddings.model_name, "levels": []}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        questions, titles = [], {}
+        for seed, store_name in enumerate(STORES):
+            labelled = make_corpus(root / "rawData" / store_name, store_name, args.pages, args.sections, seed=seed)
+            titles[store_name] = sorted({q["title"] for q in labelled})
+            questions += labelled
+        with open(os.devnull, "w") as devnull, contextlib.chdir(root), contextlib.redirect_stdout(devnull):
+            ingest(root, embeddings, args)
+
+        database = InMemoryDatabase()
+        for store_name, list_name in LISTS.items():
+            database[list_name].insert_many([{"title": t} for t in titles[store_name]])
+
+        # Sans cache de requêtes : chaque question est réencodée, comme des questions distinctes
+        embeddings.query_cache_size = 0
+        tool = RAGTool(
+            database, vector_backend="local", local_store_dir=str(root / "local"),
+            bm25_dir=str(root / "bm25") if args.hybrid else None, embeddings=embeddings,
+        )
+        tool.warmup()
+
+        for concurrency in args.concurrency:
+            direct = asyncio.run(bench_direct(tool, concurrency, args.requests_per_client, questions))
+            server = asyncio.run(bench_server(tool, concurrency, args.requests_per_client, questions, str(root / "rag.sock"), args))
+            results["levels"].append({"concurrency": concurrency, "direct": direct, "server": server})
+            print(
+                f"concurrence {concurrency:>3}  "
+                f"direct {direct['throughput_rps']:8.1f} req/s p50={direct['p50_ms']:7.2f} ms p99={direct['p99_ms']:7.2f} ms  |  "
+                f"serveur {server['throughput_rps']:8.1f} req/s p50={server['p50_ms']:7.2f} ms p99={server['p99_ms']:7.2f} ms "
+                f"(lots de {server['mean_batch_size']:.1f})"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
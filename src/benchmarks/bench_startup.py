@@ -0,0 +1,112 @@
+# ============================================================================
+# Benchmark - Temps d'import et temps jusqu'à la première réponse
+# ============================================================================
+#
+# Chaque mesure s'exécute dans un interpréteur neuf. Le temps jusqu'à la
+# première réponse utilise le backend "local" sur un petit corpus synthétique,
+# avec et sans préchauffage en arrière-plan (`--think-time` simule la latence
+# du LLM avant le premier appel d'outil).
+#
+# Usage (depuis src/):
+#   python -m benchmarks.bench_startup --repeat 5 --think-time 1.5
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.bench_embeddings import make_texts
+
+
+IMPORT_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+FIRST_ANSWER_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from rag_tool import RAGTool
+imported = time.perf_counter()
+tool = RAGTool(None, {model!r}, vector_backend="local", local_store_dir={store_dir!r}, warmup={warmup!r})
+constructed = time.perf_counter()
+time.sleep({think_time!r})
+before = time.perf_counter()
+tool.retrieve("dungeon", "Comment battre le boss du donjon ?")
+end = time.perf_counter()
+print(json.dumps({{
+    "import": imported - start,
+    "construct": constructed - imported,
+    "first_retrieve": end - before,
+    "first_answer": end - start - {think_time!r},
+}}))
+"""
+
+
+def run_child(script: str, cwd: Path) -> dict:
+    """Exécute un script dans un nouvel interpréteur et lit sa dernière ligne JSON."""
+    completed = subprocess.run([sys.executable, "-c", script], cwd=cwd, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "échec"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs: list, key: str) -> dict:
+    values = [r[key] for r in runs if "error" not in r]
+    if not values:
+        return {"error": next(r["error"] for r in runs)}
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+
+def build_store(store_dir: Path, model: str, documents: int):
+    """Écrit un instantané local des deux magasins (non mesuré)."""
+    from utilities.LocalVectorStore import LocalVectorStore
+    from utilities.MyEmbeddings import MyEmbeddings
+
+    embeddings = MyEmbeddings(model)
+    texts = make_texts(documents)
+    metadatas = [{"title": f"Donjon {i % 50}"} for i in range(documents)]
+    for name in ["Vec_Dungeons", "Vec_Quests"]:
+        store = LocalVectorStore.from_texts(texts, embeddings, metadatas=metadatas, path=str(store_dir / name))
+        store.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage (imports, première réponse)")
+    parser.add_argument("--model", default="bert-base-nli-mean-tokens")
+    parser.add_argument("--modules", nargs="+", default=["rag_tool", "DPLN_agent", "utilities.DocumentLoader"])
+    parser.add_argument("--documents", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--think-time", type=float, default=1.0, help="Délai simulé avant le premier appel d'outil")
+    parser.add_argument("--output", default=None, help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    src_dir = Path(__file__).resolve().parent.parent
+    results = {"imports": {}, "first_answer": {}}
+
+    for module in args.modules:
+        runs = [run_child(IMPORT_SCRIPT.format(module=module), src_dir) for _ in range(args.repeat)]
+        results["imports"][module] = summarize(runs, "seconds")
+        print(f"import {module:<28} {results['imports'][module]}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store_dir = Path(tmp)
+        build_store(store_dir, args.model, args.documents)
+        for label, warmup, think_time in [("lazy", False, 0.0), ("lazy+think", False, args.think_time), ("warmup+think", True, args.think_time)]:
+            script = FIRST_ANSWER_SCRIPT.format(model=args.model, store_dir=str(store_dir), warmup=warmup, think_time=think_time)
+            runs = [run_child(script, src_dir) for _ in range(args.repeat)]
+            results["first_answer"][label] = {key: summarize(runs, key) for key in ["import", "construct", "first_retrieve", "first_answer"]}
+            print(f"{label:<14} {results['first_answer'][label]}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+# ============================================================================
+# Benchmark - Suite hors ligne : ingestion, latence de retrieve, rappel@k
+# ============================================================================
+#
+# Aucun identifiant requis : corpus synthétique, embeddings déterministes
+# (ou un petit modèle local avec --model), magasin "local" en mémoire et
+# collections List_* en mémoire (ou un MongoDB local avec --mongo-uri).
+#
+# Mesures :
+#   - ingestion : documents/s de DocumentProcessor.process_folder ;
+#   - retrieve : latence p50/p95/p99 de bout en bout et par étape
+#     (résolution du sujet, embedding, recherche vectorielle, BM25, fusion) ;
+#   - get_best_name : coût par requête et taux de bonne résolution ;
+#   - rappel@k sur les questions étiquetées, en vectoriel seul et en hybride ;
+#   - latence de retrieve sur des questions répétées, avec le cache de résultats ;
+#   - tokens envoyés au LLM avant et après ContextPacker, et rappel après sélection.
+#
+# Usage (depuis src/):
+#   python -m benchmarks.bench_suite --pages 300 --questions 300 --output bench.json
+#   python -m benchmarks.bench_suite --model sentence-transformers/all-MiniLM-L6-v2
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.corpus import make_corpus
+from benchmarks.fakes import FakeEmbeddings, InMemoryDatabase
+from rag_tool import RAGTool
+from utilities.BM25Index import reciprocal_rank_fusion
+from utilities.ContextPacker import ContextPacker, estimate_tokens
+from utilities.DocumentLoader import DocumentProcessor
+from utilities.Metrics import registry
+from utilities.MyEmbeddings import MyEmbeddings
+
+
+STORES = {"dungeon": "Vec_Dungeons", "quest": "Vec_Quests"}
+LISTS = {"dungeon": "List_Dungeons", "quest": "List_Quests"}
+
+
+def percentiles(values: list) -> dict:
+    values = np.asarray(values, dtype=np.float64) * 1000
+    if len(values) == 0:
+        return {}
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+    }
+
+
+def is_hit(docs: list, question: dict) -> bool:
+    return any(
+        question["title"] in (d.metadata.get("titles") or [d.metadata.get("title")]) and d.metadata.get("filename") == question["filename"]
+        for d in docs
+    )
+
+
+def ingest(root: Path, embeddings, args) -> dict:
+    """Ingère les deux dossiers du corpus dans le magasin local et l'index BM25."""
+    results = {}
+    for store_name, collection_name in STORES.items():
+        # Pas de close() : il fermerait le modèle d'embedding partagé avec RAGTool
+        processor = DocumentProcessor(
+            "mongodb://localhost:27017",
+            collection_name=collection_name,
+            vector_backend="local",
+            local_store_dir=str(root / "local"),
+            bm25_dir=str(root / "bm25"),
+            conversion_workers=args.conversion_workers,
+            embeddings=embeddings,
+            chunk_max_tokens=args.chunk_max_tokens,
+            dedup_threshold=args.dedup_threshold,
+            dedup_dir=str(root / "dedup"),
+        )
+        start = time.perf_counter()
+        stats = processor.process_folder(str(root / "rawData" / store_name))
+        elapsed = time.perf_counter() - start
+        results[store_name] = {
+            "pages": args.pages,
+            "documents": stats["total_doc_ids"],
+            "seconds": elapsed,
+            "docs_per_sec": stats["total_doc_ids"] / elapsed,
+            "pipeline_docs_per_sec": stats["docs_per_sec"],
+            "truncation": stats.get("truncation"),
+            "dedup": stats.get("dedup"),
+        }
+    return results
+
+
+def title_resolution(tool: RAGTool, questions: list) -> dict:
+    """Coût de get_best_name (index à jour, sans rechargement) et taux de bonne résolution."""
+    with_subject = [q for q in questions if q["subject"]]
+    timings, correct = [], 0
+    for q in with_subject:
+        start = time.perf_counter()
+        best = tool.get_best_name(q["store"], q["subject"], refresh=False)
+        timings.append(time.perf_counter() - start)
+        correct += best == q["title"]
+    return {"queries": len(with_subject), "accuracy": correct / max(1, len(with_subject)), **percentiles(timings)}
+
+
+def staged_retrieve(tool: RAGTool, q: dict, stages: dict) -> list:
+    """Reproduit RAGTool.retrieve en chronométrant chaque étape."""
+    start = time.perf_counter()
+    subject = tool.get_best_name(q["store"], q["subject"]) if q["subject"] else None
+    stages["resolve_subject"].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    vector = tool.embedding_model.embed_query(q["question"])
+    query_vector = tool._transform_query(q["store"], vector)
+    stages["embed_query"].append(time.perf_counter() - start)
+
+    hybrid = q["store"] in tool.bm25_indexes
+    pre_filter = {"title": subject} if subject is not None else None
+    start = time.perf_counter()
+    vector_docs = tool._get_vector_store(q["store"]).similarity_search_by_vector(
+        query_vector, k=tool.hybrid_fetch_k if hybrid else tool.k, pre_filter=pre_filter
+    )
+    stages["vector_search"].append(time.perf_counter() - start)
+    if not hybrid:
+        return vector_docs
+
+    start = time.perf_counter()
+    lexical_docs = tool._lexical_search(q["store"], q["question"], subject)
+    stages["lexical_search"].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    docs = reciprocal_rank_fusion([vector_docs, lexical_docs], k=tool.k)
+    stages["fusion"].append(time.perf_counter() - start)
+    return docs
+
+
+def evaluate(tool: RAGTool, questions: list, k: int) -> dict:
+    """Latence de bout en bout et par étape, et rappel@k de retrieve."""
+    totals, hits = [], 0
+    for q in questions:
+        start = time.perf_counter()
+        docs = tool.retrieve(q["store"], q["question"], q["subject"])
+        totals.append(time.perf_counter() - start)
+        hits += is_hit(docs[:k], q)
+
+    stages = {name: [] for name in ["resolve_subject", "embed_query", "vector_search", "lexical_search", "fusion"]}
+    for q in questions:
+        staged_retrieve(tool, q, stages)
+
+    return {
+        f"recall@{k}": hits / len(questions),
+        "retrieve": percentiles(totals),
+        "stages": {name: percentiles(values) for name, values in stages.items() if values},
+    }
+
+
+def cached_retrieval(tool: RAGTool, questions: list) -> dict:
+    """Latence de retrieve au premier passage, puis au second, servi par le cache de résultats."""
+    passes = {}
+    for name in ["cold", "warm"]:
+        timings = []
+        for q in questions:
+            start = time.perf_counter()
+            tool.retrieve(q["store"], q["question"], q["subject"])
+            timings.append(time.perf_counter() - start)
+        passes[name] = percentiles(timings)
+    return {**passes, "cache": tool.result_cache.stats()}
+
+
+def context_packing(tool: RAGTool, questions: list, token_budget: int) -> dict:
+    """Tokens du résultat brut de l'outil (str des documents) et du contexte compact, et rappel après sélection."""
+    packer = ContextPacker(token_budget=token_budget)
+    raw, packed, timings, raw_hits, hits = [], [], [], 0, 0
+    for q in questions:
+        docs = tool.retrieve(q["store"], q["question"], q["subject"])
+        raw.append(estimate_tokens(str(docs)))
+        raw_hits += is_hit(docs, q)
+        start = time.perf_counter()
+        context = packer.pack(docs)
+        timings.append(time.perf_counter() - start)
+        packed.append(estimate_tokens(context))
+        hits += f"{q['title']} › {q['filename'].replace('_', ' ')}" in context
+    return {
+        "raw_tokens_mean": float(np.mean(raw)),
+        "packed_tokens_mean": float(np.mean(packed)),
+        "packed_tokens_max": int(max(packed)),
+        f"recall@{tool.k}_before": raw_hits / len(questions),
+        "recall_after": hits / len(questions),
+        "pack": percentiles(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de benchmarks hors ligne (ingestion et recherche)")
+    parser.add_argument("--pages", type=int, default=200, help="Pages par magasin")
+    parser.add_argument("--sections", type=int, default=4)
+    parser.add_argument("--questions", type=int, default=200, help="Questions par magasin")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--model", default=None, help="Modèle SentenceTransformer local (défaut : embeddings déterministes)")
+    parser.add_argument("--dim", type=int, default=256, help="Dimension des embeddings déterministes")
+    parser.add_argument("--mongo-uri", default=None, help="MongoDB local pour les collections List_* (défaut : en mémoire)")
+    parser.add_argument("--conversion-workers", type=int, default=1)
+    parser.add_argument("--chunk-max-tokens", type=int, default=None, help="Chunks bornés en tokens (défaut : un chunk par section H3)")
+    parser.add_argument("--dedup-threshold", type=float, default=None, help="Seuil MinHash de déduplication des chunks à l'ingestion")
+    parser.add_argument("--batch-tokens", type=int, default=None, help="Tokens par passe du modèle, lots triés par longueur")
+    parser.add_argument("--context-budget", type=int, default=1500, help="Budget de tokens de ContextPacker")
+    parser.add_argument("--context-candidates", type=int, default=8, help="Chunks récupérés avant ContextPacker")
+    parser.add_argument("--semantic-threshold", type=float, default=None, help="Seuil du niveau sémantique du cache de résultats")
+    parser.add_argument("--output", default=None, help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    embeddings = MyEmbeddings(args.model, batch_tokens=args.batch_tokens) if args.model else FakeEmbeddings(args.dim, batch_tokens=args.batch_tokens)
+    results = {"config": vars(args), "embedding_model": embeddings.model_name}
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        questions, titles = [], {}
+        for seed, store_name in enumerate(STORES):
+            labelled = make_corpus(root / "rawData" / store_name, store_name, args.pages, args.sections, seed=seed)
+            titles[store_name] = sorted({q["title"] for q in labelled})
+            questions += rng.sample(labelled, min(args.questions, len(labelled)))
+
+        # Les sorties console et stats.json de DocumentProcessor restent dans le dossier temporaire
+        with open(os.devnull, "w") as devnull, contextlib.chdir(root), contextlib.redirect_stdout(devnull):
+            results["ingest"] = ingest(root, embeddings, args)
+        for store_name, stats in results["ingest"].items():
+            print(f"ingestion {store_name:<8} {stats['documents']} documents, {stats['docs_per_sec']:.1f} documents/s")
+            if stats["dedup"]:
+                print(f"          {'':<8} {stats['dedup']['duplicates']} chunks dédupliqués, ~{stats['dedup']['saved_embed_seconds']:.2f}s d'encodage évitées")
+
+        if args.mongo_uri:
+            from pymongo import MongoClient
+            database = MongoClient(args.mongo_uri)["DPLN_RAG_bench"]
+            for name in LISTS.values():
+                database[name].drop()
+        else:
+            database = InMemoryDatabase()
+        for store_name, list_name in LISTS.items():
+            database[list_name].insert_many([{"title": t} for t in titles[store_name]])
+
+        # Sans cache de requêtes, pour mesurer l'encodage de chaque question
+        embeddings.query_cache_size = 0
+        results["retrieval"] = {}
+        for mode, bm25_dir in [("vector", None), ("hybrid", str(root / "bm25"))]:
+            tool = RAGTool(
+                database, vector_backend="local", local_store_dir=str(root / "local"), bm25_dir=bm25_dir, embeddings=embeddings, k=args.k,
+                shared_chunks=args.dedup_threshold is not None,
+            )
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                tool.warmup()
+                if mode == "vector":
+                    results["title_resolution"] = title_resolution(tool, questions)
+                results["retrieval"][mode] = evaluate(tool, questions, args.k)
+            summary = results["retrieval"][mode]
+            print(f"retrieve {mode:<8} rappel@{args.k}={summary[f'recall@{args.k}']:.3f}  p50={summary['retrieve']['p50_ms']:.2f} ms  p95={summary['retrieve']['p95_ms']:.2f} ms  p99={summary['retrieve']['p99_ms']:.2f} ms")
+
+        tool = RAGTool(
+            database, vector_backend="local", local_store_dir=str(root / "local"), bm25_dir=str(root / "bm25"),
+            embeddings=embeddings, k=args.k, result_cache_size=len(questions), semantic_cache_threshold=args.semantic_threshold,
+            shared_chunks=args.dedup_threshold is not None,
+        )
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            tool.warmup()
+            results["cached_retrieval"] = cached = cached_retrieval(tool, questions)
+        print(f"retrieve cache    premier passage p50={cached['cold']['p50_ms']:.2f} ms, second passage p50={cached['warm']['p50_ms']:.3f} ms")
+
+        tool = RAGTool(
+            database, vector_backend="local", local_store_dir=str(root / "local"), bm25_dir=str(root / "bm25"),
+            embeddings=embeddings, k=args.context_candidates, shared_chunks=args.dedup_threshold is not None,
+        )
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            tool.warmup()
+            results["context_packing"] = packing = context_packing(tool, questions, args.context_budget)
+        print(f"contexte          {packing['raw_tokens_mean']:.0f} -> {packing['packed_tokens_mean']:.0f} tokens en moyenne, rappel {packing[f'recall@{args.context_candidates}_before']:.3f} -> {packing['recall_after']:.3f}")
+
+        # Spans et compteurs enregistrés par les composants eux-mêmes
+        results["metrics"] = registry.snapshot()
+
+        resolution = results["title_resolution"]
+        print(f"get_best_name  {resolution['queries']} requêtes, {resolution['accuracy']:.3f} résolues correctement, p50={resolution['p50_ms']:.3f} ms")
+
+        if args.mongo_uri:
+            for name in LISTS.values():
+                database[name].drop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
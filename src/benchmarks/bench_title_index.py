@@ -0,0 +1,101 @@
+# ============================================================================
+# Benchmark - Résolution floue des titres (boucle fuzz.ratio vs TitleIndex)
+# ============================================================================
+#
+# Usage (depuis src/):
+#   python -m benchmarks.bench_title_index --sizes 10000 100000 --queries 200
+
+import argparse
+import json
+import random
+import time
+
+from rapidfuzz import fuzz
+
+from utilities.TitleIndex import TitleIndex
+
+
+PREFIXES = ["Donjon", "Antre", "Repaire", "Manoir", "Temple", "Aquadôme", "Caverne", "Laboratoire", "Serre", "Château"]
+NAMES = ["Merkator", "Katrepat", "Kralamoure", "Bworker", "Tynril", "Korriandre", "Sphincter", "Ougah", "Nidas", "Kimbo"]
+SUFFIXES = ["des Bouftous", "du Kanniboul", "de l'Ombre", "des Craqueleurs", "du Blop", "des Abysses", "de Frigost", ""]
+
+
+def make_titles(count: int, seed: int = 0) -> list:
+    """Génère des titres de style Dofus, uniques."""
+    rng = random.Random(seed)
+    titles = set()
+    while len(titles) < count:
+        title = f"{rng.choice(PREFIXES)} {rng.choice(NAMES)} {rng.choice(SUFFIXES)} {rng.randint(1, count)}".strip()
+        titles.add(" ".join(title.split()))
+    return sorted(titles)
+
+
+def make_queries(titles: list, count: int, seed: int = 1) -> list:
+    """Génère des requêtes bruitées (casse, accents, fautes de frappe)."""
+    rng = random.Random(seed)
+    queries = []
+    for title in rng.sample(titles, count):
+        chars = list(title.lower().replace("ô", "o").replace("â", "a"))
+        if len(chars) > 4:
+            del chars[rng.randrange(len(chars))]
+        queries.append("".join(chars))
+    return queries
+
+
+def legacy_best_name(titles: list, subject_name: str):
+    """Reproduit la boucle d'origine de RAGTool.get_best_name."""
+    best_score = 0
+    best_match = None
+    for title in titles:
+        score = fuzz.ratio(title, subject_name)
+        if score > best_score:
+            best_score = score
+            best_match = title
+    return None if best_score < 70 else best_match
+
+
+def time_per_query(fn, queries: list) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la résolution des titres")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--output", default=None, help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        titles = make_titles(size)
+        queries = make_queries(titles, args.queries)
+
+        start = time.perf_counter()
+        index = TitleIndex.from_titles(titles)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        legacy_ms = time_per_query(lambda q: legacy_best_name(titles, q), queries)
+        index_ms = time_per_query(lambda q: index.best_match(q)[0], queries)
+        found = sum(1 for q in queries if index.best_match(q)[0] is not None)
+
+        result = {
+            "titles": size,
+            "build_ms": build_ms,
+            "legacy_ms_per_query": legacy_ms,
+            "index_ms_per_query": index_ms,
+            "speedup": legacy_ms / index_ms,
+            "matched_queries": found / len(queries),
+        }
+        results.append(result)
+        print(f"{size:>7} titres | construction {build_ms:8.1f} ms | boucle {legacy_ms:8.2f} ms/req | index {index_ms:6.2f} ms/req | x{result['speedup']:.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# ============================================================================
+# Corpus synthétique de style Dofus, avec questions étiquetées
+# ============================================================================
+#
+# Chaque page contient des sections "### Salle n" décrivant un monstre au nom
+# unique ; chaque question porte sur un de ces monstres et connaît la section
+# (titre de page, nom de section) qui y répond.
+
+import random
+from pathlib import Path
+
+from typing import List
+
+from benchmarks.bench_embeddings import WORDS
+from benchmarks.bench_title_index import make_titles
+
+
+# Gabarit des pages au format dofuspourlesnoobs (bloc wsite-content, titre, encart publicitaire)
+PAGE_TEMPLATE = """<html><body><div id="wsite-content">
+<h2 class="wsite-content-title">{title}</h2>
+<div class="paragraph">PUBLICITE <span data-ad-text="1"></span></div>
+{body}
+</div></body></html>"""
+
+SYLLABLES = ["kra", "mou", "bwo", "rk", "tyn", "ril", "ko", "ria", "ndre", "ou", "gah", "ni", "das", "kim", "bo", "fri", "gost", "bla", "zu", "xel"]
+ELEMENTS = ["Terre", "Feu", "Eau", "Air", "Neutre"]
+MECHANICS = ["invoque des monstres", "pousse les alliés", "vole des PA", "réduit les PM", "renvoie les dommages", "se téléporte"]
+
+
+def make_name(rng: random.Random) -> str:
+    """Génère un nom de monstre imaginaire."""
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def noisy(title: str, rng: random.Random) -> str:
+    """Version approximative d'un titre, comme la taperait un utilisateur."""
+    chars = list(title.lower().replace("ô", "o").replace("â", "a"))
+    if len(chars) > 4:
+        del chars[rng.randrange(len(chars))]
+    return "".join(chars)
+
+
+def make_corpus(root: Path, store_name: str, pages: int, sections: int = 4, filler_words: int = 80, seed: int = 0) -> List[dict]:
+    """Écrit `pages` pages HTML dans `root` et retourne les questions étiquetées.
+
+    Args:
+        root: Dossier de sortie (créé si besoin).
+        store_name: Magasin visé par les questions ("dungeon" ou "quest").
+        pages: Nombre de pages.
+        sections: Nombre de sections "### Salle n" par page.
+        filler_words: Nombre de mots de remplissage par section.
+        seed: Graine aléatoire.
+
+    Returns:
+        Une question par section : {"store", "question", "subject", "title", "filename"}.
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    prefix = "Quête " if store_name == "quest" else ""
+    titles = [prefix + t for t in make_titles(pages, seed=seed)]
+    used_names = set()
+
+    questions = []
+    for p, title in enumerate(titles):
+        body = []
+        for s in range(sections):
+            name = make_name(rng)
+            while name in used_names:
+                name = make_name(rng)
+            used_names.add(name)
+            element, mechanic = rng.choice(ELEMENTS), rng.choice(MECHANICS)
+            filler = " ".join(rng.choices(WORDS, k=filler_words))
+            body.append(
+                f"<h3>Salle {s}</h3><p>Le {name} {mechanic} et il est vulnérable à l'élément {element}. {filler}</p>"
+            )
+            questions.append({
+                "store": store_name,
+                "question": f"Comment battre le {name}, à quoi est-il vulnérable ?",
+                # Une question sur deux précise le nom (approximatif) de la page
+                "subject": noisy(title, rng) if rng.random() < 0.5 else "",
+                "title": title,
+                "filename": f"Salle_{s}",
+            })
+        (root / f"page-{p}.html").write_text(PAGE_TEMPLATE.format(title=title, body="".join(body)), encoding="utf-8")
+    return questions
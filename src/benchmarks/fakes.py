@@ -0,0 +1,100 @@
+# ============================================================================
+# Substituts hors ligne pour les benchmarks : embeddings déterministes, collections en mémoire
+# ============================================================================
+
+import hashlib
+import itertools
+
+import numpy as np
+
+from typing import List
+
+from utilities.BM25Index import tokenize
+from utilities.MyEmbeddings import MyEmbeddings
+
+
+class HashingModel:
+    """Imite la partie de l'interface SentenceTransformer utilisée par MyEmbeddings.
+
+    Chaque terme normalisé est projeté par hachage signé sur une dimension :
+    les textes partageant des termes ont des vecteurs proches, sans modèle ni réseau.
+    """
+
+    max_seq_length = 256
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def tokenizer(self, texts: List[str], add_special_tokens: bool = True, **kwargs) -> dict:
+        special = 2 if add_special_tokens else 0
+        return {"input_ids": [[0] * (len(tokenize(text)) + special) for text in texts]}
+
+    def encode(self, texts: List[str], batch_size: int = 32, convert_to_numpy: bool = True, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for term in tokenize(text):
+                h = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+                vectors[i, h % self.dim] += 1.0 if h >> 63 else -1.0
+        return vectors
+
+
+class FakeEmbeddings(MyEmbeddings):
+    """MyEmbeddings déterministe, avec les mêmes caches, sur un HashingModel."""
+
+    def __init__(self, dim: int = 256, **kwargs):
+        super().__init__(model=f"fake-hashing-{dim}", **kwargs)
+        self.dim = dim
+
+    def load(self):
+        with self._model_lock:
+            if self._model is None:
+                self._model = HashingModel(self.dim)
+        return self._model
+
+
+class InMemoryCollection:
+    """Sous-ensemble de l'API d'une collection pymongo utilisé par TitleIndex."""
+
+    def __init__(self):
+        self._docs = {}
+        self._ids = itertools.count(1)
+
+    def insert_many(self, docs: List[dict]):
+        for doc in docs:
+            doc = dict(doc)
+            doc.setdefault("_id", next(self._ids))
+            self._docs[doc["_id"]] = doc
+
+    def estimated_document_count(self) -> int:
+        return len(self._docs)
+
+    @staticmethod
+    def _project(doc: dict, projection: dict = None) -> dict:
+        if not projection:
+            return dict(doc)
+        included = {k for k, v in projection.items() if v}
+        projected = {k: v for k, v in doc.items() if k in included}
+        if projection.get("_id", 1) and "_id" in doc:
+            projected["_id"] = doc["_id"]
+        return projected
+
+    def find(self, filter: dict = None, projection: dict = None) -> List[dict]:
+        return [self._project(doc, projection) for doc in self._docs.values()
+                if all(doc.get(k) == v for k, v in (filter or {}).items())]
+
+    def find_one(self, filter: dict = None, projection: dict = None, sort: list = None):
+        docs = self.find(filter, projection)
+        for key, direction in reversed(sort or []):
+            docs.sort(key=lambda d: d.get(key), reverse=direction < 0)
+        return docs[0] if docs else None
+
+
+class InMemoryDatabase(dict):
+    """Base en mémoire : chaque nom donne une InMemoryCollection créée à la demande."""
+
+    def __missing__(self, name: str) -> InMemoryCollection:
+        collection = self[name] = InMemoryCollection()
+        return collection
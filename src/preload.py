@@ -0,0 +1,99 @@
+# ============================================================================
+# Préchargement du modèle d'embedding partagé entre processus workers
+# ============================================================================
+#
+# Le modèle est chargé une seule fois dans le processus parent (mode "fork")
+# ou dans le serveur de fork de multiprocessing (mode "forkserver"), puis les
+# workers en héritent par copie sur écriture au lieu de le recharger chacun.
+#
+# Exemple (depuis src/):
+#   def worker(index):
+#       agent = DPLNAgent(embeddings=get_preloaded_embeddings())
+#       ...
+#   run_workers(worker, num_workers=4)
+
+import multiprocessing
+import os
+
+from typing import Callable, List, Optional
+
+from utilities.MyEmbeddings import MyEmbeddings
+
+
+DEFAULT_MODEL = "bert-base-nli-mean-tokens"
+# Lu à l'import du module dans le serveur de fork
+PRELOAD_ENV = "DPLN_PRELOAD_MODEL"
+
+_preloaded = {}
+
+
+def preload_embeddings(model: str = DEFAULT_MODEL, cache_path: Optional[str] = None) -> MyEmbeddings:
+    """Charge le modèle d'embedding dans le processus courant et le garde pour les workers.
+
+    Seuls les poids sont chargés : la première inférence a lieu dans chaque
+    worker, pour ne pas forker un processus dont les threads de calcul de
+    torch sont déjà démarrés. De même, le cache SQLite n'est ouvert qu'au
+    premier accès, donc par chaque worker avec sa propre connexion.
+
+    Args:
+        model: Nom du modèle SentenceTransformer.
+        cache_path: Fichier SQLite du cache d'embeddings.
+
+    Returns:
+        L'instance de MyEmbeddings préchargée.
+    """
+    embeddings = _preloaded.get(model)
+    if embeddings is None:
+        embeddings = MyEmbeddings(model, cache_path=cache_path)
+        embeddings.load()
+        _preloaded[model] = embeddings
+    return embeddings
+
+
+def get_preloaded_embeddings(model: str = DEFAULT_MODEL) -> MyEmbeddings:
+    """Retourne le modèle hérité du processus parent, ou le charge s'il est absent."""
+    return _preloaded.get(model) or preload_embeddings(model)
+
+
+def run_workers(
+    target: Callable,
+    num_workers: int,
+    args: tuple = (),
+    model: str = DEFAULT_MODEL,
+    start_method: str = "fork"
+) -> List[int]:
+    """Lance `num_workers` processus partageant un modèle préchargé et attend leur fin.
+
+    Args:
+        target: Fonction exécutée par chaque worker, appelée avec (index, *args) ;
+            elle récupère le modèle avec `get_preloaded_embeddings`.
+        num_workers: Nombre de processus.
+        args: Arguments supplémentaires passés à `target`.
+        model: Nom du modèle SentenceTransformer à précharger.
+        start_method: "fork" (modèle chargé dans ce processus) ou "forkserver"
+            (modèle chargé dans le serveur de fork, ce processus reste léger).
+
+    Returns:
+        Les codes de sortie des workers.
+    """
+    match start_method:
+        case "fork":
+            preload_embeddings(model)
+            ctx = multiprocessing.get_context("fork")
+        case "forkserver":
+            os.environ[PRELOAD_ENV] = model
+            ctx = multiprocessing.get_context("forkserver")
+            ctx.set_forkserver_preload(["preload"])
+        case _:
+            raise ValueError(f"Mode de démarrage inconnu : {start_method}, utilisez 'fork' ou 'forkserver'")
+
+    processes = [ctx.Process(target=target, args=(i, *args), name=f"dpln-worker-{i}") for i in range(num_workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return [process.exitcode for process in processes]
+
+
+if os.environ.get(PRELOAD_ENV):
+    preload_embeddings(os.environ[PRELOAD_ENV])
@@ -1,64 +1,433 @@
-from typing import List
-from rapidfuzz import fuzz
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
 
-from langchain_mongodb import MongoDBAtlasVectorSearch
 from langchain_core.documents import Document
 
+from utilities.BM25Index import BM25Index, reciprocal_rank_fusion
+from utilities.Metrics import Metrics, registry
 from utilities.MyEmbeddings import MyEmbeddings
+from utilities.ResultCache import GENERATIONS_COLLECTION, ResultCache
+from utilities.SubjectCache import SubjectVectorCache
+from utilities.TitleIndex import TitleIndex
+from utilities.VectorCompression import CompressedEmbeddings, VectorCompressor
+from utilities.vector_stores import EMBEDDING_KEY, TEXT_KEY, create_vector_store
 
 
+logger = logging.getLogger(__name__)
+# Bornes de l'histogramme des scores de correspondance des titres (0-100)
+SCORE_BUCKETS = (50, 60, 70, 80, 90, 95, 100)
+
 class RAGTool:
-    def __init__(self, database, embedding_model: str = 'bert-base-nli-mean-tokens', k: int = 3):
+    def __init__(
+        self,
+        database,
+        embedding_model: str = 'bert-base-nli-mean-tokens',
+        k: int = 3,
+        embedding_cache_path: str = None,
+        vector_backend: str = "atlas",
+        local_store_dir: str = None,
+        bm25_dir: str = None,
+        hybrid_fetch_k: int = 10,
+        async_database=None,
+        embeddings: MyEmbeddings = None,
+        warmup: bool = False,
+        compression_dir: str = None,
+        metrics: Metrics = None,
+        result_cache_size: int = 0,
+        result_cache_ttl: float = 600.0,
+        semantic_cache_threshold: float = None,
+        generation_check_interval: float = 5.0,
+        subject_cache_size: int = 0,
+        subject_cache_bytes: int = 64 * 1024 * 1024,
+        shared_chunks: bool = False
+    ):
         """Initialise l'outil RAG.
         
         Args:
             embedding_model: Le modèle d'embedding à utiliser.
             vector_store: Le magasin de vecteurs. Si None, un magasin par défaut sera créé.
             k: Le nombre de documents à récupérer.
+            embedding_cache_path: Fichier SQLite du cache d'embeddings (None = cache mémoire uniquement).
+            vector_backend: "atlas" pour MongoDB Atlas Vector Search, "local" pour le magasin en mémoire.
+            local_store_dir: Dossier des instantanés du backend "local".
+            bm25_dir: Dossier des index BM25 écrits à l'ingestion. Si fourni, la recherche est hybride
+                (lexicale + vectorielle, fusionnées par Reciprocal Rank Fusion).
+            hybrid_fetch_k: Nombre de candidats récupérés par chaque recherche avant fusion.
+            async_database: La même base ouverte avec le pilote asynchrone (config.connect_async_db),
+                utilisée par aretrieve. Si None, les appels MongoDB d'aretrieve passent par des threads.
+            embeddings: Instance de MyEmbeddings déjà créée (par exemple préchargée avant un fork),
+                sinon une instance de `embedding_model` est créée.
+            warmup: Lance le chargement du modèle et des index dans un thread d'arrière-plan.
+            compression_dir: Dossier des compresseurs écrits par DocumentProcessor (vector_dtype) ; les
+                requêtes des collections compressées y subissent la même réduction que les documents.
+            metrics: Registre des métriques (spans par étape, compteurs), par défaut `utilities.Metrics.registry`.
+            result_cache_size: Nombre maximal de résultats gardés en cache (0 = pas de cache).
+            result_cache_ttl: Durée de vie d'un résultat en cache, en secondes.
+            semantic_cache_threshold: Similarité cosinus à partir de laquelle une question proche d'une
+                question en cache (même magasin, même sujet) réutilise son résultat (None = correspondance exacte seule).
+            generation_check_interval: Intervalle minimal, en secondes, entre deux vérifications de la
+                génération d'une collection (le cache d'un magasin est vidé quand elle est réingérée).
+            subject_cache_size: Nombre de titres dont les chunks et embeddings sont gardés en mémoire, pour
+                répondre aux recherches filtrées par un produit scalaire local au lieu d'une requête
+                $vectorSearch (backend "atlas" uniquement ; 0 = désactivé).
+            subject_cache_bytes: Mémoire maximale des matrices de ce cache, en octets.
+            shared_chunks: Collections ingérées avec déduplication (DocumentProcessor dedup_threshold) : un
+                chunk partagé liste toutes ses pages dans "titles" et "URLs", et les recherches filtrées
+                portent sur "titles" (à déclarer comme champ de filtre de l'index Atlas). Son "title" et
+                son "URL" restent ceux de la page dont provient le texte, même pour un autre sujet : les
+                quasi-doublons peuvent différer (montants, niveaux), la source citée doit rester exacte.
+
+        Le modèle d'embedding et les magasins de vecteurs ne sont créés qu'au premier usage.
         """
         self.k = k
+        self.metrics = metrics if metrics is not None else registry
         self.database = database
+        self.async_database = async_database
+        self.vector_backend = vector_backend
+        self.index_name = "embedding"
+        self.collection_names = {"dungeon": "Vec_Dungeons", "quest": "Vec_Quests"}
+        self.list_collection_names = {"dungeon": "List_Dungeons", "quest": "List_Quests"}
+        self.hybrid_fetch_k = hybrid_fetch_k
+        # Recherches concurrentes de retrieve_many (donjons et quêtes en parallèle)
+        self._search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-search")
 
-        self.embedding_model = MyEmbeddings(embedding_model)
-        # Initialisation des magasins de vecteurs
-        self.dungeon_vector_store = MongoDBAtlasVectorSearch(
-                embedding=self.embedding_model,
-                collection=database["Vec_Dungeons"],
-                index_name="embedding",
-                relevance_score_fn="cosine",
-            )
-        
-        self.quest_vector_store = MongoDBAtlasVectorSearch(
-                embedding=self.embedding_model,
-                collection=database["Vec_Quests"],
-                index_name="embedding",
-                relevance_score_fn="cosine",
-            )
+        self.embedding_model = embeddings if embeddings is not None else MyEmbeddings(embedding_model, cache_path=embedding_cache_path)
+        # Magasins de vecteurs, créés au premier accès
+        self.local_store_dir = local_store_dir
+        self._vector_stores = {}
+        self._stores_lock = threading.Lock()
+        self._warmup_thread = None
+
+        # Index des titres, rechargés uniquement si les collections List_* changent
+        self.title_indexes = {
+            store: TitleIndex(database[name] if database is not None else None) for store, name in self.list_collection_names.items()
+        }
+
+        # Compresseurs des collections stockées en format compact
+        self.compressors = {}
+        if compression_dir is not None:
+            for store, name in self.collection_names.items():
+                path = Path(compression_dir) / f"{name}.npz"
+                if path.exists():
+                    self.compressors[store] = VectorCompressor.load(str(path))
+
+        # Index lexicaux optionnels, construits par DocumentProcessor
+        self.bm25_indexes = {}
+        if bm25_dir is not None:
+            self.bm25_indexes = {
+                store: BM25Index(str(Path(bm25_dir) / f"{name}.json")) for store, name in self.collection_names.items()
+            }
+
+        # Cache des résultats, invalidé quand DocumentProcessor modifie une collection Vec_*
+        self.result_cache = ResultCache(result_cache_size, result_cache_ttl, semantic_cache_threshold) if result_cache_size > 0 else None
+        # Chunks et embeddings des titres récemment filtrés ; le backend local filtre déjà en mémoire
+        self.subject_cache = None
+        if subject_cache_size > 0 and vector_backend == "atlas":
+            self.subject_cache = SubjectVectorCache(subject_cache_size, subject_cache_bytes)
+        self.generation_check_interval = generation_check_interval
+        self.subject_field = "titles" if shared_chunks else "title"
+        self._generations = {}
+        self._generation_checked = {}
+
+        if warmup:
+            self.start_warmup()
+
+    def _vector_store(self, store_name: str):
+        """Crée (une seule fois) le magasin de vecteurs de `store_name`."""
+        v_store = self._vector_stores.get(store_name)
+        if v_store is None:
+            with self._stores_lock:
+                v_store = self._vector_stores.get(store_name)
+                if v_store is None:
+                    compressor = self.compressors.get(store_name)
+                    v_store = create_vector_store(
+                        self.vector_backend,
+                        CompressedEmbeddings(self.embedding_model, compressor) if compressor is not None else self.embedding_model,
+                        database=self.database,
+                        collection_name=self.collection_names[store_name],
+                        index_name=self.index_name,
+                        local_dir=self.local_store_dir,
+                    )
+                    self._vector_stores[store_name] = v_store
+        return v_store
+
+    @property
+    def dungeon_vector_store(self):
+        return self._vector_store("dungeon")
+
+    @property
+    def quest_vector_store(self):
+        return self._vector_store("quest")
+
+    def warmup(self):
+        """Charge le modèle, les magasins de vecteurs et les index de titres et BM25.
+
+        Appelée automatiquement au premier usage ; l'appeler à l'avance supprime
+        la latence du premier appel.
+        """
+        self.embedding_model.warmup()
+        for store_name in self.collection_names:
+            self._vector_store(store_name)
+        for index in self.title_indexes.values():
+            index.refresh()
+        for bm25 in self.bm25_indexes.values():
+            bm25.refresh()
+
+    def start_warmup(self) -> threading.Thread:
+        """Lance `warmup` dans un thread d'arrière-plan et le retourne.
+
+        Les appels concurrents attendent le chargement du modèle au lieu de le dupliquer.
+        """
+        if self._warmup_thread is None:
+            self._warmup_thread = threading.Thread(target=self.warmup, name="rag-warmup", daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
     
-    def get_best_name(self, store_name: str, subject_name: str) -> str:
-        list = []
-        best_score = 0
-        best_match = None
+    def get_best_name(self, store_name: str, subject_name: str, refresh: bool = True) -> str:
+        """Trouve le titre existant le plus proche d'un nom de donjon ou de quête.
+
+        Args:
+            store_name: Le nom du magasin ("dungeon" ou "quest").
+            subject_name: Le nom approximatif fourni par l'utilisateur.
+            refresh: Vérifie d'abord si la collection List_* a changé.
+
+        Returns:
+            Le titre correspondant, ou None si aucun score n'atteint 70.
+        """
+        index = self.title_indexes.get(store_name)
+        if index is None:
+            return None
+
+        with self.metrics.span("rag_resolve_subject", store=store_name):
+            best_match, best_score = index.best_match(subject_name, score_cutoff=70, refresh=refresh)
+        self.metrics.observe("rag_title_match_score", best_score, buckets=SCORE_BUCKETS, store=store_name)
+        if best_match is None:
+            self.metrics.increment("rag_subject_no_match_total", store=store_name)
+
+        logger.debug("Best score for subject_name '%s' is %s for match '%s'", subject_name, best_score, best_match)
+        return best_match
+
+    async def aget_best_name(self, store_name: str, subject_name: str) -> str:
+        """Version asynchrone de get_best_name."""
+        index = self.title_indexes.get(store_name)
+        if index is None:
+            return None
+        with self.metrics.span("rag_title_refresh", store=store_name):
+            if self.async_database is not None:
+                await index.arefresh(self.async_database[self.list_collection_names[store_name]])
+            else:
+                await asyncio.to_thread(index.refresh)
+        return self.get_best_name(store_name, subject_name, refresh=False)
+
 
+    def _get_vector_store(self, store_name: str):
+        """Retourne le magasin de vecteurs associé à `store_name`, ou None s'il est inconnu."""
         match store_name:
             case "dungeon":
-                collection = self.database["List_Dungeons"]
+                return self.dungeon_vector_store
             case "quest":
-                collection = self.database["List_Quests"]
+                return self.quest_vector_store
             case _:
                 return None
-        
-        docs = collection.find({}, {"_id": 0, "title": 1})
 
-        for d in docs:
-            score = fuzz.ratio(d["title"], subject_name)
-            if score > best_score:
-                best_score = score
-                best_match = d["title"]
-        
-        print(f"RAGTool: Best score for subject_name '{subject_name}' is {best_score} for match '{best_match}'")
-        return None if best_score < 70 else best_match
+    def _refresh_generation(self, store_name: str):
+        """Lit la génération de la collection du magasin et invalide ses caches si elle a changé.
+
+        Backend "atlas" : compteur de la collection Ingest_Generations, incrémenté par
+        DocumentProcessor avec la liste des titres réingérés. Backend "local" : date de meta.json,
+        écrit en dernier par LocalVectorStore.save ; le magasin est alors rechargé et l'invalidation
+        porte sur tout le magasin (l'instantané ne dit pas quels titres ont changé).
+        """
+        self._generation_checked[store_name] = time.monotonic()
+        collection_name = self.collection_names[store_name]
+        titles = None
+        try:
+            if self.vector_backend == "local":
+                from utilities.LocalVectorStore import LocalVectorStore
+                meta_path = Path(self.local_store_dir) / collection_name / LocalVectorStore.META_FILE
+                # meta.json est remplacé à chaque sauvegarde : nouvel inode même à date égale
+                stat = meta_path.stat() if meta_path.exists() else None
+                generation = (stat.st_mtime_ns, stat.st_ino) if stat is not None else 0
+            elif self.database is not None:
+                doc = self.database[GENERATIONS_COLLECTION].find_one({"_id": collection_name}, {"generation": 1, "titles": 1})
+                generation = doc["generation"] if doc else 0
+                titles = doc.get("titles") if doc else None
+            else:
+                return
+        except Exception as e:
+            logger.warning("Could not read generation of %s: %s", collection_name, e)
+            return
+
+        previous = self._generations.get(store_name)
+        if previous is not None and previous != generation and self.vector_backend == "local":
+            # Le prochain accès recrée le magasin depuis le nouvel instantané (les recherches en cours
+            # terminent sur l'ancien) ; retiré avant la publication de la génération, pour qu'aucun
+            # résultat de l'ancien instantané ne soit mis en cache sous la nouvelle
+            with self._stores_lock:
+                self._vector_stores.pop(store_name, None)
+        self._generations[store_name] = generation
+        if previous is None or previous == generation:
+            return
+        logger.info("Collection %s changed, caches invalidated", collection_name)
+        self.metrics.increment("rag_cache_invalidations_total", store=store_name)
+        if self.result_cache is not None:
+            self.result_cache.invalidate(store_name)
+        if self.subject_cache is not None:
+            # Une seule ingestion depuis la dernière vérification : seuls ses titres sont rechargés
+            single_run = self.vector_backend == "atlas" and generation == previous + 1
+            self.subject_cache.invalidate(store_name, titles if single_run else None)
+
+    def _generation_due(self, store_name: str) -> bool:
+        if self.result_cache is None and self.subject_cache is None:
+            return False
+        last = self._generation_checked.get(store_name)
+        return last is None or time.monotonic() - last >= self.generation_check_interval
+
+    def cache_stats(self) -> dict:
+        """Retourne les compteurs (et la mémoire) des caches de résultats et de sujets."""
+        return {
+            "result_cache": self.result_cache.stats() if self.result_cache is not None else None,
+            "subject_cache": self.subject_cache.stats() if self.subject_cache is not None else None,
+        }
+
+    def _cache_get(self, store_name: str, question: str, subject_name: str = None, query_vector=None) -> List[Document]:
+        """Cherche un résultat en cache : exact, ou sémantique si `query_vector` est fourni (None si absent)."""
+        if query_vector is None:
+            docs = self.result_cache.get(store_name, subject_name, question)
+            tier = "exact"
+        else:
+            docs = self.result_cache.get_similar(store_name, subject_name, query_vector)
+            tier = "semantic"
+        if docs is not None:
+            self.metrics.increment("rag_cache_hits_total", store=store_name, tier=tier)
+        elif query_vector is not None or self.result_cache.semantic_threshold is None:
+            self.metrics.increment("rag_cache_misses_total", store=store_name)
+        return docs
+
+    def _search(self, store_name: str, question: str, subject_name: str = None, query_vector=None) -> List[Document]:
+        """Recherche vectorielle, fusionnée avec BM25 si l'index lexical est disponible.
+
+        Le cache de résultats, s'il est activé, est consulté avant l'embedding
+        (correspondance exacte) puis avant la recherche (question proche).
+
+        Args:
+            store_name: Le nom du magasin ("dungeon" ou "quest").
+            question: La question à rechercher.
+            subject_name: Titre exact auquel restreindre la recherche, ou None.
+            query_vector: Embedding de la question s'il est déjà calculé.
+
+        Returns:
+            Les `k` documents les plus pertinents.
+        """
+        if self._generation_due(store_name):
+            self._refresh_generation(store_name)
+        if self.result_cache is None:
+            if query_vector is None:
+                with self.metrics.span("rag_embed_query", store=store_name):
+                    query_vector = self.embedding_model.embed_query(question)
+            return self._search_by_vector(store_name, question, subject_name, query_vector)
+
+        # Génération lue au début : un résultat calculé pendant une invalidation n'est pas mis en cache
+        generation = self._generations.get(store_name)
+        cached = self._cache_get(store_name, question, subject_name)
+        if cached is not None:
+            return cached
+        if query_vector is None:
+            with self.metrics.span("rag_embed_query", store=store_name):
+                query_vector = self.embedding_model.embed_query(question)
+        if self.result_cache.semantic_threshold is not None:
+            cached = self._cache_get(store_name, question, subject_name, query_vector)
+            if cached is not None:
+                return cached
+
+        results = self._search_by_vector(store_name, question, subject_name, query_vector)
+        self._cache_put(store_name, generation, subject_name, question, query_vector, results)
+        return results
+
+    def _cache_put(self, store_name: str, generation, subject_name: str, question: str, query_vector, results: List[Document]):
+        """Met un résultat en cache, sauf si la génération du magasin a changé depuis le début de la recherche."""
+        if self._generations.get(store_name) != generation:
+            self.metrics.increment("rag_cache_stale_puts_total", store=store_name)
+            return
+        self.result_cache.put(store_name, subject_name, question, query_vector, results)
+
+    def _search_by_vector(self, store_name: str, question: str, subject_name: str, query_vector) -> List[Document]:
+        """Recherche de _search, sans cache, à partir de l'embedding de la question."""
+        v_store = self._get_vector_store(store_name)
+        pre_filter = {self.subject_field: subject_name} if subject_name is not None else None
+        query_vector = self._transform_query(store_name, query_vector)
+
+        bm25 = self.bm25_indexes.get(store_name)
+        fetch_k = self.k if bm25 is None else self.hybrid_fetch_k
+        subject = self._subject_entry(store_name, subject_name)
+        if subject is not None:
+            with self.metrics.span("rag_subject_search", store=store_name):
+                vector_results = SubjectVectorCache.search(*subject, query_vector, fetch_k)
+        else:
+            with self.metrics.span("rag_vector_search", store=store_name, filtered=pre_filter is not None):
+                vector_results = v_store.similarity_search_by_vector(query_vector, k=fetch_k, pre_filter=pre_filter)
+        if bm25 is None:
+            return vector_results
+
+        lexical_results = self._lexical_search(store_name, question, subject_name)
+        with self.metrics.span("rag_fusion", store=store_name):
+            return reciprocal_rank_fusion([vector_results, lexical_results], k=self.k)
+
+    def _subject_entry(self, store_name: str, subject_name: str = None):
+        """Retourne (documents, matrice) du titre depuis le cache des sujets, en les chargeant au besoin.
+
+        Returns:
+            None si le cache est désactivé ou si la recherche n'est pas filtrée.
+        """
+        if self.subject_cache is None or subject_name is None:
+            return None
+        entry = self.subject_cache.get(store_name, subject_name)
+        if entry is not None:
+            self.metrics.increment("rag_subject_cache_hits_total", store=store_name)
+            return entry
+        self.metrics.increment("rag_subject_cache_misses_total", store=store_name)
+        with self.metrics.span("rag_subject_load", store=store_name):
+            records = self.database[self.collection_names[store_name]].find({self.subject_field: subject_name})
+            return self._store_subject(store_name, subject_name, records)
+
+    async def _asubject_entry(self, store_name: str, subject_name: str = None):
+        """Version asynchrone de _subject_entry (chargement par le pilote asynchrone s'il est fourni)."""
+        if self.subject_cache is None or subject_name is None:
+            return None
+        entry = self.subject_cache.get(store_name, subject_name)
+        if entry is not None:
+            self.metrics.increment("rag_subject_cache_hits_total", store=store_name)
+            return entry
+        if self.async_database is None:
+            return await asyncio.to_thread(self._subject_entry, store_name, subject_name)
+        self.metrics.increment("rag_subject_cache_misses_total", store=store_name)
+        with self.metrics.span("rag_subject_load", store=store_name):
+            cursor = self.async_database[self.collection_names[store_name]].find({self.subject_field: subject_name})
+            return self._store_subject(store_name, subject_name, await cursor.to_list(None))
+
+    def _store_subject(self, store_name: str, subject_name: str, records):
+        docs, matrix = SubjectVectorCache.from_records(records, TEXT_KEY, EMBEDDING_KEY)
+        self.subject_cache.put(store_name, subject_name, docs, matrix)
+        return docs, matrix
 
+    def _transform_query(self, store_name: str, query_vector) -> List[float]:
+        """Ramène l'embedding d'une requête dans l'espace (éventuellement compressé) du magasin."""
+        compressor = self.compressors.get(store_name)
+        if compressor is not None:
+            query_vector = compressor.transform(query_vector)
+        return [float(x) for x in query_vector]
+
+    def _lexical_search(self, store_name: str, question: str, subject_name: str = None) -> List[Document]:
+        """Recherche BM25 des `hybrid_fetch_k` meilleurs chunks, avec le même filtre de titre."""
+        bm25 = self.bm25_indexes[store_name]
+        with self.metrics.span("rag_lexical_search", store=store_name, filtered=subject_name is not None):
+            bm25.refresh()
+            return [doc for doc, _ in bm25.search(question, k=self.hybrid_fetch_k, title=subject_name)]
 
     def retrieve(self, store_name: str, question: str, subject_name: str = "") -> List[Document]:
         """Récupère les documents pertinents pour une question.
@@ -71,28 +440,248 @@ class RAGTool:
         Returns:
             Liste de documents pertinents.
         """
+        logger.info("Retrieving from store '%s' with question: %s and subject_name: %s", store_name, question, subject_name)
 
+        if self._get_vector_store(store_name) is None:
+            logger.warning("Unknown store: %s", store_name)
+            self.metrics.increment("rag_unknown_store_total")
+            return [Document(page_content=f"Nom de magasin inconnu : {store_name}, veillez à utiliser 'dungeon' ou 'quest'", metadata={"error": True})]
 
-        print(f"RAGTool: Retrieving from store '{store_name}' with question: {question} and subject_name: {subject_name}")
+        self.metrics.increment("rag_queries_total", store=store_name, filtered=subject_name != "")
+        with self.metrics.span("rag_retrieve", store=store_name):
+            if subject_name != "":
+                best_name = self.get_best_name(store_name, subject_name)
+                if best_name is not None:
+                    logger.info("Best match for subject_name is: %s", best_name)
+                    results = self._search(store_name, question, best_name)
+                else:
+                    logger.info("No match found for subject_name: %s", subject_name)
+                    results = [Document(page_content=f"Nom de {store_name} inconnu : {subject_name}, veillez à utiliser le nom d'un donjon ou d'une quete existante", metadata={"error": True})]
+            else:
+                results = self._search(store_name, question)
 
-        v_store = None
-        match store_name:
-            case "dungeon":
-                v_store = self.dungeon_vector_store
-            case "quest":
-                v_store = self.quest_vector_store
-            case _:
-                return [Document(page_content=f"Nom de magasin inconnu : {store_name}, veillez à utiliser 'dungeon' ou 'quest'", metadata={"error": True})]
-        
-        if subject_name != "":
-            subject_name = self.get_best_name(store_name, subject_name)
-            if subject_name is not None:
-                print(f"RAGTool: Best match for subject_name is: {subject_name}")
-                results = v_store.similarity_search(query=question, k=self.k, pre_filter={"title": subject_name})
+        return results
+
+    def retrieve_many(self, requests: List[Tuple[str, str, str]]) -> List[List[Document]]:
+        """Récupère les documents de plusieurs requêtes en une seule passe d'embedding.
+
+        Les questions sont encodées ensemble, chaque nom de sujet distinct n'est
+        résolu qu'une fois, et les recherches dans les magasins donjons et
+        quêtes s'exécutent en parallèle.
+
+        Args:
+            requests: Liste de tuples (store_name, question, subject_name), subject_name pouvant être "".
+
+        Returns:
+            Une liste de résultats alignée sur `requests`, chacun comme le retournerait `retrieve`.
+        """
+        logger.info("Retrieving %d requests in one batch", len(requests))
+        self.metrics.observe("rag_batch_size", len(requests), buckets=(1, 2, 4, 8, 16, 32, 64))
+        results = [None] * len(requests)
+
+        # Résolution groupée des sujets
+        resolved = {}
+        for store_name, _, subject_name in requests:
+            if subject_name and self._get_vector_store(store_name) is not None and (store_name, subject_name) not in resolved:
+                resolved[(store_name, subject_name)] = self.get_best_name(store_name, subject_name)
+
+        searches = []
+        for i, (store_name, question, subject_name) in enumerate(requests):
+            if self._get_vector_store(store_name) is None:
+                self.metrics.increment("rag_unknown_store_total")
+                results[i] = [Document(page_content=f"Nom de magasin inconnu : {store_name}, veillez à utiliser 'dungeon' ou 'quest'", metadata={"error": True})]
+                continue
+            self.metrics.increment("rag_queries_total", store=store_name, filtered=bool(subject_name))
+            if subject_name and resolved[(store_name, subject_name)] is None:
+                results[i] = [Document(page_content=f"Nom de {store_name} inconnu : {subject_name}, veillez à utiliser le nom d'un donjon ou d'une quete existante", metadata={"error": True})]
             else:
-                print(f"RAGTool: No match found for subject_name: {subject_name}")
-                results = [Document(page_content=f"Nom de {store_name} inconnu : {subject_name}, veillez à utiliser le nom d'un donjon ou d'une quete existante", metadata={"error": True})]
-        else:
-            results = v_store.similarity_search(query=question, k=self.k, pre_filter=None)
+                searches.append((i, store_name, question, resolved.get((store_name, subject_name))))
+
+        searches = self._take_cached(searches, results)
+        if searches:
+            # Une seule passe du modèle pour toutes les questions
+            with self.metrics.span("rag_embed_query", store="batch"):
+                vectors = self.embedding_model.embed_queries([question for _, _, question, _ in searches])
+            futures = [
+                (i, self._search_executor.submit(self._search, store_name, question, subject, vector))
+                for (i, store_name, question, subject), vector in zip(searches, vectors)
+            ]
+            for i, future in futures:
+                results[i] = future.result()
+
+        return results
+
+    def _take_cached(self, searches: list, results: list) -> list:
+        """Remplit `results` avec les correspondances exactes du cache et retourne les recherches restantes."""
+        if self.result_cache is None:
+            return searches
+        remaining = []
+        for i, store_name, question, subject in searches:
+            if self._generation_due(store_name):
+                self._refresh_generation(store_name)
+            cached = self.result_cache.get(store_name, subject, question)
+            if cached is not None:
+                self.metrics.increment("rag_cache_hits_total", store=store_name, tier="exact")
+                results[i] = cached
+            else:
+                remaining.append((i, store_name, question, subject))
+        return remaining
+
+    async def _avector_search(self, store_name: str, query_vector: List[float], k: int, pre_filter: dict = None) -> List[Document]:
+        """Recherche vectorielle asynchrone.
+
+        Avec le backend Atlas et une base asynchrone, la requête $vectorSearch est
+        envoyée par le pilote asynchrone ; sinon la recherche synchrone est
+        déléguée à un thread.
+        """
+        if self.vector_backend != "atlas" or self.async_database is None:
+            v_store = self._get_vector_store(store_name)
+            return await asyncio.to_thread(v_store.similarity_search_by_vector, query_vector, k=k, pre_filter=pre_filter)
+
+        # Même pipeline et même format de résultat que MongoDBAtlasVectorSearch
+        vector_search = {
+            "index": self.index_name,
+            "path": EMBEDDING_KEY,
+            "queryVector": query_vector,
+            "numCandidates": k * 10,
+            "limit": k,
+        }
+        if pre_filter:
+            vector_search["filter"] = pre_filter
+        pipeline = [
+            {"$vectorSearch": vector_search},
+            {"$set": {"score": {"$meta": "vectorSearchScore"}}},
+            {"$project": {EMBEDDING_KEY: 0}},
+        ]
+        collection = self.async_database[self.collection_names[store_name]]
+        cursor = await collection.aggregate(pipeline)
+        docs = []
+        async for res in cursor:
+            text = res.pop(TEXT_KEY, "")
+            # Comme MongoDBAtlasVectorSearch : _id sérialisé et score conservés dans les métadonnées
+            doc_id = res["_id"] = str(res["_id"])
+            docs.append(Document(page_content=text, metadata=res, id=doc_id))
+        return docs
+
+    async def _asearch(self, store_name: str, question: str, subject_name: str = None, query_vector=None) -> List[Document]:
+        """Version asynchrone de _search."""
+        if self._generation_due(store_name):
+            await asyncio.to_thread(self._refresh_generation, store_name)
+        if self.result_cache is None:
+            if query_vector is None:
+                with self.metrics.span("rag_embed_query", store=store_name):
+                    query_vector = await self.embedding_model.aembed_query(question)
+            return await self._asearch_by_vector(store_name, question, subject_name, query_vector)
+
+        generation = self._generations.get(store_name)
+        cached = self._cache_get(store_name, question, subject_name)
+        if cached is not None:
+            return cached
+        if query_vector is None:
+            with self.metrics.span("rag_embed_query", store=store_name):
+                query_vector = await self.embedding_model.aembed_query(question)
+        if self.result_cache.semantic_threshold is not None:
+            cached = self._cache_get(store_name, question, subject_name, query_vector)
+            if cached is not None:
+                return cached
+
+        results = await self._asearch_by_vector(store_name, question, subject_name, query_vector)
+        self._cache_put(store_name, generation, subject_name, question, query_vector, results)
+        return results
+
+    async def _asearch_by_vector(self, store_name: str, question: str, subject_name: str, query_vector) -> List[Document]:
+        """Version asynchrone de _search_by_vector."""
+        pre_filter = {self.subject_field: subject_name} if subject_name is not None else None
+        query_vector = self._transform_query(store_name, query_vector)
+
+        bm25 = self.bm25_indexes.get(store_name)
+        fetch_k = self.k if bm25 is None else self.hybrid_fetch_k
+
+        async def vector_search():
+            subject = await self._asubject_entry(store_name, subject_name)
+            if subject is not None:
+                with self.metrics.span("rag_subject_search", store=store_name):
+                    return SubjectVectorCache.search(*subject, query_vector, fetch_k)
+            with self.metrics.span("rag_vector_search", store=store_name, filtered=pre_filter is not None):
+                return await self._avector_search(store_name, query_vector, fetch_k, pre_filter)
+
+        if bm25 is None:
+            return await vector_search()
+
+        vector_results, lexical_results = await asyncio.gather(
+            vector_search(),
+            asyncio.to_thread(self._lexical_search, store_name, question, subject_name),
+        )
+        with self.metrics.span("rag_fusion", store=store_name):
+            return reciprocal_rank_fusion([vector_results, lexical_results], k=self.k)
+
+    async def aretrieve(self, store_name: str, question: str, subject_name: str = "") -> List[Document]:
+        """Version asynchrone de retrieve : l'inférence passe par l'exécuteur du modèle et
+        MongoDB par le pilote asynchrone, sans bloquer la boucle d'événements.
+
+        Args:
+            store_name: Le nom du magasin de vecteurs à utiliser ("dungeon" ou "quest").
+            question: La question à rechercher.
+            subject_name: Le nom de la quête ou du donjon à filtrer.
+
+        Returns:
+            Liste de documents pertinents.
+        """
+        logger.info("Async retrieving from store '%s' with question: %s and subject_name: %s", store_name, question, subject_name)
+
+        if self._get_vector_store(store_name) is None:
+            logger.warning("Unknown store: %s", store_name)
+            self.metrics.increment("rag_unknown_store_total")
+            return [Document(page_content=f"Nom de magasin inconnu : {store_name}, veillez à utiliser 'dungeon' ou 'quest'", metadata={"error": True})]
+
+        self.metrics.increment("rag_queries_total", store=store_name, filtered=subject_name != "")
+        with self.metrics.span("rag_retrieve", store=store_name):
+            if subject_name != "":
+                best_name = await self.aget_best_name(store_name, subject_name)
+                if best_name is None:
+                    logger.info("No match found for subject_name: %s", subject_name)
+                    return [Document(page_content=f"Nom de {store_name} inconnu : {subject_name}, veillez à utiliser le nom d'un donjon ou d'une quete existante", metadata={"error": True})]
+                logger.info("Best match for subject_name is: %s", best_name)
+                return await self._asearch(store_name, question, best_name)
+            return await self._asearch(store_name, question)
+
+    async def aretrieve_many(self, requests: List[Tuple[str, str, str]]) -> List[List[Document]]:
+        """Version asynchrone de retrieve_many."""
+        logger.info("Async retrieving %d requests in one batch", len(requests))
+        self.metrics.observe("rag_batch_size", len(requests), buckets=(1, 2, 4, 8, 16, 32, 64))
+        results = [None] * len(requests)
+
+        pairs = list(dict.fromkeys(
+            (store_name, subject_name) for store_name, _, subject_name in requests
+            if subject_name and self._get_vector_store(store_name) is not None
+        ))
+        names = await asyncio.gather(*[self.aget_best_name(store_name, subject_name) for store_name, subject_name in pairs])
+        resolved = dict(zip(pairs, names))
+
+        searches = []
+        for i, (store_name, question, subject_name) in enumerate(requests):
+            if self._get_vector_store(store_name) is None:
+                self.metrics.increment("rag_unknown_store_total")
+                results[i] = [Document(page_content=f"Nom de magasin inconnu : {store_name}, veillez à utiliser 'dungeon' ou 'quest'", metadata={"error": True})]
+                continue
+            self.metrics.increment("rag_queries_total", store=store_name, filtered=bool(subject_name))
+            if subject_name and resolved[(store_name, subject_name)] is None:
+                results[i] = [Document(page_content=f"Nom de {store_name} inconnu : {subject_name}, veillez à utiliser le nom d'un donjon ou d'une quete existante", metadata={"error": True})]
+            else:
+                searches.append((i, store_name, question, resolved.get((store_name, subject_name))))
+
+        if self.result_cache is not None:
+            for store_name in {store_name for _, store_name, _, _ in searches if self._generation_due(store_name)}:
+                await asyncio.to_thread(self._refresh_generation, store_name)
+        searches = self._take_cached(searches, results)
+        if searches:
+            with self.metrics.span("rag_embed_query", store="batch"):
+                vectors = await self.embedding_model.aembed_queries([question for _, _, question, _ in searches])
+            found = await asyncio.gather(*[
+                self._asearch(store_name, question, subject, vector)
+                for (_, store_name, question, subject), vector in zip(searches, vectors)
+            ])
+            for (i, _, _, _), docs in zip(searches, found):
+                results[i] = docs
 
-        return results
\ No newline at end of file
+        return results
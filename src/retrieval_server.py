@@ -0,0 +1,313 @@
+# ============================================================================
+# Serveur de recherche : regroupement des requêtes concurrentes en micro-lots
+# ============================================================================
+#
+# Un processus de longue durée garde RAGTool (modèle, magasins, index) en
+# mémoire. Les requêtes concurrentes sont regroupées en micro-lots : un lot part
+# dès qu'il atteint `max_batch_size` requêtes ou que la plus ancienne attend
+# depuis `max_wait` secondes. Chaque lot ne fait qu'une passe d'embedding et une
+# série de recherches (RAGTool.aretrieve_many), puis chaque client reçoit ses
+# résultats.
+#
+# Protocole : une requête JSON par ligne, sur TCP ou socket Unix, plusieurs
+# requêtes pouvant être en cours sur une même connexion :
+#   -> {"id": 1, "store": "dungeon", "question": "...", "subject_name": ""}
+#   <- {"id": 1, "documents": [{"page_content": "...", "metadata": {...}}], "batch_size": 12}
+#
+# Usage (depuis src/):
+#   python retrieval_server.py --port 8765
+#   python retrieval_server.py --unix /tmp/dpln_rag.sock --max-batch 64 --max-wait-ms 10
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import time
+
+from langchain_core.documents import Document
+
+from typing import List, Optional
+
+from rag_tool import RAGTool
+from utilities.Metrics import Metrics, registry
+
+
+logger = logging.getLogger(__name__)
+# Bornes de l'histogramme des tailles de lot
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class MicroBatcher:
+    """Regroupe les appels concurrents à `submit` en appels à RAGTool.aretrieve_many."""
+
+    def __init__(self, tool: RAGTool, max_batch_size: int = 32, max_wait: float = 0.005, metrics: Metrics = None):
+        """Initialise le regroupement.
+
+        Args:
+            tool: L'outil RAG partagé par toutes les requêtes.
+            max_batch_size: Nombre maximal de requêtes par lot.
+            max_wait: Attente maximale, en secondes, de la plus ancienne requête avant l'envoi du lot.
+            metrics: Registre des métriques, par défaut `utilities.Metrics.registry`.
+        """
+        self.tool = tool
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.metrics = metrics if metrics is not None else registry
+        self._queue: Optional[asyncio.Queue] = None
+        self._task = None
+        # Lot en cours de traitement, annulé par `close`
+        self._in_flight = []
+
+    def start(self):
+        """Démarre la boucle de traitement des lots (dans la boucle d'événements courante)."""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run(), name="rag-micro-batcher")
+
+    async def submit(self, store_name: str, question: str, subject_name: str = "") -> tuple:
+        """Ajoute une requête au prochain lot et attend ses résultats.
+
+        Returns:
+            Un tuple (documents, taille du lot qui les a produits).
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(((store_name, question, subject_name), future, time.perf_counter()))
+        return await future
+
+    async def _next_batch(self) -> list:
+        """Attend une requête, puis complète le lot jusqu'à sa taille maximale ou son échéance."""
+        batch = [await self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Les requêtes déjà en file sont prises sans attendre
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = self._in_flight = await self._next_batch()
+            started = time.perf_counter()
+            for _, _, queued in batch:
+                self.metrics.observe("server_queue_wait_seconds", started - queued)
+            self.metrics.observe("server_batch_size", len(batch), buckets=BATCH_BUCKETS)
+            try:
+                with self.metrics.span("server_batch"):
+                    results = await self.tool.aretrieve_many([request for request, _, _ in batch])
+            except Exception as e:
+                logger.exception("Batch of %d requests failed", len(batch))
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future, _), docs in zip(batch, results):
+                if not future.done():
+                    future.set_result((docs, len(batch)))
+
+    async def close(self):
+        """Arrête la boucle de traitement ; les requêtes en attente et le lot en cours sont annulés."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            for _, future, _ in self._in_flight:
+                future.cancel()
+            self._in_flight = []
+            while not self._queue.empty():
+                _, future, _ = self._queue.get_nowait()
+                future.cancel()
+
+
+def parse_request(message: dict) -> tuple:
+    """Valide une requête avant de l'ajouter à un lot : une requête invalide ne doit pas faire échouer tout son lot.
+
+    Returns:
+        Le tuple (store, question, subject_name) attendu par `MicroBatcher.submit`.
+
+    Raises:
+        ValueError: Si un champ manque ou n'est pas une chaîne.
+    """
+    subject_name = message.get("subject_name")
+    fields = (message.get("store"), message.get("question"), "" if subject_name is None else subject_name)
+    for name, value in zip(("store", "question", "subject_name"), fields):
+        if not isinstance(value, str):
+            raise ValueError(f"Champ '{name}' invalide : une chaîne est attendue, reçu {type(value).__name__}")
+    return fields
+
+
+async def serve(batcher: MicroBatcher, host: str = "127.0.0.1", port: int = 8765, unix_path: str = None) -> asyncio.AbstractServer:
+    """Démarre le serveur JSON lignes (socket Unix si `unix_path` est fourni, sinon TCP)."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        write_lock = asyncio.Lock()
+        pending = set()
+
+        async def send(response: dict):
+            async with write_lock:
+                writer.write(json.dumps(response, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+                await writer.drain()
+
+        async def answer(message: dict):
+            try:
+                docs, batch_size = await batcher.submit(*parse_request(message))
+                response = {
+                    "id": message.get("id"),
+                    "documents": [{"page_content": d.page_content, "metadata": d.metadata} for d in docs],
+                    "batch_size": batch_size,
+                }
+            except Exception as e:
+                response = {"id": message.get("id"), "error": f"{type(e).__name__}: {e}"}
+            await send(response)
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError as e:
+                    # Ligne au-delà de la limite du StreamReader (64 Kio) : elle est ignorée
+                    await send({"id": None, "error": f"Requête trop longue : {e}"})
+                    continue
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError as e:
+                    await send({"id": None, "error": f"JSON invalide : {e}"})
+                    continue
+                if not isinstance(message, dict):
+                    await send({"id": None, "error": "Requête invalide : un objet JSON est attendu"})
+                    continue
+                task = asyncio.create_task(answer(message))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    batcher.start()
+    if unix_path is not None:
+        return await asyncio.start_unix_server(handle, path=unix_path)
+    return await asyncio.start_server(handle, host, port)
+
+
+class RetrievalClient:
+    """Client asynchrone du serveur, avec plusieurs requêtes en cours sur une connexion."""
+
+    def __init__(self):
+        self._reader = None
+        self._writer = None
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._receiver = None
+
+    @classmethod
+    async def connect(cls, host: str = "127.0.0.1", port: int = 8765, unix_path: str = None) -> "RetrievalClient":
+        client = cls()
+        if unix_path is not None:
+            client._reader, client._writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            client._reader, client._writer = await asyncio.open_connection(host, port)
+        client._receiver = asyncio.create_task(client._receive())
+        return client
+
+    async def _receive(self):
+        try:
+            while line := await self._reader.readline():
+                message = json.loads(line)
+                future = self._pending.pop(message.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if "error" in message:
+                    future.set_exception(RuntimeError(message["error"]))
+                else:
+                    future.set_result(message)
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connexion au serveur de recherche fermée"))
+            self._pending.clear()
+
+    async def retrieve(self, store_name: str, question: str, subject_name: str = "") -> List[Document]:
+        """Envoie une requête et retourne ses documents, comme RAGTool.retrieve."""
+        return (await self.retrieve_raw(store_name, question, subject_name))["documents"]
+
+    async def retrieve_raw(self, store_name: str, question: str, subject_name: str = "") -> dict:
+        """Envoie une requête et retourne la réponse du serveur (documents et taille du lot)."""
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        message = {"id": request_id, "store": store_name, "question": question, "subject_name": subject_name}
+        self._writer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        await self._writer.drain()
+        response = await future
+        response["documents"] = [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in response["documents"]]
+        return response
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+        if self._receiver is not None:
+            await self._receiver
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur de recherche RAG avec regroupement en micro-lots")
+    parser.add_argument("--config", default="config/config.json", help="Fichier de configuration (connexion MongoDB)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="Socket Unix à la place de TCP")
+    parser.add_argument("--max-batch", type=int, default=32, help="Requêtes maximum par lot")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Attente maximale d'une requête avant l'envoi du lot")
+    parser.add_argument("--vector-backend", default="atlas", choices=["atlas", "local"])
+    parser.add_argument("--local-store-dir", default=None)
+    parser.add_argument("--bm25-dir", default=None)
+    parser.add_argument("--result-cache-size", type=int, default=1024)
+    parser.add_argument("--metrics-port", type=int, default=None, help="Expose /metrics au format Prometheus")
+    args = parser.parse_args()
+
+    import utilities.config as config
+    from utilities.Metrics import PrometheusExporter
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # Les logs INFO de chaque requête de RAGTool ralentiraient le serveur
+    logging.getLogger("rag_tool").setLevel(logging.WARNING)
+
+    async def run():
+        tool = RAGTool(
+            config.setup_PATH_and_connect_to_local_mongodb_db(args.config),
+            async_database=config.connect_async_db(args.config) if args.vector_backend == "atlas" else None,
+            vector_backend=args.vector_backend,
+            local_store_dir=args.local_store_dir,
+            bm25_dir=args.bm25_dir,
+            result_cache_size=args.result_cache_size,
+        )
+        await asyncio.to_thread(tool.warmup)
+        if args.metrics_port is not None:
+            PrometheusExporter().serve(args.metrics_port)
+        batcher = MicroBatcher(tool, max_batch_size=args.max_batch, max_wait=args.max_wait_ms / 1000)
+        server = await serve(batcher, args.host, args.port, args.unix)
+        logger.info("Retrieval server listening on %s", args.unix or f"{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Les modules s'importent depuis src/ (import utilities.X), comme les benchmarks
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
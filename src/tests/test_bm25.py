@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+
+from utilities.BM25Index import reciprocal_rank_fusion
+
+
+BOUFTOU = "Le Bouftou Royal invoque des bouftous."
+DRAGON = "Le Dragon Cochon mange les ressources au sol."
+
+
+@pytest.mark.parametrize("anonymous", [
+    Document(page_content=BOUFTOU, metadata={"_id": "a"}),
+    Document(page_content=BOUFTOU, metadata={}),
+])
+def test_fusion_counts_a_document_once_with_or_without_id(anonymous):
+    vector_results = [Document(page_content=DRAGON, metadata={}, id="b"), anonymous]
+    lexical_results = [Document(page_content=BOUFTOU, metadata={}, id="a"), Document(page_content=DRAGON, metadata={}, id="b")]
+
+    fused = reciprocal_rank_fusion([vector_results, lexical_results], k=3)
+
+    assert [doc.page_content for doc in fused] == [DRAGON, BOUFTOU]
+
+
+def test_fusion_ranks_by_summed_reciprocal_ranks():
+    a, b, c = (Document(page_content=text, metadata={}, id=i) for i, text in zip("abc", ("a", "b", "c")))
+
+    fused = reciprocal_rank_fusion([[a, b, c], [c, b, a], [b]], k=2)
+
+    assert [doc.id for doc in fused] == ["b", "a"]
@@ -0,0 +1,69 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("bs4")
+pytest.importorskip("pymongo")
+pytest.importorskip("html_to_markdown")
+pytest.importorskip("langchain_core")
+
+from utilities.DocumentLoader import chunk_sections
+
+
+def count_tokens(texts):
+    # Un token par mot, plus deux jetons spéciaux (comme [CLS] et [SEP])
+    return [len(text.split()) + 2 for text in texts]
+
+
+def section(title, lines, source="Bouftou"):
+    return {"title": title, "filename": title.replace(" ", "_"), "text": f"Source: {source}\n\n" + "\n".join([f"### {title}"] + lines)}
+
+
+def body(chunk):
+    return chunk["text"].split("\n")[3:]
+
+
+def test_long_section_is_split_with_title_and_overlap():
+    lines = [f"ligne{i} a b c d" for i in range(6)]
+
+    chunks = chunk_sections([section("Salle 1", lines)], count_tokens, max_tokens=22, overlap_tokens=5, min_tokens=0)
+
+    assert [c["part"] for c in chunks] == [0, 1, 2]
+    assert all(c["text"].startswith("Source: Bouftou\n\n### Salle 1\n") for c in chunks)
+    assert all(count_tokens([c["text"]])[0] <= 22 for c in chunks)
+    # Chaque morceau reprend la dernière ligne du précédent
+    for previous, current in zip(chunks, chunks[1:]):
+        assert body(current)[0] == body(previous)[-1]
+    assert list(dict.fromkeys(line for c in chunks for line in body(c))) == lines
+
+
+def test_small_sections_are_merged_with_their_neighbour():
+    intro = section("Intro", ["court"])
+    room = section("Salle 1", ["le boss frappe fort au corps à corps"])
+    outro = section("Fin", ["bravo"])
+
+    chunks = chunk_sections([intro, room, outro], count_tokens, max_tokens=100, overlap_tokens=0, min_tokens=8)
+
+    # Intro est fusionnée avec la suivante, Fin (dernière) avec la précédente
+    assert len(chunks) == 1
+    assert chunks[0]["sections"] == ["Intro", "Salle 1", "Fin"]
+    assert chunks[0]["text"].count("Source: Bouftou") == 1
+    assert "### Fin\nbravo" in chunks[0]["text"]
+
+
+def test_small_section_is_kept_when_merge_exceeds_budget():
+    intro = section("Intro", ["court"])
+    room = section("Salle 1", ["mot " * 15])
+
+    chunks = chunk_sections([intro, room], count_tokens, max_tokens=22, overlap_tokens=0, min_tokens=8)
+
+    assert [c["sections"] for c in chunks] == [["Intro"], ["Salle 1"]]
+
+
+def test_line_longer_than_max_tokens_is_split_between_words():
+    words = [f"mot{i}" for i in range(50)]
+
+    chunks = chunk_sections([section("Salle 1", [" ".join(words)])], count_tokens, max_tokens=22, overlap_tokens=4, min_tokens=0)
+
+    assert len(chunks) > 1
+    assert all(count_tokens([c["text"]])[0] <= 22 for c in chunks)
+    assert " ".join(line for c in chunks for line in body(c)).split() == words
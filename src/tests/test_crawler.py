@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+import pytest
+
+web = pytest.importorskip("aiohttp.web")
+
+from utilities.Crawler import DPLNCrawler
+
+
+INDEX = """<html><body><table id="trier"><tbody>
+<tr><td>1</td><td><a href="/stable.html">Donjon stable</a></td><td>50</td></tr>
+<tr><td>2</td><td><a href="/flaky.html">Donjon instable</a></td><td>60</td></tr>
+</tbody></table></body></html>"""
+
+PAGE = """<html><body><div id="wsite-content">
+<h2 class="wsite-content-title">{title}</h2>
+<div class="paragraph">PUBLICITE</div>
+<p>Le boss invoque des monstres.</p>
+</div></body></html>"""
+
+
+@pytest.fixture
+def site():
+    """Faux site servi par aiohttp.web dans sa propre boucle : /flaky.html répond 503 une fois."""
+    state = {"hits": defaultdict(int), "times": []}
+
+    async def handle(request):
+        name = request.match_info["name"]
+        state["hits"][name] += 1
+        state["times"].append(time.monotonic())
+        if name == "donjons.html":
+            return web.Response(text=INDEX, content_type="text/html")
+        if name == "flaky.html" and state["hits"][name] == 1:
+            return web.Response(status=503)
+        etag = f'"{name}-v1"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        return web.Response(text=PAGE.format(title=name), content_type="text/html", headers={"ETag": etag})
+
+    app = web.Application()
+    app.router.add_get("/{name}", handle)
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", 0).start())
+    port = runner.addresses[0][1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{port}", state
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.run_until_complete(runner.cleanup())
+    loop.close()
+
+
+def test_retries_transient_errors(site, tmp_path):
+    base_url, state = site
+    crawler = DPLNCrawler(output_dir=tmp_path / "out", base_url=base_url, cache_dir=tmp_path / "cache", requests_per_second=0, max_retries=2)
+
+    stats = crawler.run(quests=False)
+
+    assert stats["errors"] == 0
+    assert state["hits"]["flaky.html"] == 2
+    assert stats["downloaded"] == 3
+    assert (tmp_path / "out" / "Dungeons" / "flaky.html").exists()
+    text = (tmp_path / "out" / "Dungeons" / "txt" / "flaky.txt").read_text(encoding="utf-8")
+    assert "Le boss invoque des monstres." in text
+    assert "PUBLICITE" not in text
+
+
+def test_recrawl_revalidates_with_304(site, tmp_path):
+    base_url, state = site
+    crawler = DPLNCrawler(output_dir=tmp_path / "out", base_url=base_url, cache_dir=tmp_path / "cache", requests_per_second=0)
+    crawler.run(quests=False)
+
+    # Second asyncio.run : le sémaphore et le limiteur ne doivent pas rester liés à la première boucle
+    stats = crawler.run(quests=False)
+
+    assert stats["errors"] == 0
+    assert stats["not_modified"] == 2
+    assert stats["downloaded"] == 1  # donjons.html n'a pas d'ETag
+    assert stats["written_files"] == 0
+    assert stats["unchanged_files"] == 4
+
+
+def test_rate_limit_spaces_requests(site, tmp_path):
+    base_url, state = site
+    crawler = DPLNCrawler(output_dir=tmp_path / "out", base_url=base_url, cache_dir=None, concurrency=8, requests_per_second=10)
+
+    crawler.run(quests=False)
+
+    times = sorted(state["times"])
+    assert len(times) == 4
+    assert min(b - a for a, b in zip(times, times[1:])) >= 0.08
@@ -0,0 +1,157 @@
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("pymongo")
+pytest.importorskip("html_to_markdown")
+
+from benchmarks.fakes import FakeEmbeddings, InMemoryDatabase
+from utilities.DocumentLoader import DocumentProcessor
+from utilities.Metrics import Metrics
+
+
+PAGE = """<html><body>
+<h2 class="wsite-content-title">{title}</h2>
+<h3>Salle 1</h3>
+<p>{text}</p>
+<h3>Salle 2</h3>
+<p>{boss}</p>
+</body></html>"""
+
+
+SHARED = "Parler à Otomaï sur l'île, puis rapporter les trois plumes de Kwak au temple du village."
+
+
+def write_page(folder, name, title, text, boss=None):
+    boss = boss or f"Le boss de {title} se place au centre de la salle et frappe au corps à corps."
+    (folder / name).write_text(PAGE.format(title=title, text=text, boss=boss), encoding="utf-8")
+
+
+def stored_titles(processor):
+    store = processor.vector_store
+    return {store._metadatas[i]["title"] for i in range(len(store))}
+
+
+@pytest.fixture
+def make_processor(tmp_path, monkeypatch):
+    # process_folder écrit stats.json dans le dossier courant
+    monkeypatch.chdir(tmp_path)
+    processors = []
+
+    def make(**kwargs):
+        processor = DocumentProcessor(
+            "mongodb://localhost:27017",
+            vector_backend="local",
+            local_store_dir=str(tmp_path / "store"),
+            embeddings=FakeEmbeddings(dim=64),
+            metrics=Metrics(),
+            **kwargs,
+        )
+        # Aucune écriture ne doit partir vers MongoDB
+        processor.db = InMemoryDatabase()
+        processors.append(processor)
+        return processor
+
+    yield make
+    for processor in processors:
+        processor.close()
+
+
+@pytest.fixture
+def processor(make_processor):
+    return make_processor()
+
+
+@pytest.fixture
+def pages(tmp_path):
+    folder = tmp_path / "pages"
+    folder.mkdir()
+    return folder
+
+
+def test_incremental_run_removes_deleted_page_and_skips_unchanged(pages, processor):
+    write_page(pages, "bouftou.html", "Bouftou Royal", "Le Bouftou Royal invoque des bouftous.")
+    write_page(pages, "dragon.html", "Dragon Cochon", "Le Dragon Cochon mange les ressources au sol.")
+
+    first = processor.process_folder(str(pages), incremental=True)
+    manifest_path = pages / ".ingest_manifest.json"
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    dragon_ids = manifest["files"]["dragon.html"]["ids"]
+    assert first["skipped_files"] == 0 and dragon_ids
+    assert stored_titles(processor) == {"Bouftou Royal", "Dragon Cochon"}
+
+    (pages / "dragon.html").unlink()
+    second = processor.process_folder(str(pages), incremental=True)
+
+    assert second["deleted_files"] == 1
+    assert second["skipped_files"] == 1
+    assert second["removed_doc_ids"] == len(dragon_ids)
+    assert stored_titles(processor) == {"Bouftou Royal"}
+    assert not set(dragon_ids) & set(processor.vector_store._ids)
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    assert list(manifest["files"]) == ["bouftou.html"]
+    # Aucun accès au magasin Atlas ni à Ingest_Generations avec le backend local
+    assert not processor.db
+
+
+def test_unchanged_pages_are_not_reembedded(pages, processor):
+    write_page(pages, "bouftou.html", "Bouftou Royal", "Le Bouftou Royal invoque des bouftous.")
+    processor.process_folder(str(pages), incremental=True)
+    stored = list(processor.vector_store._ids)
+
+    stats = processor.process_folder(str(pages), incremental=True)
+
+    assert stats["skipped_files"] == 1 and stats["total_doc_ids"] == 0
+    assert processor.vector_store._ids == stored
+
+
+def shared_copies(processor):
+    store = processor.vector_store
+    return [store._metadatas[i] for i in range(len(store)) if SHARED in store._texts[i]]
+
+
+def test_pages_in_one_batch_share_a_chunk(tmp_path, pages, make_processor):
+    processor = make_processor(dedup_threshold=0.9, dedup_dir=str(tmp_path / "dedup"))
+    write_page(pages, "a.html", "Île de Moon", "Le Kralamour attaque depuis l'eau.", boss=SHARED)
+    write_page(pages, "b.html", "Île d'Otomaï", "Le Dragon Cochon mange les ressources.", boss=SHARED)
+
+    stats = processor.process_folder(str(pages))
+
+    # La page b trouve le chunk de a, en attente d'écriture dans le même lot
+    assert stats["write_batches"] == 1
+    copies = shared_copies(processor)
+    assert len(copies) == 1
+    assert copies[0]["URLs"] == [processor._page_url("a.html"), processor._page_url("b.html")]
+    manifest = json.loads((pages / ".ingest_manifest.json").read_text(encoding="utf-8"))
+    assert set(manifest["files"]["a.html"]["ids"]) & set(manifest["files"]["b.html"]["ids"])
+
+
+def test_failed_writer_requeues_pages_sharing_its_chunk(tmp_path, pages, make_processor, monkeypatch):
+    # Un lot par page : b dépend d'un chunk de a, dont le lot échoue
+    processor = make_processor(dedup_threshold=0.9, dedup_dir=str(tmp_path / "dedup"), write_batch_docs=1)
+    write_page(pages, "a.html", "Île de Moon", "Le Kralamour attaque depuis l'eau.", boss=SHARED)
+    write_page(pages, "b.html", "Île d'Otomaï", "Le Dragon Cochon mange les ressources.", boss=SHARED)
+    write_documents = processor._write_documents
+    calls = []
+
+    def fail_first_batch(docs, vectors):
+        calls.append(len(docs))
+        if len(calls) == 1:
+            raise RuntimeError("écriture refusée")
+        return write_documents(docs, vectors)
+
+    monkeypatch.setattr(processor, "_write_documents", fail_first_batch)
+    stats = processor.process_folder(str(pages), incremental=True)
+
+    # b a été écrite, mais sans copie du chunk partagé : elle n'est pas enregistrée
+    assert len(calls) == 2
+    assert stats["failed_files"] == 2
+    assert len(processor.vector_store) == 0 and len(processor.dedup_index) == 0
+    manifest = json.loads((pages / ".ingest_manifest.json").read_text(encoding="utf-8"))
+    assert manifest["files"] == {}
+
+    stats = processor.process_folder(str(pages), incremental=True)
+    assert stats["failed_files"] == 0
+    assert len(shared_copies(processor)) == 1
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("rapidfuzz")
+
+from benchmarks.fakes import FakeEmbeddings
+from rag_tool import RAGTool
+from utilities.LocalVectorStore import LocalVectorStore
+
+
+BOUFTOU = "Le Bouftou Royal invoque des bouftous puis charge le lanceur de sorts le plus proche."
+DRAGON = "Le Dragon Cochon mange les ressources au sol et se soigne à chaque tour."
+
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings(dim=64)
+
+
+def data_files(path):
+    return sorted(f.name for f in path.iterdir() if f.name != LocalVectorStore.META_FILE)
+
+
+def test_save_swaps_snapshot_through_meta(tmp_path, embeddings):
+    store = LocalVectorStore(embedding=embeddings, path=str(tmp_path))
+    store.add_texts([BOUFTOU], metadatas=[{"title": "Bouftou"}], ids=["a"])
+    store.save()
+    first = data_files(tmp_path)
+    store.add_texts([DRAGON], metadatas=[{"title": "Dragon"}], ids=["b"])
+    store.save()
+
+    # Les fichiers de l'instantané précédent sont remplacés, pas réécrits en place
+    assert len(data_files(tmp_path)) == 1
+    assert data_files(tmp_path) != first
+    meta = json.loads((tmp_path / LocalVectorStore.META_FILE).read_text(encoding="utf-8"))
+    assert meta["rows"] == 2 and meta["files"]["vectors"] == data_files(tmp_path)[0]
+    assert len(LocalVectorStore(embedding=embeddings, path=str(tmp_path))) == 2
+
+
+def test_load_rejects_mismatched_snapshot(tmp_path, embeddings):
+    store = LocalVectorStore(embedding=embeddings, path=str(tmp_path))
+    store.add_texts([BOUFTOU, DRAGON], ids=["a", "b"])
+    store.save()
+    meta_path = tmp_path / LocalVectorStore.META_FILE
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    meta["rows"] = 3
+    meta_path.write_text(json.dumps(meta), encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        LocalVectorStore(embedding=embeddings, path=str(tmp_path))
+
+
+def test_ann_index_is_published_whole(tmp_path, embeddings):
+    store = LocalVectorStore(embedding=embeddings, path=str(tmp_path), ann_threshold=1, n_probe=1)
+    store.add_texts([BOUFTOU, DRAGON], ids=["a", "b"])
+
+    assert store.similarity_search(DRAGON, k=1)[0].id == "b"
+    centroids, order, offsets = store._ivf
+    assert len(offsets) == len(centroids) + 1 and sorted(order) == [0, 1]
+    store.save()
+    assert LocalVectorStore(embedding=embeddings, path=str(tmp_path), ann_threshold=1)._ivf is not None
+
+
+def test_rag_tool_reloads_local_store_on_new_snapshot(tmp_path, embeddings):
+    path = tmp_path / "Vec_Dungeons"
+    store = LocalVectorStore(embedding=embeddings, path=str(path))
+    store.add_texts([BOUFTOU], metadatas=[{"title": "Bouftou"}], ids=["a"])
+    store.save()
+    tool = RAGTool(
+        None, k=1, vector_backend="local", local_store_dir=str(tmp_path), embeddings=embeddings,
+        result_cache_size=8, generation_check_interval=0.0
+    )
+    assert [doc.id for doc in tool._search("dungeon", DRAGON)] == ["a"]
+
+    writer = LocalVectorStore(embedding=embeddings, path=str(path))
+    writer.add_texts([DRAGON], metadatas=[{"title": "Dragon"}], ids=["b"])
+    writer.save()
+
+    # Même question : le résultat en cache de l'ancien instantané ne doit pas être servi
+    assert [doc.id for doc in tool._search("dungeon", DRAGON)] == ["b"]
+    assert len(tool._vector_store("dungeon")) == 2
@@ -0,0 +1,123 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utilities.NearDuplicates import NearDuplicateIndex
+
+
+TEXT = "Source: {url}\n\n### Salle 2\nLe Bouftou Royal invoque des bouftous puis charge le lanceur de sorts le plus proche en ligne droite."
+URL_A, URL_B = "https://www.dofuspourlesnoobs.com/a.html", "https://www.dofuspourlesnoobs.com/b.html"
+
+
+@pytest.fixture
+def index():
+    return NearDuplicateIndex(threshold=0.9)
+
+
+def add_committed(index, chunk_id, url, title):
+    index.add(chunk_id, index.signature(TEXT.format(url=url)), url, title, pending=True)
+    index.commit([chunk_id])
+
+
+def test_pending_chunk_is_canonical_and_records_dependents(index):
+    index.add("x", index.signature(TEXT.format(url=URL_A)), URL_A, "A", pending=True)
+
+    assert index.find(index.signature(TEXT.format(url=URL_B)), exclude_owner=URL_B) == "x"
+    index.add_owner("x", URL_B, "B")
+
+    assert index.discard(["x"]) == [URL_B]
+    assert len(index) == 0
+
+
+def test_committed_chunk_has_no_dependents(index):
+    index.add("x", index.signature(TEXT.format(url=URL_A)), URL_A, "A", pending=True)
+    index.add_owner("x", URL_B, "B")
+    index.commit(["x"])
+
+    assert index.discard(["x"]) == []
+    assert index.owners("x") == {URL_A: "A", URL_B: "B"}
+
+
+def test_removed_dependent_is_not_requeued(index):
+    index.add("x", index.signature(TEXT.format(url=URL_A)), URL_A, "A", pending=True)
+    index.add_owner("x", URL_B, "B")
+    index.remove_owner("x", URL_B)
+
+    assert index.discard(["x"]) == []
+
+
+def test_discard_forgets_failed_chunk(index):
+    index.add("x", index.signature(TEXT.format(url=URL_A)), URL_A, "A", pending=True)
+    assert index.discard(["x"]) == []
+
+    assert len(index) == 0
+    assert index.owners("x") == {}
+
+
+def test_owner_add(index):
+    add_committed(index, "x", URL_A, "A")
+
+    owners = index.add_owner("x", URL_B, "B")
+
+    assert owners == {URL_A: "A", URL_B: "B"}
+
+
+def test_owner_remove_keeps_shared_chunk(index):
+    add_committed(index, "x", URL_A, "A")
+    index.add_owner("x", URL_B, "B")
+
+    remaining = index.remove_owner("x", URL_A)
+
+    assert remaining == {URL_B: "B"}
+    assert len(index) == 1
+    assert index.find(index.signature(TEXT.format(url=URL_A))) == "x"
+
+
+def test_remove_last_owner_drops_chunk(index):
+    add_committed(index, "x", URL_A, "A")
+
+    assert index.remove_owner("x", URL_A) == {}
+    assert len(index) == 0
+    assert index.find(index.signature(TEXT.format(url=URL_B))) is None
+
+
+def test_save_skips_pending_chunks(index, tmp_path):
+    add_committed(index, "x", URL_A, "A")
+    index.add("y", index.signature("Source: y\n\n### Étape 1\nParler à Otomaï sur l'île."), URL_B, "B", pending=True)
+
+    index.save(tmp_path / "dedup.npz")
+    loaded = NearDuplicateIndex(tmp_path / "dedup.npz")
+
+    assert len(loaded) == 1
+    assert loaded.owners("x") == {URL_A: "A"}
+
+
+class FakeStore:
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, ids):
+        self.deleted.extend(ids)
+
+
+def test_delete_ids_deletes_only_with_last_owner(index):
+    loader = pytest.importorskip("utilities.DocumentLoader")
+    from utilities.Metrics import Metrics
+
+    add_committed(index, "x", URL_A, "A")
+    index.add_owner("x", URL_B, "B")
+    processor = SimpleNamespace(
+        dedup_index=index, _dedup_lock=threading.Lock(), _owner_updates=set(),
+        vector_store=FakeStore(), bm25_index=None, metrics=Metrics(),
+    )
+
+    assert loader.DocumentProcessor._delete_ids(processor, ["x"], owner_url=URL_A) == 0
+    assert processor.vector_store.deleted == []
+    assert processor._owner_updates == {"x"}
+
+    assert loader.DocumentProcessor._delete_ids(processor, ["x"], owner_url=URL_B) == 1
+    assert processor.vector_store.deleted == ["x"]
+    assert len(index) == 0
@@ -0,0 +1,75 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("rapidfuzz")
+
+from langchain_core.documents import Document
+
+from utilities.ResultCache import ResultCache
+
+
+def docs():
+    return [Document(page_content="Le Bouftou Royal invoque des bouftous.", metadata={"title": "Bouftou", "titles": ["Bouftou"]}, id="a")]
+
+
+@pytest.fixture
+def cache():
+    return ResultCache(max_entries=8, ttl=60.0, semantic_threshold=0.9)
+
+
+def test_exact_hit_ignores_case_and_accents(cache):
+    cache.put("dungeon", "Bouftou", "Comment battre le Bouftou Royal ?", [1.0, 0.0], docs())
+
+    hit = cache.get("dungeon", "Bouftou", "comment battre le bouftou royal ?")
+
+    assert [doc.id for doc in hit] == ["a"]
+    assert cache.get("dungeon", None, "Comment battre le Bouftou Royal ?") is None
+    assert cache.stats()["hits"]["exact"] == 1
+
+
+def test_semantic_hit_requires_threshold_and_same_subject(cache):
+    cache.put("dungeon", "Bouftou", "Comment battre le Bouftou Royal ?", [1.0, 0.0], docs())
+
+    assert [doc.id for doc in cache.get_similar("dungeon", "Bouftou", [0.99, 0.05])] == ["a"]
+    assert cache.get_similar("dungeon", "Bouftou", [0.5, 0.5]) is None
+    assert cache.get_similar("dungeon", "Dragon", [1.0, 0.0]) is None
+    assert cache.stats()["hits"]["semantic"] == 1
+
+
+def test_returned_documents_are_copies(cache):
+    results = docs()
+    cache.put("dungeon", None, "bouftou", None, results)
+    results[0].metadata["title"] = "modifié par l'appelant"
+
+    first = cache.get("dungeon", None, "bouftou")
+    first[0].metadata["titles"].append("Dragon")
+    first[0].page_content = ""
+
+    second = cache.get("dungeon", None, "bouftou")
+    assert second[0].metadata == {"title": "Bouftou", "titles": ["Bouftou"]}
+    assert second[0].page_content == docs()[0].page_content
+
+
+def test_invalidate_drops_only_the_store(cache):
+    cache.put("dungeon", None, "bouftou", [1.0, 0.0], docs())
+    cache.put("quest", None, "bouftou", [1.0, 0.0], docs())
+
+    cache.invalidate("dungeon")
+
+    assert cache.get("dungeon", None, "bouftou") is None
+    assert cache.get_similar("dungeon", None, [1.0, 0.0]) is None
+    assert cache.get("quest", None, "bouftou") is not None
+
+
+def test_rag_tool_does_not_cache_results_of_a_stale_generation():
+    from rag_tool import RAGTool
+    from benchmarks.fakes import FakeEmbeddings
+
+    tool = RAGTool(None, embeddings=FakeEmbeddings(dim=16), result_cache_size=8)
+    tool._generations["dungeon"] = 1
+    tool._cache_put("dungeon", 0, None, "bouftou", None, docs())
+    assert tool.result_cache.get("dungeon", None, "bouftou") is None
+
+    tool._cache_put("dungeon", 1, None, "bouftou", None, docs())
+    assert tool.result_cache.get("dungeon", None, "bouftou") is not None
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip("numpy")
+fuzz = pytest.importorskip("rapidfuzz.fuzz")
+
+from utilities.TitleIndex import TitleIndex, normalize_title
+
+
+TITLES = [
+    "Aquadôme de Merkator", "Donjon des Bouftous", "Château du Wa Wabbit", "Manoir de Katrepat",
+    "Antre du Dragon Cochon", "Donjon des Forgerons", "Caverne du Koulosse", "Antre de la Reine Nyée",
+    "Laboratoire de Brumen Tinctorias", "Donjon des Scarafeuilles", "Bateau du Chouque", "Grotte Hesque",
+]
+QUERIES = [
+    "aquadome de merkatro", "donjon des boufous", "chateau du wawabbit", "manoir de katrpat",
+    "antre du dragon cocon", "caverne du koulose", "reine nyee", "bateau chouque", "xyz",
+]
+
+
+def baseline_best_name(titles, query, cutoff=70):
+    """get_best_name d'origine : fuzz.ratio sur tous les titres, premier maximum strict."""
+    best_score, best_match = 0, None
+    for title in titles:
+        score = fuzz.ratio(normalize_title(title), normalize_title(query))
+        if score > best_score:
+            best_score, best_match = score, title
+    return None if best_score < cutoff else best_match
+
+
+@pytest.mark.parametrize("prefilter_threshold", [5000, 1])
+@pytest.mark.parametrize("query", QUERIES)
+def test_matches_baseline(query, prefilter_threshold):
+    index = TitleIndex.from_titles(TITLES, prefilter_threshold=prefilter_threshold)
+
+    match, _ = index.best_match(query, score_cutoff=70)
+
+    assert match == baseline_best_name(TITLES, query)
+
+
+def test_truncated_candidates_fall_back_to_full_scoring():
+    # Le distracteur partage plus de trigrammes avec la requête (8 contre 7) mais reste sous le seuil
+    # (ratio 63.6) ; avec un seul candidat retenu, seul le repli trouve "abcdefgx" (ratio 87.5)
+    titles = ["fgh abcdefg zz", "abcdefgx"]
+    index = TitleIndex.from_titles(titles, prefilter_threshold=1, max_candidates=1)
+
+    candidates, truncated = index._candidates(index._snapshot, "abcdefgh", 70)
+    assert truncated
+    assert [index.titles[i] for i in candidates] == ["fgh abcdefg zz"]
+
+    match, score = index.best_match("abcdefgh", score_cutoff=70)
+    assert match == baseline_best_name(titles, "abcdefgh") == "abcdefgx"
+    assert score == pytest.approx(87.5)
@@ -0,0 +1,276 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+from typing import Dict, List, Optional, Tuple
+
+from utilities.TitleIndex import normalize_title
+
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = {
+    "le", "la", "les", "un", "une", "des", "du", "de", "d", "l", "et", "ou", "en", "au", "aux",
+    "a", "ce", "ces", "se", "sa", "son", "ses", "il", "elle", "on", "est", "que", "qui",
+    "pour", "par", "sur", "dans", "avec", "pas", "ne", "plus", "y", "comment", "quel", "quelle",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Découpe un texte en termes normalisés (minuscules, sans accents, sans mots vides)."""
+    return [t for t in TOKEN_PATTERN.findall(normalize_title(text)) if t not in STOPWORDS]
+
+
+class BM25Snapshot:
+    """Contenu d'une version de l'index : postings, chunks et chunks par titre."""
+
+    __slots__ = ("postings", "docs", "title_docs", "total_length")
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.docs: Dict[str, dict] = {}
+        self.title_docs: Dict[str, set] = {}
+        self.total_length = 0
+
+
+class BM25Index:
+    """Index inversé BM25 en mémoire sur les chunks d'un magasin.
+
+    Les noms propres (monstres, objets, PNJ) sont mal servis par les embeddings ;
+    l'index lexical les retrouve mot pour mot. Il se met à jour par identifiant
+    de chunk (ajout, remplacement, suppression) et se persiste en JSON.
+
+    `load` construit un nouvel instantané (BM25Snapshot) à part, puis le
+    remplace en une seule affectation : une recherche concurrente lit toujours
+    une seule version de l'index. Un seul rechargement a lieu à la fois.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        """Initialise l'index, en le chargeant depuis `path` s'il existe.
+
+        Args:
+            path: Fichier JSON de persistance.
+            k1: Paramètre de saturation de la fréquence des termes.
+            b: Paramètre de normalisation par la longueur du document.
+        """
+        self.path = Path(path) if path else None
+        self.k1 = k1
+        self.b = b
+
+        self._snapshot = BM25Snapshot()
+        self._mtime = None
+        # Sérialise les modifications et le remplacement de l'instantané
+        self._lock = threading.Lock()
+        # Un seul rechargement à la fois ; les autres threads gardent l'instantané courant
+        self._refresh_lock = threading.Lock()
+
+        if self.path is not None and self.path.exists():
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._snapshot.docs)
+
+    def add(self, doc_id: str, text: str, metadata: dict):
+        """Ajoute ou remplace un chunk.
+
+        Args:
+            doc_id: Identifiant du chunk (le même que dans le magasin de vecteurs).
+            text: Contenu du chunk.
+            metadata: Métadonnées du chunk (les champs "titles", à défaut "title", servent au filtrage).
+        """
+        with self._lock:
+            self._add(self._snapshot, doc_id, text, metadata)
+
+    @classmethod
+    def _add(cls, snapshot: BM25Snapshot, doc_id: str, text: str, metadata: dict):
+        if doc_id in snapshot.docs:
+            cls._remove(snapshot, doc_id)
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        snapshot.docs[doc_id] = {"text": text, "metadata": metadata, "length": length, "terms": terms}
+        snapshot.total_length += length
+        for term, tf in terms.items():
+            snapshot.postings.setdefault(term, {})[doc_id] = tf
+        cls._index_titles(snapshot, doc_id, metadata)
+
+    @staticmethod
+    def _titles(metadata: dict) -> list:
+        """Titres d'un chunk : toutes ses pages propriétaires s'il est partagé, sinon son titre."""
+        return [t for t in (metadata.get("titles") or [metadata.get("title")]) if t is not None]
+
+    @classmethod
+    def _index_titles(cls, snapshot: BM25Snapshot, doc_id: str, metadata: dict):
+        for title in cls._titles(metadata):
+            snapshot.title_docs.setdefault(title, set()).add(doc_id)
+
+    @classmethod
+    def _unindex_titles(cls, snapshot: BM25Snapshot, doc_id: str, metadata: dict):
+        for title in cls._titles(metadata):
+            if title in snapshot.title_docs:
+                snapshot.title_docs[title].discard(doc_id)
+                if not snapshot.title_docs[title]:
+                    del snapshot.title_docs[title]
+
+    def update_metadata(self, doc_id: str, metadata: dict):
+        """Remplace des champs des métadonnées d'un chunk (par exemple ses pages propriétaires)."""
+        with self._lock:
+            snapshot = self._snapshot
+            doc = snapshot.docs.get(doc_id)
+            if doc is None:
+                return
+            self._unindex_titles(snapshot, doc_id, doc["metadata"])
+            doc["metadata"] = {**doc["metadata"], **metadata}
+            self._index_titles(snapshot, doc_id, doc["metadata"])
+
+    def add_documents(self, docs: List[Document]):
+        """Ajoute des Documents LangChain identifiés par `doc.id`."""
+        for doc in docs:
+            self.add(doc.id, doc.page_content, doc.metadata)
+
+    def remove(self, ids: List[str]):
+        """Supprime des chunks par identifiant."""
+        with self._lock:
+            for doc_id in ids:
+                self._remove(self._snapshot, doc_id)
+
+    @classmethod
+    def _remove(cls, snapshot: BM25Snapshot, doc_id: str):
+        doc = snapshot.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        snapshot.total_length -= doc["length"]
+        for term in doc["terms"]:
+            postings = snapshot.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del snapshot.postings[term]
+        cls._unindex_titles(snapshot, doc_id, doc["metadata"])
+
+    def search(self, query: str, k: int = 10, title: Optional[str] = None) -> List[Tuple[Document, float]]:
+        """Retourne les `k` meilleurs chunks au sens de BM25.
+
+        Args:
+            query: Requête en texte libre.
+            k: Nombre de résultats.
+            title: Si fourni, restreint la recherche aux chunks de ce titre.
+
+        Returns:
+            Liste de tuples (Document, score), par score décroissant.
+        """
+        snapshot = self._snapshot
+        if not snapshot.docs:
+            return []
+        allowed = None
+        if title is not None:
+            allowed = snapshot.title_docs.get(title)
+            if not allowed:
+                return []
+
+        n_docs = len(snapshot.docs)
+        avg_length = snapshot.total_length / n_docs if n_docs else 0.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = snapshot.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                length = snapshot.docs[doc_id]["length"]
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length) if avg_length else tf + self.k1
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            (Document(page_content=snapshot.docs[i]["text"], metadata=dict(snapshot.docs[i]["metadata"]), id=i), score)
+            for i, score in best
+        ]
+
+    def save(self, path: Optional[str] = None):
+        """Écrit l'index en JSON (remplacement atomique)."""
+        path = Path(path) if path else self.path
+        if path is None:
+            raise ValueError("Aucun fichier de sauvegarde n'est défini pour cet index")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "docs": {i: {"text": d["text"], "metadata": d["metadata"]} for i, d in self._snapshot.docs.items()},
+        }
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._mtime = path.stat().st_mtime
+
+    def load(self, path: Optional[str] = None):
+        """Charge un index écrit par `save` (les postings sont reconstruits à part, puis remplacés en bloc)."""
+        path = Path(path) if path else self.path
+        mtime = path.stat().st_mtime
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        snapshot = BM25Snapshot()
+        for doc_id, doc in data["docs"].items():
+            self._add(snapshot, doc_id, doc["text"], doc["metadata"])
+        with self._lock:
+            self.k1 = data.get("k1", self.k1)
+            self.b = data.get("b", self.b)
+            self._snapshot = snapshot
+            self._mtime = mtime
+
+    def refresh(self) -> bool:
+        """Recharge l'index si le fichier a été réécrit depuis le dernier chargement.
+
+        Si un autre thread recharge déjà l'index, retourne aussitôt False : la
+        recherche en cours utilise l'instantané courant.
+        """
+        if self.path is None or not self.path.exists():
+            return False
+        if self.path.stat().st_mtime == self._mtime:
+            return False
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            # Un rechargement concurrent a pu se terminer entre-temps
+            if self.path.stat().st_mtime == self._mtime:
+                return False
+            self.load()
+            return True
+        finally:
+            self._refresh_lock.release()
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """Fusionne plusieurs classements par Reciprocal Rank Fusion.
+
+    Args:
+        result_lists: Classements à fusionner, chacun ordonné du plus au moins pertinent.
+        k: Nombre de documents retournés.
+        rrf_k: Constante de lissage de RRF (60 dans l'article d'origine).
+
+    Returns:
+        Les `k` documents de meilleur score fusionné.
+    """
+    # Un document sans identifiant (selon le magasin) est rapproché par son texte de sa copie identifiée
+    content_keys = {}
+    for results in result_lists:
+        for doc in results:
+            doc_id = doc.id or doc.metadata.get("_id")
+            if doc_id is not None:
+                content_keys.setdefault(doc.page_content, str(doc_id))
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            doc_id = doc.id or doc.metadata.get("_id")
+            key = str(doc_id) if doc_id is not None else content_keys.get(doc.page_content, doc.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
@@ -0,0 +1,176 @@
+from langchain_core.documents import Document
+
+from typing import Callable, List, Optional, Tuple
+
+from utilities.Metrics import Metrics, registry
+from utilities.text_similarity import SOURCE_PREFIX, containment, jaccard, shingles
+
+
+# Caractères par token, en moyenne, du tokenizer Mistral sur du texte français
+CHARS_PER_TOKEN = 3.5
+# Bornes de l'histogramme des tokens envoyés au LLM
+TOKEN_BUCKETS = (128, 256, 512, 1024, 1536, 2048, 3072, 4096, 8192)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estime le nombre de tokens d'un texte sans charger de tokenizer."""
+    return max(1, round(len(text) / CHARS_PER_TOKEN))
+
+
+class ContextPacker:
+    """Prépare les documents retrouvés par RAGTool avant de les donner au LLM.
+
+    Les étapes sont, dans l'ordre :
+      - suppression des chunks en double ou recouverts par un chunk mieux classé ;
+      - sélection MMR (Maximal Marginal Relevance), qui alterne pertinence (rang
+        de la recherche) et diversité (similarité lexicale aux chunks déjà retenus) ;
+      - arrêt au budget de tokens, le dernier chunk pouvant être tronqué ;
+      - sérialisation compacte : une ligne d'en-tête (titre, section, URL) par chunk,
+        sans les autres métadonnées ni la ligne "Source:" redondante.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 1500,
+        mmr_lambda: float = 0.7,
+        duplicate_threshold: float = 0.8,
+        min_tokens: int = 48,
+        count_tokens: Optional[Callable[[str], int]] = None,
+        metrics: Metrics = None
+    ):
+        """Initialise le packer.
+
+        Args:
+            token_budget: Nombre maximal de tokens du contexte retourné par un appel d'outil.
+            mmr_lambda: Poids de la pertinence face à la diversité (1.0 = ordre de la recherche).
+            duplicate_threshold: Recouvrement (part de suites de mots communes) à partir duquel
+                un chunk est considéré comme un doublon d'un chunk mieux classé.
+            min_tokens: Place restante minimale pour ajouter un dernier chunk tronqué.
+            count_tokens: Fonction de comptage des tokens (par exemple `ChatMistralAI.get_num_tokens`),
+                par défaut une estimation à partir du nombre de caractères.
+            metrics: Registre des métriques, par défaut `utilities.Metrics.registry`.
+        """
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.min_tokens = min_tokens
+        self.count_tokens = count_tokens or estimate_tokens
+        self.metrics = metrics if metrics is not None else registry
+
+    @staticmethod
+    def _content(doc: Document) -> str:
+        return SOURCE_PREFIX.sub("", doc.page_content, count=1).strip()
+
+    @staticmethod
+    def _header(doc: Document, position: int) -> str:
+        metadata = doc.metadata
+        parts = [str(metadata.get("title", ""))]
+        section = metadata.get("filename")
+        if section and section != "full":
+            parts.append(str(section).replace("_", " "))
+        header = f"[{position}] " + " › ".join(p for p in parts if p)
+        if metadata.get("URL"):
+            header += f" | {metadata['URL']}"
+        return header
+
+    def _deduplicate(self, documents: List[Document]) -> List[Tuple[Document, frozenset]]:
+        """Retire les chunks recouverts par un chunk mieux classé, en conservant l'ordre."""
+        kept = []
+        for doc in documents:
+            signature = shingles(self._content(doc))
+            if any(containment(signature, other) >= self.duplicate_threshold for _, other in kept):
+                self.metrics.increment("agent_context_dropped_total", reason="duplicate")
+                continue
+            kept.append((doc, signature))
+        return kept
+
+    def _mmr_order(self, candidates: List[Tuple[Document, frozenset]]) -> List[Document]:
+        """Ordonne les candidats par MMR, la pertinence étant dérivée du rang de la recherche."""
+        n = len(candidates)
+        relevance = [1.0 - i / n for i in range(n)]
+        remaining = list(range(n))
+        order = []
+        while remaining:
+            def score(i):
+                redundancy = max((jaccard(candidates[i][1], candidates[j][1]) for j in order), default=0.0)
+                return self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * redundancy
+            best = max(remaining, key=score)
+            remaining.remove(best)
+            order.append(best)
+        return [candidates[i][0] for i in order]
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """Coupe un texte à `max_tokens`, à une fin de ligne ou de mot."""
+        tokens = self.count_tokens(text)
+        while tokens > max_tokens and text:
+            cut = text[:int(len(text) * max_tokens / tokens * 0.95)]
+            boundary = max(cut.rfind("\n"), cut.rfind(" "))
+            text = (cut[:boundary] if boundary > len(cut) // 2 else cut).rstrip()
+            tokens = self.count_tokens(text + " …")
+        return text + " …"
+
+    def select(self, documents: List[Document], token_budget: Optional[int] = None) -> List[Tuple[Document, str]]:
+        """Déduplique, ordonne par MMR et retient les chunks qui tiennent dans le budget.
+
+        Returns:
+            Les chunks retenus, chacun avec son texte (éventuellement tronqué).
+        """
+        budget = token_budget if token_budget is not None else self.token_budget
+        selected, used = [], 0
+        for doc in self._mmr_order(self._deduplicate(documents)):
+            text = self._content(doc)
+            tokens = self.count_tokens(self._header(doc, len(selected) + 1) + "\n" + text)
+            if used + tokens <= budget:
+                selected.append((doc, text))
+                used += tokens
+                continue
+            remaining = budget - used - self.count_tokens(self._header(doc, len(selected) + 1))
+            if remaining >= self.min_tokens:
+                selected.append((doc, self._truncate(text, remaining)))
+            self.metrics.increment("agent_context_dropped_total", reason="budget")
+            break
+        return selected
+
+    @staticmethod
+    def source(doc: Document) -> dict:
+        """Référence d'un chunk retenu (titre, section, URL), pour l'affichage des sources."""
+        metadata = doc.metadata
+        return {"title": metadata.get("title"), "section": metadata.get("section") or metadata.get("filename"), "URL": metadata.get("URL")}
+
+    def pack(self, documents: List[Document], token_budget: Optional[int] = None) -> str:
+        """Retourne le contexte compact des documents d'une recherche."""
+        return self.pack_with_sources(documents, token_budget)[0]
+
+    def pack_with_sources(self, documents: List[Document], token_budget: Optional[int] = None) -> Tuple[str, List[dict]]:
+        """Comme `pack`, en retournant aussi les sources des chunks retenus (voir `source`)."""
+        # Messages d'erreur de RAGTool (magasin ou sujet inconnu) : transmis tels quels
+        if any(doc.metadata.get("error") for doc in documents):
+            return "\n".join(doc.page_content for doc in documents), []
+        if not documents:
+            return "Aucun document trouvé.", []
+
+        selected = self.select(documents, token_budget)
+        blocks = [f"{self._header(doc, i)}\n{text}" for i, (doc, text) in enumerate(selected, start=1)]
+        context = "\n\n".join(blocks)
+        self.metrics.observe("agent_context_tokens", self.count_tokens(context), buckets=TOKEN_BUCKETS)
+        return context, [self.source(doc) for doc, _ in selected]
+
+    def pack_many(self, labelled: List[Tuple[str, List[Document]]]) -> str:
+        """Retourne le contexte de plusieurs recherches, le budget étant partagé entre elles.
+
+        Args:
+            labelled: Liste de (libellé de la recherche, documents).
+        """
+        return self.pack_many_with_sources(labelled)[0]
+
+    def pack_many_with_sources(self, labelled: List[Tuple[str, List[Document]]]) -> Tuple[str, List[dict]]:
+        """Comme `pack_many`, en retournant aussi les sources retenues de toutes les recherches."""
+        if not labelled:
+            return "", []
+        budget = max(self.min_tokens, self.token_budget // len(labelled))
+        blocks, sources = [], []
+        for label, documents in labelled:
+            context, found = self.pack_with_sources(documents, budget)
+            blocks.append(f"## {label}\n{context}")
+            sources.extend(found)
+        return "\n\n".join(blocks), sources
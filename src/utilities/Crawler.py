@@ -0,0 +1,393 @@
+# ============================================================================
+# DPLNCrawler - Récupère les pages donjons et quêtes de dofuspourlesnoobs
+# ============================================================================
+
+# System import
+import asyncio
+import hashlib
+import json
+import time
+from pathlib import Path
+from urllib.parse import urljoin, urlparse
+
+# Utilities
+import aiohttp
+from bs4 import BeautifulSoup as bs
+from slugify import slugify
+from typing import List, Optional
+
+# Database import
+from pymongo import ReplaceOne
+
+
+class HostRateLimiter:
+    """Limite le nombre de requêtes par seconde vers chaque hôte.
+
+    Ses verrous sont liés à la boucle asyncio courante : créer un limiteur par
+    boucle (DPLNCrawler en crée un à chaque `crawl`).
+    """
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot = {}
+        self._locks = {}
+
+    async def wait(self, url: str):
+        """Attend le prochain créneau disponible pour l'hôte de `url`."""
+        if self.interval <= 0:
+            return
+        host = urlparse(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class ResponseCache:
+    """Cache disque des réponses HTTP, avec leurs validateurs ETag / Last-Modified."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, url: str) -> tuple:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.json", self.cache_dir / f"{key}.body"
+
+    def get(self, url: str) -> Optional[dict]:
+        """Retourne l'entrée en cache {"etag", "last_modified", "body"} ou None."""
+        meta_path, body_path = self._paths(url)
+        if not meta_path.exists() or not body_path.exists():
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        meta["body"] = body_path.read_bytes()
+        return meta
+
+    def put(self, url: str, body: bytes, etag: Optional[str], last_modified: Optional[str]):
+        """Enregistre une réponse et ses validateurs."""
+        meta_path, body_path = self._paths(url)
+        body_path.write_bytes(body)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "etag": etag, "last_modified": last_modified, "fetched_at": time.time()}, f)
+
+
+def clean_content(html: bytes) -> Optional[str]:
+    """Extrait le bloc div#wsite-content d'une page et retire les encarts publicitaires.
+
+    Args:
+        html: Contenu brut de la page.
+
+    Returns:
+        Le HTML nettoyé du bloc de contenu, ou None s'il est absent.
+    """
+    page_soup = bs(html, "html.parser").find("div", id="wsite-content")
+    if page_soup is None:
+        return None
+    for div in list(page_soup.children):
+        string = str(div)
+        if "PUBLICITE" in string or "data-ad-text" in string:
+            div.extract()
+    return str(page_soup)
+
+
+def parse_dungeon_index(html: bytes) -> dict:
+    """Analyse la page donjons.html : {nom: {"link", "lvl"}}."""
+    dungeon_info_list = {}
+    dungeon_table = bs(html, "html.parser").find("table", id="trier")
+    if dungeon_table is None:
+        return dungeon_info_list
+    dungeon_list = dungeon_table.find("tbody") or dungeon_table
+    for dungeon_elem in dungeon_list.find_all("tr"):
+        dungeon_info = dungeon_elem.find_all("td")
+        if len(dungeon_info) < 2 or dungeon_info[1].find("a") is None:
+            continue
+        link = dungeon_info[1].find("a")
+        dungeon_info_list[link.text.strip()] = {"link": link["href"], "lvl": dungeon_info[-1].text.strip()}
+    return dungeon_info_list
+
+
+def parse_success_index(html: bytes, base_url: str) -> List[dict]:
+    """Analyse la page "Listing des quêtes par succès".
+
+    Les trois premiers tableaux listent les succès (avec leur groupe), le
+    quatrième les quêtes hors succès, regroupées sous un succès "NOSUCCESS".
+
+    Returns:
+        Liste de succès {"succes_group", "success_name", "link", "quests"}.
+    """
+    success_table = bs(html, "html.parser").find_all("table", class_="wsite-multicol-table")
+    success_table_list = [elem.find_all("td", class_="wsite-multicol-col") for elem in success_table]
+
+    success_list = []
+    succes_group = ""
+    for bs_table_group in success_table_list[:3]:
+        for bs_table in bs_table_group:
+            for div in bs_table.find_all("div", class_="paragraph"):
+                if div.find("a") and succes_group != "":
+                    for link in div.find_all("a"):
+                        success_list.append({"succes_group": succes_group, "success_name": link.text.strip(), "link": link["href"], "quests": []})
+                else:
+                    succes_group = div.text.replace('\ufeff', '').replace('\ufefb', '').strip()
+
+    nosuccess = {
+        "succes_group": "NOSUCCESS",
+        "success_name": "NOSUCCESS",
+        "link": urljoin(base_url, "/classeacutees-par-succegraves.html#quetesnonsucces"),
+        "quests": []
+    }
+    for bs_table_group in success_table_list[3:4]:
+        for bs_table in bs_table_group:
+            for link in bs_table.find_all("a"):
+                nosuccess["quests"].append({"name": link.text.strip(), "link": link["href"]})
+    success_list.append(nosuccess)
+    return success_list
+
+
+def parse_success_page(html: bytes) -> List[dict]:
+    """Liste les quêtes liées depuis la page d'un succès."""
+    page_soup = bs(html, "html.parser").find("div", id="wsite-content")
+    quests = []
+    if page_soup is None:
+        return quests
+    for link in page_soup.find_all("a"):
+        href = link.get("href", "")
+        if len(link.text.strip()) > 0 and ".html" in href:
+            quests.append({"name": link.text.strip(), "link": href})
+    return quests
+
+
+class DPLNCrawler:
+    """Crawler asynchrone et poli pour les pages donjons et quêtes.
+
+    Les requêtes sont limitées en concurrence et en débit par hôte, et passent
+    par un cache disque : les pages déjà connues sont revalidées par GET
+    conditionnel (ETag / Last-Modified), un 304 réutilise le contenu en cache.
+    Produit la même arborescence que les notebooks de scraping : `Dungeons/`
+    et `Quests/<succès>/`, ainsi que les collections List_Dungeons et List_Quests.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = ".",
+        base_url: str = "https://www.dofuspourlesnoobs.com",
+        database=None,
+        cache_dir: str = ".crawl_cache",
+        concurrency: int = 8,
+        requests_per_second: float = 5.0,
+        max_retries: int = 3,
+        timeout: float = 30.0
+    ):
+        """Initialise le crawler.
+
+        Args:
+            output_dir: Dossier racine où écrire Dungeons/ et Quests/.
+            base_url: URL du site (un serveur local peut le remplacer pour les tests).
+            database: Base MongoDB recevant List_Dungeons et List_Quests (None = pas d'écriture).
+            cache_dir: Dossier du cache des réponses HTTP.
+            concurrency: Nombre maximal de requêtes simultanées.
+            requests_per_second: Débit maximal de requêtes par hôte.
+            max_retries: Nombre de nouvelles tentatives sur erreur réseau, 429 ou 5xx.
+            timeout: Délai maximal d'une requête, en secondes.
+        """
+        self.output_dir = Path(output_dir)
+        self.base_url = base_url.rstrip("/")
+        self.database = database
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.timeout = timeout
+        # Primitives asyncio liées à une boucle : recréées à chaque crawl (voir `crawl`)
+        self.rate_limiter = None
+        self._semaphore = None
+        self.stats = {}
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.stats = {"requests": 0, "downloaded": 0, "not_modified": 0, "errors": 0, "written_files": 0, "unchanged_files": 0}
+
+    def _url(self, link: str) -> str:
+        return link if "http" in link else urljoin(self.base_url + "/", link.lstrip("/"))
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str) -> Optional[bytes]:
+        """Télécharge une page, par GET conditionnel si elle est déjà en cache.
+
+        Args:
+            session: Session HTTP.
+            url: URL de la page.
+
+        Returns:
+            Le contenu de la page, ou None en cas d'échec définitif.
+        """
+        cached = await asyncio.to_thread(self.cache.get, url) if self.cache else None
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                await self.rate_limiter.wait(url)
+                self.stats["requests"] += 1
+                try:
+                    async with session.get(url, headers=headers) as response:
+                        if response.status == 304 and cached:
+                            self.stats["not_modified"] += 1
+                            return cached["body"]
+                        if response.status == 200:
+                            body = await response.read()
+                            self.stats["downloaded"] += 1
+                            if self.cache:
+                                await asyncio.to_thread(self.cache.put, url, body, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                            return body
+                        retryable = response.status == 429 or response.status >= 500
+                        error = f"HTTP {response.status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    retryable = True
+                    error = str(e) or type(e).__name__
+            if not retryable or attempt == self.max_retries:
+                break
+            await asyncio.sleep(0.5 * (2 ** attempt))
+
+        print(f"✗ {url} : {error}")
+        self.stats["errors"] += 1
+        return None
+
+    @staticmethod
+    def _write_if_changed(path: Path, content: str) -> bool:
+        """Écrit un fichier seulement si son contenu a changé (préserve les hash d'ingestion).
+
+        Returns:
+            True si le fichier a été écrit.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists() and path.read_text(encoding="utf-8") == content:
+            return False
+        path.write_text(content, encoding="utf-8")
+        return True
+
+    @staticmethod
+    def _write_page(html_path: Path, content: str) -> List[bool]:
+        """Écrit le HTML nettoyé et son texte brut (txt/), hors de la boucle asyncio."""
+        text = bs(content, "html.parser").get_text()
+        return [
+            DPLNCrawler._write_if_changed(html_path, content),
+            DPLNCrawler._write_if_changed(html_path.parent / "txt" / (html_path.stem + ".txt"), text),
+        ]
+
+    async def _save_page(self, session: aiohttp.ClientSession, url: str, html_path: Path) -> bool:
+        """Télécharge une page, la nettoie et l'écrit en HTML et en texte brut."""
+        body = await self.fetch(session, url)
+        if body is None:
+            return False
+        content = await asyncio.to_thread(clean_content, body)
+        if content is None:
+            print(f"⚠ {url} : pas de bloc wsite-content")
+            self.stats["errors"] += 1
+            return False
+        for written in await asyncio.to_thread(self._write_page, html_path, content):
+            self.stats["written_files" if written else "unchanged_files"] += 1
+        return True
+
+    async def crawl_dungeons(self, session: aiohttp.ClientSession) -> dict:
+        """Récupère la liste des donjons puis toutes leurs pages dans Dungeons/."""
+        body = await self.fetch(session, self._url("/donjons.html"))
+        if body is None:
+            return {}
+        dungeon_info_list = await asyncio.to_thread(parse_dungeon_index, body)
+
+        dungeon_dir = self.output_dir / "Dungeons"
+        await asyncio.to_thread(self._write_list, dungeon_dir / "list.json", dungeon_info_list)
+
+        await asyncio.gather(*[
+            self._save_page(session, self._url(d["link"]), dungeon_dir / d["link"].split("/")[-1])
+            for d in dungeon_info_list.values()
+        ])
+        print(f"✓ {len(dungeon_info_list)} donjons récupérés")
+        return dungeon_info_list
+
+    async def crawl_quests(self, session: aiohttp.ClientSession) -> List[dict]:
+        """Récupère les succès, leurs quêtes, puis toutes les pages dans Quests/<succès>/."""
+        body = await self.fetch(session, self._url("/classeacutees-par-succegraves.html"))
+        if body is None:
+            return []
+        success_list = await asyncio.to_thread(parse_success_index, body, self.base_url)
+
+        async def add_quests(success):
+            page = await self.fetch(session, self._url(success["link"]))
+            if page is not None:
+                success["quests"] = await asyncio.to_thread(parse_success_page, page)
+
+        await asyncio.gather(*[add_quests(s) for s in success_list if s["success_name"] != "NOSUCCESS"])
+
+        jobs = []
+        for success in success_list:
+            path = self.output_dir / "Quests" / slugify(success["success_name"])
+            for quest in success["quests"]:
+                jobs.append(self._save_page(session, self._url(quest["link"]), path / quest["link"].split("/")[-1]))
+        await asyncio.gather(*jobs)
+        print(f"✓ {len(jobs)} quêtes récupérées dans {len(success_list)} succès")
+        return success_list
+
+    @staticmethod
+    def _write_list(path: Path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+
+    def _store_lists(self, dungeons: dict, successes: List[dict]):
+        """Met à jour les collections de titres utilisées par RAGTool.get_best_name."""
+        if self.database is None:
+            return
+        if dungeons:
+            self.database["List_Dungeons"].bulk_write([
+                ReplaceOne({"title": name}, {"title": name, **info}, upsert=True)
+                for name, info in dungeons.items()
+            ], ordered=False)
+        quest_ops = [
+            ReplaceOne(
+                {"title": quest["name"]},
+                {"title": quest["name"], "link": quest["link"], "success": success["success_name"], "succes_group": success["succes_group"]},
+                upsert=True,
+            )
+            for success in successes for quest in success["quests"]
+        ]
+        if quest_ops:
+            self.database["List_Quests"].bulk_write(quest_ops, ordered=False)
+
+    async def crawl(self, dungeons: bool = True, quests: bool = True) -> dict:
+        """Lance un crawl complet.
+
+        Args:
+            dungeons: Récupère les pages donjons.
+            quests: Récupère les pages quêtes.
+
+        Returns:
+            Les statistiques du crawl (requêtes, 304, erreurs, fichiers écrits, durée).
+        """
+        self._reset_stats()
+        # Chaque asyncio.run crée une nouvelle boucle : sémaphore et verrous lui sont propres
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.rate_limiter = HostRateLimiter(self.requests_per_second)
+        start = time.perf_counter()
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            results = await asyncio.gather(
+                self.crawl_dungeons(session) if dungeons else asyncio.sleep(0, {}),
+                self.crawl_quests(session) if quests else asyncio.sleep(0, []),
+            )
+        await asyncio.to_thread(self._store_lists, *results)
+        self.stats["seconds"] = time.perf_counter() - start
+        print(f"✓ Crawl terminé en {self.stats['seconds']:.1f}s : {self.stats}")
+        return dict(self.stats)
+
+    def run(self, **kwargs) -> dict:
+        """Version synchrone de `crawl`."""
+        return asyncio.run(self.crawl(**kwargs))
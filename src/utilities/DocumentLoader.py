@@ -6,26 +6,375 @@
 # System import
 import os
 import re
-from tkinter.filedialog import test
-import bs4
+import hashlib
 import json
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Utilities
+import bs4
+import numpy as np
 from html_to_markdown import convert
-from typing import List
+from typing import Callable, Iterable, Iterator, List, Tuple
 
 # Database import
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError, ExecutionTimeout, PyMongoError
 
 # AI imports
 # # from langchain_community.document_loaders import UnstructuredMarkdownLoader
 # from langchain_community.document_loaders import BSHTMLLoader
-from langchain_community.document_loaders import TextLoader
 from langchain_core.documents import Document
-from langchain_mongodb import MongoDBAtlasVectorSearch
-from langchain_core.documents import Document
-from MyEmbeddings import MyEmbeddings
+from utilities.BM25Index import BM25Index
+from utilities.Metrics import Metrics, registry
+from utilities.MyEmbeddings import MyEmbeddings
+from utilities.NearDuplicates import NearDuplicateIndex
+from utilities.ResultCache import GENERATIONS_COLLECTION, MAX_CHANGED_TITLES
+from utilities.VectorCompression import CompressedEmbeddings, VectorCompressor
+from utilities.vector_stores import EMBEDDING_KEY, TEXT_KEY, create_vector_store
+
+# ============================================================================
+# Conversion HTML -> markdown (fonctions de module, exécutables dans un pool de processus)
+# ============================================================================
+
+# Repère le h2 du titre sans analyser toute la page (guillemets doubles, simples ou absents)
+TITLE_PATTERN = re.compile(
+    r'<h2\b[^>]*\bclass\s*=\s*["\']?[^>]*\bwsite-content-title\b[^>]*>.*?</h2>',
+    re.IGNORECASE | re.DOTALL
+)
+H3_PATTERN = re.compile(r'^###\s+(.+)$')
+
+# Codes d'erreur MongoDB considérés comme transitoires pour les écritures. 64 (WriteConcernFailed,
+# wtimeout dépassé) est retenté : l'écriture est appliquée sur le primaire mais pas encore répliquée,
+# et les upserts étant idempotents, la rejouer laisse aux secondaires le temps de rattraper leur retard.
+# UnsatisfiableWriteConcern (100) n'y figure pas : le write concern ne peut pas être satisfait.
+TRANSIENT_ERROR_CODES = {6, 7, 64, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+
+
+def extract_title(html: str, fallback: str) -> str:
+    """Extrait le titre (h2.wsite-content-title) d'un contenu HTML déjà lu.
+
+    Seul le h2 repéré est analysé par BeautifulSoup : le texte obtenu (espaces,
+    entités comme &nbsp;) est celui de `title_element.text.strip()`, comme les
+    titres des collections List_* auxquels il est comparé. La page entière n'est
+    analysée que si le motif ne trouve pas le h2.
+
+    Args:
+        html: Contenu HTML de la page.
+        fallback: Valeur retournée si aucun titre n'est trouvé.
+
+    Returns:
+        Le titre extrait ou `fallback`.
+    """
+    match = TITLE_PATTERN.search(html)
+    fragment = match.group(0) if match else html if "wsite-content-title" in html else None
+    if fragment is not None:
+        title_element = bs4.BeautifulSoup(fragment, "html.parser").find("h2", class_="wsite-content-title")
+        if title_element:
+            title = title_element.text.strip()
+            if title:
+                return title
+    return fallback
+
+
+def split_markdown_by_h3(content: str, file_name_stem: str) -> List[dict]:
+    """Découpe un contenu markdown en sections selon les titres "###".
+
+    Args:
+        content: Contenu markdown.
+        file_name_stem: Nom de la page, utilisé comme titre de la première section.
+
+    Returns:
+        Liste de sections {"title": ..., "content": [lignes]}.
+    """
+    # Diviser le contenu en lignes
+    lines = content.split('\n')
+    lines.insert(0, f"### {file_name_stem}")
+    
+    # Liste pour stocker les sections
+    sections = []
+    current_section = []
+    current_title = None
+    
+    for line in lines:
+        # Vérifier si c'est un titre H3
+        match = H3_PATTERN.match(line.strip())
+        if match:
+            # Sauvegarder la section précédente si elle existe
+            if current_section and current_title:
+                sections.append({
+                    'title': current_title,
+                    'content': current_section
+                })
+            
+            # Démarrer une nouvelle section
+            current_title = match.group(1).strip()
+            current_section = [line]  # Inclure le titre dans le contenu
+        else:
+            # Ajouter la ligne à la section courante
+            if current_title is not None:
+                current_section.append(line)
+    
+    # Ajouter la dernière section
+    if current_section and current_title:
+        sections.append({
+            'title': current_title,
+            'content': current_section
+        })
+    return sections
+
+
+def parse_html_file(html_path) -> dict:
+    """Convertit un fichier HTML en sections markdown, entièrement en mémoire.
+
+    Le fichier est lu une seule fois : le titre est extrait du même contenu que
+    celui passé au convertisseur.
+
+    Args:
+        html_path (str): Chemin du fichier HTML à convertir et découper
+
+    Returns:
+        dict: {"origin_file", "title", "sections": [{"title", "filename", "text"}]}
+    """
+    file_name_stem = Path(html_path).stem
+
+    with open(html_path, "r", encoding="utf-8") as f:
+        html = f.read()
+
+    content = convert(html)
+    source_title = extract_title(html, file_name_stem)
+
+    sections = []
+    for section in split_markdown_by_h3(content, file_name_stem):
+        # Nettoyer le titre pour le nom de fichier
+        clean_title = re.sub(r'[^\w\s-]', '', section['title']).strip()
+        clean_title = re.sub(r'\s+', '_', clean_title)
+        sections.append({
+            "title": section['title'],
+            "filename": clean_title,
+            # Le nom du fichier source en première ligne, puis le contenu de la section
+            "text": f"Source: {source_title}\n\n" + '\n'.join(section['content'])
+        })
+
+    # Si aucune section H3 trouvée, garder tout le contenu
+    if not sections:
+        sections.append({"title": file_name_stem, "filename": "full", "text": f"Source: {source_title}\n\n{content}"})
+
+    return {"origin_file": str(html_path), "title": source_title, "sections": sections}
+
+
+def timed_parse_html_file(html_path) -> Tuple[dict, float]:
+    """Exécute `parse_html_file` et retourne aussi sa durée, mesurée dans le processus qui convertit."""
+    start = time.perf_counter()
+    page = parse_html_file(html_path)
+    return page, time.perf_counter() - start
+
+
+def write_markdown_sections(page: dict, output_dir=None) -> List[str]:
+    """Écrit les sections d'une page en fichiers markdown (sortie de débogage).
+
+    Args:
+        page: Page retournée par `parse_html_file`.
+        output_dir (str, optional): Dossier de sortie. Si None, utilise le dossier courant
+
+    Returns:
+        list: Liste des chemins des fichiers créés
+    """
+    if output_dir is None:
+        output_dir = Path("../markdownData").parent
+    else:
+        output_dir = Path(f"{output_dir}/{Path(page['origin_file']).stem}")
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    created_files = []
+    for section in page["sections"]:
+        output_file = output_dir / f"{section['filename']}.md"
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(section["text"])
+        created_files.append(str(output_file))
+    return created_files
+
+
+def _split_lines(lines: List[Tuple[str, int]], budget: int, title: Tuple[str, int], overlap_tokens: int) -> List[List[str]]:
+    """Répartit les lignes (texte, tokens) d'une section en morceaux d'au plus `budget` tokens.
+
+    Chaque morceau après le premier commence par la ligne de titre `title` (si
+    elle existe), suivie des dernières lignes du morceau précédent jusqu'à
+    `overlap_tokens` tokens.
+    """
+    title_tokens = title[1] if title else 0
+    available = budget - title_tokens
+
+    # Une ligne trop longue est coupée entre deux mots (tokens estimés au prorata des mots)
+    units = []
+    for unit in lines:
+        line, n = unit
+        words = line.split(" ")
+        if n <= available or len(words) == 1:
+            units.append(unit)
+            continue
+        per_word = n / len(words)
+        step = max(1, int(0.9 * available / per_word))
+        for i in range(0, len(words), step):
+            piece = words[i:i + step]
+            units.append((" ".join(piece), int(len(piece) * per_word) + 1))
+
+    pieces, current, used = [], [], 0
+    for line, n in units:
+        if current and used + n > budget:
+            pieces.append([text for text, _ in current])
+            overlap, overlap_used = [], 0
+            for unit in reversed(current):
+                if unit is title or overlap_used + unit[1] > min(overlap_tokens, available - n):
+                    break
+                overlap.insert(0, unit)
+                overlap_used += unit[1]
+            current = ([title] if title else []) + overlap
+            used = title_tokens + overlap_used
+        current.append((line, n))
+        used += n
+    if current:
+        pieces.append([text for text, _ in current])
+    return pieces
+
+
+def chunk_sections(
+    sections: List[dict],
+    count_tokens: Callable[[List[str]], List[int]],
+    max_tokens: int,
+    overlap_tokens: int = 32,
+    min_tokens: int = 32
+) -> List[dict]:
+    """Redécoupe les sections H3 d'une page en chunks bornés en tokens.
+
+    Une section de moins de `min_tokens` tokens est fusionnée avec la suivante
+    (la dernière avec la précédente) si le total tient dans `max_tokens`. Une
+    section plus longue que `max_tokens` est coupée entre deux lignes ; chaque
+    morceau reprend la ligne "Source:", le titre H3 et les dernières lignes du
+    morceau précédent (`overlap_tokens`).
+
+    Args:
+        sections: Sections retournées par `parse_html_file`.
+        count_tokens: Compte les tokens d'une liste de textes (MyEmbeddings.count_tokens).
+        max_tokens: Nombre maximal de tokens d'un chunk, jetons spéciaux compris.
+        overlap_tokens: Tokens repris du morceau précédent d'une même section.
+        min_tokens: Taille en dessous de laquelle une section est fusionnée avec sa voisine.
+
+    Returns:
+        Liste de chunks {"title", "filename", "text", "sections", "part"} : "sections"
+        liste les titres H3 couverts, "part" numérote les morceaux d'une même section.
+    """
+    if not sections:
+        return []
+    special = count_tokens([""])[0]
+    budget = max_tokens - special
+
+    # Ligne "Source:" et lignes de chaque section (titre H3 compris), comptées en une passe
+    parsed = []
+    for section in sections:
+        source, _, body = section["text"].partition("\n\n")
+        parsed.append({"source": source, "lines": body.split("\n"), "titles": [section["title"]], "filename": section["filename"]})
+    counts = iter(n - special for n in count_tokens(
+        [p["source"] for p in parsed] + [line for p in parsed for line in p["lines"]]
+    ))
+    for p in parsed:
+        p["source_tokens"] = next(counts)
+    for p in parsed:
+        p["lines"] = [(line, next(counts)) for line in p["lines"]]
+
+    def size(p):
+        return p["source_tokens"] + sum(n for _, n in p["lines"])
+
+    def merge(a, b):
+        return {**a, "lines": a["lines"] + b["lines"], "titles": a["titles"] + b["titles"]}
+
+    merged = []
+    for p in parsed:
+        if merged and size(merged[-1]) < min_tokens and size(merged[-1]) + size(p) - p["source_tokens"] <= budget:
+            p = merge(merged.pop(), p)
+        merged.append(p)
+    if len(merged) > 1 and size(merged[-1]) < min_tokens and size(merged[-2]) + size(merged[-1]) - merged[-1]["source_tokens"] <= budget:
+        last = merged.pop()
+        merged[-1] = merge(merged[-1], last)
+
+    chunks = []
+    for p in merged:
+        first = p["lines"][0] if p["lines"] else None
+        title = first if first is not None and H3_PATTERN.match(first[0].strip()) else None
+        pieces = _split_lines(p["lines"], budget - p["source_tokens"], title, overlap_tokens)
+        for part, lines in enumerate(pieces):
+            chunks.append({
+                "title": p["titles"][0],
+                "filename": p["filename"],
+                "text": p["source"] + "\n\n" + "\n".join(lines),
+                "sections": p["titles"],
+                "part": part,
+            })
+    return chunks
+
+
+def threaded_stage(source: Iterable, maxsize: int) -> Iterator:
+    """Exécute un itérable dans un thread dédié et expose ses éléments via une file bornée.
+
+    Chaîner plusieurs étapes ainsi les fait travailler en parallèle, tandis que
+    la taille des files borne la mémoire quel que soit le volume du corpus.
+
+    Si le consommateur s'arrête avant la fin (erreur, `close()`), le thread
+    cesse de produire, ferme `source` (et donc les étapes en amont), puis est
+    attendu : aucun producteur ne reste bloqué sur une file pleine.
+
+    Args:
+        source: Itérable produit par l'étape.
+        maxsize: Nombre maximal d'éléments en attente entre cette étape et la suivante.
+
+    Yields:
+        Les éléments de `source`, dans l'ordre.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    done = object()
+    errors = []
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run():
+        try:
+            for item in source:
+                if not put(item):
+                    break
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            if stop.is_set() and hasattr(source, "close"):
+                source.close()
+            put(done)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+    if errors:
+        raise errors[0]
+
 
 class DocumentProcessor:
     """Classe pour traiter tous les fichiers d'un dossier et les stocker dans MongoDB Atlas."""
@@ -37,7 +386,32 @@ class DocumentProcessor:
         collection_name: str = "Doc_Vectors_semantic",
         index_name: str = "vector_index",
         embedding_model: str = 'bert-base-nli-mean-tokens',
-        breakpoint_threshold_type: str = 'percentile'
+        breakpoint_threshold_type: str = 'percentile',
+        embedding_batch_size: int = 32,
+        embedding_workers: int = 0,
+        embedding_cache_path: str = None,
+        vector_backend: str = "atlas",
+        local_store_dir: str = None,
+        conversion_workers: int = 1,
+        pipeline_queue_size: int = 8,
+        write_batch_docs: int = 256,
+        write_batch_bytes: int = 4 * 1024 * 1024,
+        write_max_retries: int = 5,
+        write_backoff: float = 0.5,
+        bm25_dir: str = None,
+        vector_dtype: str = None,
+        reduced_dim: int = None,
+        reduction: str = "pca",
+        compression_dir: str = None,
+        compression_fit_size: int = 4096,
+        embeddings: MyEmbeddings = None,
+        metrics: Metrics = None,
+        chunk_max_tokens: int = None,
+        chunk_overlap_tokens: int = 32,
+        chunk_min_tokens: int = 32,
+        embedding_batch_tokens: int = None,
+        dedup_threshold: float = None,
+        dedup_dir: str = None
     ):
         """Initialise le processeur de documents.
         
@@ -48,191 +422,611 @@ class DocumentProcessor:
             index_name: Nom de l'index vectoriel.
             embedding_model: Modèle d'embedding à utiliser.
             breakpoint_threshold_type: Type de seuil pour le semantic chunker.
+            embedding_batch_size: Nombre de textes encodés par passe du modèle.
+            embedding_workers: Nombre de processus CPU pour l'encodage (0 = pas de pool).
+            embedding_cache_path: Fichier SQLite du cache d'embeddings (None = pas de cache).
+            vector_backend: "atlas" pour MongoDB Atlas Vector Search, "local" pour le magasin en mémoire.
+            local_store_dir: Dossier des instantanés du backend "local".
+            conversion_workers: Nombre de processus de conversion HTML -> markdown (None = nombre de cœurs).
+            pipeline_queue_size: Nombre maximal de lots en attente entre deux étapes du pipeline.
+            write_batch_docs: Nombre maximal de documents par lot d'écriture (toutes pages confondues).
+            write_batch_bytes: Taille maximale de texte par lot d'écriture, en octets.
+            write_max_retries: Nombre de nouvelles tentatives d'un lot après une erreur transitoire.
+            write_backoff: Délai initial en secondes avant une nouvelle tentative, doublé à chaque essai.
+            bm25_dir: Dossier de l'index BM25 de la collection, tenu à jour à l'ingestion (None = pas d'index).
+            vector_dtype: Stockage compact des vecteurs ("float32", "float16" ou "int8" ; None = liste de doubles pleine précision).
+            reduced_dim: Dimension des vecteurs stockés après réduction (None = dimension du modèle).
+            reduction: "pca" (ACP ajustée à l'ingestion) ou "truncate" (modèles de type Matryoshka).
+            compression_dir: Dossier du compresseur ajusté (<collection>.npz), relu par RAGTool. Requis avec vector_dtype.
+            compression_fit_size: Nombre d'embeddings utilisés pour ajuster l'ACP lors de la première ingestion.
+            embeddings: Instance de MyEmbeddings déjà créée, utilisée à la place de `embedding_model`.
+            metrics: Registre des métriques des étapes d'ingestion, par défaut `utilities.Metrics.registry`.
+            chunk_max_tokens: Taille maximale d'un chunk en tokens du modèle (voir `chunk_sections`), en
+                général sa longueur maximale de séquence. None = un chunk par section H3, sans
+                statistiques de troncature (stats["truncation"]).
+            chunk_overlap_tokens: Tokens répétés entre deux morceaux d'une même section.
+            chunk_min_tokens: Taille en dessous de laquelle une section est fusionnée avec sa voisine.
+            embedding_batch_tokens: Tokens par passe du modèle, avec lots triés par longueur (None = lots de
+                `embedding_batch_size` textes).
+            dedup_threshold: Similarité de Jaccard (estimée par MinHash) à partir de laquelle un chunk est
+                un quasi-doublon d'un chunk déjà stocké pour une autre page : il n'est ni encodé ni stocké,
+                et la page est ajoutée aux propriétaires ("titles", "URLs") du chunk existant. None = désactivé.
+                Les recherches sur la page servent alors le texte de l'autre page : préférer un seuil proche de 1.
+            dedup_dir: Dossier de l'index MinHash/LSH de la collection (<collection>.npz). Requis avec dedup_threshold.
         """
         self.mongo_connection_string = mongo_connection_string
         self.db_name = db_name
         self.collection_name = collection_name
         self.index_name = index_name
+        self.vector_backend = vector_backend
+        self.conversion_workers = conversion_workers or os.cpu_count() or 1
+        self.pipeline_queue_size = pipeline_queue_size
+        self.write_batch_docs = write_batch_docs
+        self.write_batch_bytes = write_batch_bytes
+        self.write_max_retries = write_max_retries
+        self.write_backoff = write_backoff
+        self.write_retries = 0
+        self.metrics = metrics if metrics is not None else registry
+        self.chunk_max_tokens = chunk_max_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.chunk_min_tokens = chunk_min_tokens
+        # Tokens au-delà de la longueur maximale du modèle, ignorés par l'encodeur
+        self.token_stats = {}
+        # Titres dont les chunks ont changé pendant l'exécution en cours
+        self.changed_titles = set()
+        # Durée d'encodage de l'exécution en cours, pour estimer le temps gagné par la déduplication
+        self.embed_seconds = 0.0
+        self.embedded_documents = 0
         
         # Connexion à MongoDB
         self.client = MongoClient(mongo_connection_string)
         self.db = self.client[db_name]
         
         # Initialisation des embeddings
-        self.embeddings = MyEmbeddings(embedding_model)
+        self.embeddings = embeddings if embeddings is not None else MyEmbeddings(
+            embedding_model,
+            batch_size=embedding_batch_size,
+            num_workers=embedding_workers,
+            cache_path=embedding_cache_path,
+            batch_tokens=embedding_batch_tokens,
+        )
         
+        # Compression optionnelle des vecteurs : le compresseur déjà ajusté est réutilisé,
+        # pour que les pages réingérées restent dans le même espace que les autres
+        self.compressor = None
+        self.compression_path = None
+        self.compression_fit_size = compression_fit_size
+        store_embeddings = self.embeddings
+        if vector_dtype is not None:
+            if compression_dir is None:
+                raise ValueError("La compression des vecteurs nécessite un dossier compression_dir")
+            self.compression_path = Path(compression_dir) / f"{collection_name}.npz"
+            if self.compression_path.exists():
+                self.compressor = VectorCompressor.load(self.compression_path)
+                if (self.compressor.dtype, self.compressor.dim) != (vector_dtype, reduced_dim):
+                    # Mélanger deux espaces dans une même collection fausserait les recherches
+                    raise ValueError(
+                        f"Le compresseur existant {self.compression_path} ({self.compressor.dtype}, dimension "
+                        f"{self.compressor.dim or 'du modèle'}) ne correspond pas à vector_dtype={vector_dtype}, "
+                        f"reduced_dim={reduced_dim} : supprimez-le et réingérez toute la collection pour en changer"
+                    )
+            else:
+                self.compressor = VectorCompressor(vector_dtype, dim=reduced_dim, reduction=reduction)
+            store_embeddings = CompressedEmbeddings(self.embeddings, self.compressor)
+
         # Initialisation du vector store
-        self.vector_store = MongoDBAtlasVectorSearch(
-            embedding=self.embeddings,
-            collection=self.db[collection_name],
+        self.vector_store = create_vector_store(
+            vector_backend,
+            store_embeddings,
+            database=self.db,
+            collection_name=collection_name,
             index_name=index_name,
-            relevance_score_fn="cosine",
+            local_dir=local_store_dir,
+            dtype=self.compressor.dtype if self.compressor is not None else "float32",
         )
         
+        # Index lexical pour la recherche hybride de RAGTool
+        self.bm25_index = BM25Index(str(Path(bm25_dir) / f"{collection_name}.json")) if bm25_dir else None
+
+        # Index MinHash/LSH des chunks stockés et de leurs pages propriétaires. Il est modifié
+        # par l'étape d'embedding et par les suppressions du thread principal, d'où le verrou
+        self.dedup_index = None
+        if dedup_threshold is not None:
+            if dedup_dir is None:
+                raise ValueError("La déduplication des chunks nécessite un dossier dedup_dir")
+            self.dedup_index = NearDuplicateIndex(str(Path(dedup_dir) / f"{collection_name}.npz"), threshold=dedup_threshold)
+        self._dedup_lock = threading.Lock()
+        # Chunks déjà stockés dont les propriétaires ont changé, réécrits avant la sauvegarde des index
+        self._owner_updates = set()
+        self.dedup_stats = {}
+        
         print(f"✓ DocumentProcessor initialisé avec succès")
         print(f"  - Base de données: {db_name}")
         print(f"  - Collection: {collection_name}")
-        print(f"  - Modèle d'embedding: {embedding_model}")
+        print(f"  - Modèle d'embedding: {self.embeddings.model_name}")
+        print(f"  - Backend vectoriel: {vector_backend}")
+        if chunk_max_tokens is not None:
+            print(f"  - Chunks: {chunk_max_tokens} tokens maximum, chevauchement {chunk_overlap_tokens}, fusion sous {chunk_min_tokens}")
+        if self.compressor is not None:
+            print(f"  - Vecteurs compressés: {self.compressor.dtype}, dimension {reduced_dim or 'du modèle'} ({self.compression_path})")
+        if self.dedup_index is not None:
+            print(f"  - Déduplication des chunks: seuil {dedup_threshold}, {len(self.dedup_index)} chunks indexés ({self.dedup_index.path})")
     
-    def _extract_title_from_html(self, filename: str) -> str:
-        """Extrait le titre d'un fichier HTML.
+    def _build_documents(self, page: dict) -> List[Document]:
+        """Construit les documents d'une page convertie, avec leurs métadonnées.
         
         Args:
-            filename: Chemin du fichier HTML.
+            page: Page retournée par `parse_html_file`.
             
         Returns:
-            Le titre extrait ou le nom du fichier si extraction échoue.
+            Liste des documents de la page, sans doublon d'identifiant.
         """
-        try:
-            with open(filename, "r", encoding="utf-8") as f:
-                soup = bs4.BeautifulSoup(f.read(), 'html.parser')
-                title_element = soup.find("h2", class_="wsite-content-title")
-                if title_element:
-                    return title_element.text.strip()
-        except Exception as e:
-            print(f"⚠ Erreur lors de l'extraction du titre de {filename}: {e}")
-        
-        return Path(filename).stem
-    
-    def _load_document(self, filename: str, title: str, origin: str) -> List[Document]:
-        """Charge un document HTML et retourne les documents avec métadonnées.
-        
-        Args:
-            filename: Chemin du fichier HTML à charger.
-            
+        origin = page["origin_file"]
+        sections = page["sections"]
+        if self.chunk_max_tokens is not None:
+            # Passe de tokenisation supplémentaire : mesurée seulement quand le découpage borné est actif
+            self._count_truncation("before", [section["text"] for section in sections])
+            sections = chunk_sections(
+                sections, self.embeddings.count_tokens, self.chunk_max_tokens,
+                overlap_tokens=self.chunk_overlap_tokens, min_tokens=self.chunk_min_tokens,
+            )
+            self._count_truncation("after", [section["text"] for section in sections])
+
+        docs = {}
+        for section in sections:
+            doc_id = self._chunk_id(origin, section["text"])
+            metadata = {
+                "title": str(page["title"]),
+                "source": str(origin),
+                "filename": str(section["filename"]),
+                "section": " + ".join(section.get("sections", [section["title"]])),
+                "URL": self._page_url(origin)
+            }
+            if "part" in section:
+                metadata["part"] = section["part"]
+            if self.dedup_index is not None:
+                metadata["titles"] = [metadata["title"]]
+                metadata["URLs"] = [metadata["URL"]]
+            docs[doc_id] = Document(page_content=section["text"], metadata=metadata, id=doc_id)
+        return list(docs.values())
+
+    @staticmethod
+    def _page_url(origin) -> str:
+        """URL publique d'une page, dérivée du nom de son fichier HTML."""
+        return "https://www.dofuspourlesnoobs.com/" + str(Path(origin).stem) + ".html"
+
+    @staticmethod
+    def _owner_metadata(owners: dict) -> dict:
+        """Métadonnées d'un chunk partagé : la première page propriétaire, puis toutes (listes alignées)."""
+        urls = list(owners)
+        return {"title": owners[urls[0]], "URL": urls[0], "titles": [owners[url] for url in urls], "URLs": urls}
+
+    def _deduplicate(self, page: dict, docs: List[Document]) -> List[Document]:
+        """Retire d'une page les quasi-doublons de chunks déjà stockés pour d'autres pages.
+
+        La page devient propriétaire de chaque chunk canonique retrouvé, dont
+        l'identifiant est ajouté à page["shared_ids"]. Les chunks retenus sont
+        indexés en attente, avec la page comme propriétaire ; ils servent déjà de
+        canoniques aux pages suivantes, réingérées si leur lot échoue (voir `_settle_dedup`).
+
         Returns:
-            Liste des documents chargés.
+            Les documents de la page à encoder et stocker.
         """
-        
-        try:
-            with open(filename, "r", encoding="utf-8") as f:
-                text = f.read()
-            
-            doc = Document(
-                page_content=text,
-                metadata={
-                    "title": str(title),
-                    "source": str(origin),
-                    "filename": str(Path(filename).stem),
-                    "URL": "https://www.dofuspourlesnoobs.com/" + str(Path(filename).stem) + ".html"
-                },
-                id=1,
-            )
-        except Exception as e:
-            print(f"└─ ✗ Erreur lors du chargement de {filename}: {e}")
-        
-        return [doc]
+        url, title = self._page_url(page["origin_file"]), str(page["title"])
+        kept, shared = [], []
+        with self._dedup_lock:
+            for doc in docs:
+                signature = self.dedup_index.signature(doc.page_content)
+                canonical = self.dedup_index.find(signature, exclude_owner=url)
+                if canonical is None or canonical == doc.id:
+                    # Un chunk réécrit garde les propriétaires qu'il avait déjà
+                    doc.metadata.update(self._owner_metadata(self.dedup_index.add(doc.id, signature, url, title, pending=True)))
+                    kept.append(doc)
+                    continue
+                self.dedup_index.add_owner(canonical, url, title)
+                self._owner_updates.add(canonical)
+                shared.append(canonical)
+                self.dedup_stats["duplicates"] += 1
+                self.dedup_stats["saved_text_bytes"] += len(doc.page_content.encode("utf-8"))
+        page["shared_ids"] = list(dict.fromkeys(shared))
+        return kept
+
+    def _settle_dedup(self, docs: List[Document], written: bool) -> List[str]:
+        """Confirme (lot écrit) ou oublie (lot en échec) les chunks en attente d'un lot dans l'index de déduplication.
+
+        Returns:
+            Les URL des pages qui partageaient un chunk oublié : elles sont dans ce lot
+            ou dans un lot suivant, et ne doivent pas être enregistrées comme ingérées.
+        """
+        with self._dedup_lock:
+            if written:
+                self.dedup_index.commit([doc.id for doc in docs])
+                return []
+            return self.dedup_index.discard([doc.id for doc in docs])
+
+    def _apply_owner_updates(self) -> int:
+        """Écrit les nouveaux propriétaires des chunks partagés dans le magasin et l'index BM25.
+
+        Returns:
+            Le nombre de chunks mis à jour.
+        """
+        with self._dedup_lock:
+            updates = {}
+            for doc_id in self._owner_updates:
+                owners = self.dedup_index.owners(doc_id)
+                # Chunk supprimé depuis avec son dernier propriétaire
+                if owners:
+                    updates[doc_id] = self._owner_metadata(owners)
+            self._owner_updates = set()
+        if not updates:
+            return 0
+        for metadata in updates.values():
+            self.changed_titles.update(metadata["titles"])
+        with self.metrics.span("ingest_update_owners"):
+            if hasattr(self.vector_store, "update_metadata"):
+                self.vector_store.update_metadata(list(updates), list(updates.values()))
+            else:
+                operations = [UpdateOne({"_id": doc_id}, {"$set": metadata}) for doc_id, metadata in updates.items()]
+                self.db[self.collection_name].bulk_write(operations, ordered=False)
+            if self.bm25_index is not None:
+                for doc_id, metadata in updates.items():
+                    self.bm25_index.update_metadata(doc_id, metadata)
+        return len(updates)
+
+    def _count_truncation(self, stage: str, texts: List[str]):
+        """Ajoute à `token_stats` les textes et tokens qui dépassent la longueur maximale du modèle.
+
+        Args:
+            stage: "before" (sections H3) ou "after" (chunks bornés).
+            texts: Textes de la page à ce stade.
+        """
+        limit = self.embeddings.max_seq_length
+        counts = self.embeddings.count_tokens(texts)
+        stats = self.token_stats.setdefault(stage, {"texts": 0, "tokens": 0, "truncated_texts": 0, "truncated_tokens": 0})
+        stats["texts"] += len(counts)
+        stats["tokens"] += sum(counts)
+        stats["truncated_texts"] += sum(n > limit for n in counts)
+        stats["truncated_tokens"] += sum(max(0, n - limit) for n in counts)
     
     def _html_to_splited_markdown_by_h3_headers(self, html_path, output_dir=None):
         """
-        Découpe un fichier markdown en plusieurs sous-documents basés sur les titres "###".
+        Découpe un fichier HTML converti en markdown en plusieurs fichiers basés sur les titres "###".
         
         Args:
             html_path (str): Chemin du fichier HTML à convertir et découper
             output_dir (str, optional): Dossier de sortie. Si None, utilise le dossier du fichier source
             
         Returns:
-            list: Liste des chemins des fichiers créés
+            dict: {titre de la page: {"file_list": fichiers créés, "origin_file": html_path}}
         """
-        # Lire le fichier markdown
+        page = parse_html_file(html_path)
+        return {page["title"]: {"file_list": write_markdown_sections(page, output_dir), "origin_file": html_path}}
 
-        file_name_stem =Path(html_path).stem
+    def _iter_pages(self, html_files: List[Path], failures: list) -> Iterator:
+        """Étape de conversion : produit les pages converties, dans l'ordre des fichiers.
 
-        with open(html_path, "r", encoding="utf-8") as f:
-            html = f.read()
+        Avec plusieurs processus, le nombre de pages en cours de conversion est
+        borné. Un échec est ajouté à `failures` sans interrompre les autres fichiers.
 
-        content = convert(html)
-        
-        # Obtenir le nom du fichier source (sans extension)
-        source_title = self._extract_title_from_html(html_path)
-        
-        # Définir le dossier de sortie
-        if output_dir is None:
-            output_dir = Path("../markdownData").parent
-        else:
-            output_dir = Path(f"{output_dir}/{file_name_stem}")
-            output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Pattern pour identifier les titres H3 (### )
-        h3_pattern = r'^###\s+(.+)$'
-        
-        # Diviser le contenu en lignes
-        lines = content.split('\n')
-        lines.insert(0, f"### {file_name_stem}")
-        
-        # Liste pour stocker les sections
-        sections = []
-        current_section = []
-        current_title = None
-        
-        for line in lines:
-            # Vérifier si c'est un titre H3
-            match = re.match(h3_pattern, line.strip())
-            if match:
-                # Sauvegarder la section précédente si elle existe
-                if current_section and current_title:
-                    sections.append({
-                        'title': current_title,
-                        'content': current_section
-                    })
-                
-                # Démarrer une nouvelle section
-                current_title = match.group(1).strip()
-                current_section = [line]  # Inclure le titre dans le contenu
-            else:
-                # Ajouter la ligne à la section courante
-                if current_title is not None:
-                    current_section.append(line)
-        
-        # Ajouter la dernière section
-        if current_section and current_title:
-            sections.append({
-                'title': current_title,
-                'content': current_section
-            })
-        
-        # Si aucune section H3 trouvée, créer un seul fichier avec tout le contenu
-        if not sections:
-            output_file = output_dir / f"full.md"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(f"Source: {source_title}\n\n")
-                f.write(content)
-            return [str(output_file)]
-        
-        # Créer les fichiers pour chaque section
-        created_files = []
-        for i, section in enumerate(sections, 1):
-            # Nettoyer le titre pour le nom de fichier
-            clean_title = re.sub(r'[^\w\s-]', '', section['title']).strip()
-            clean_title = re.sub(r'\s+', '_', clean_title)
-            
-            # Nom du fichier de sortie
-            output_filename = f"{clean_title}.md"
-            output_file = output_dir / output_filename
-            
-            # Écrire le fichier
-            with open(output_file, 'w', encoding='utf-8') as f:
-                # Ajouter le nom du fichier source en première ligne
-                f.write(f"Source: {source_title}\n\n")
-                # Écrire le contenu de la section
-                f.write('\n'.join(section['content']))
-            
-            created_files.append(str(output_file))
-        ret = {source_title: {"file_list": created_files, "origin_file": html_path}}
-        return ret
+        Args:
+            html_files: Fichiers HTML à convertir.
+            failures: Liste recevant les échecs (fichier, erreur).
+
+        Yields:
+            Des tuples (fichier, page convertie).
+        """
+        if self.conversion_workers <= 1 or len(html_files) <= 1:
+            for html_file in html_files:
+                try:
+                    page, seconds = timed_parse_html_file(html_file)
+                except Exception as e:
+                    print(f"└─ ✗ Erreur de conversion pour {html_file}: {e}")
+                    self.metrics.increment("ingest_failures_total", stage="convert")
+                    failures.append((html_file, str(e)))
+                    continue
+                self.metrics.record("ingest_convert", seconds)
+                yield html_file, page
+            return
+
+        with ProcessPoolExecutor(max_workers=self.conversion_workers) as pool:
+            files = iter(html_files)
+            pending = deque(
+                (f, pool.submit(timed_parse_html_file, f))
+                for f in itertools.islice(files, 2 * self.conversion_workers)
+            )
+            try:
+                yield from self._collect_pages(pending, files, pool, failures)
+            finally:
+                # Pipeline interrompu : les conversions pas encore commencées sont abandonnées
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    def _collect_pages(self, pending: deque, files: Iterator, pool: ProcessPoolExecutor, failures: list) -> Iterator:
+        """Produit les pages converties par le pool, dans l'ordre, en gardant `pending` rempli."""
+        while pending:
+            html_file, future = pending.popleft()
+            next_file = next(files, None)
+            if next_file is not None:
+                pending.append((next_file, pool.submit(timed_parse_html_file, next_file)))
+            try:
+                page, seconds = future.result()
+            except Exception as e:
+                print(f"└─ ✗ Erreur de conversion pour {html_file}: {e}")
+                self.metrics.increment("ingest_failures_total", stage="convert")
+                failures.append((html_file, str(e)))
+                continue
+            self.metrics.record("ingest_convert", seconds)
+            yield html_file, page
+
+    def _iter_batches(self, pages: Iterable, write_markdown: bool) -> Iterator:
+        """Étape d'embedding : regroupe les documents de plusieurs pages en lots et les encode.
+
+        Un lot est émis dès qu'il atteint `write_batch_docs` documents ou
+        `write_batch_bytes` octets de texte ; une page n'est jamais répartie sur
+        deux lots.
+
+        Args:
+            pages: Tuples (fichier, page convertie).
+            write_markdown: Écrit aussi les sections en fichiers markdown (débogage).
+
+        Yields:
+            Des tuples (pages du lot [(fichier, page, documents)], documents, vecteurs). Si la
+            préparation d'une page ou l'encodage d'un lot échoue, l'exception remplace les
+            vecteurs : les pages concernées sont comptées en échec, comme pour une écriture.
+        """
+        entries, docs, size = [], [], 0
+        for html_file, page in pages:
+            try:
+                if write_markdown:
+                    write_markdown_sections(page, str(html_file.parent).replace("rawData", "markdownData"))
+                page_docs = self._build_documents(page)
+                if self.dedup_index is not None:
+                    page_docs = self._deduplicate(page, page_docs)
+            except Exception as e:
+                print(f"└─ ✗ Erreur de préparation des chunks de {html_file}: {e}")
+                yield [(html_file, page, [])], [], e
+                continue
+            entries.append((html_file, page, page_docs))
+            docs.extend(page_docs)
+            size += sum(len(doc.page_content.encode("utf-8")) for doc in page_docs)
+            if len(docs) >= self.write_batch_docs or size >= self.write_batch_bytes:
+                yield entries, docs, self._try_embed_batch(docs)
+                entries, docs, size = [], [], 0
+        if entries:
+            yield entries, docs, self._try_embed_batch(docs)
+
+    def _try_embed_batch(self, docs: List[Document]):
+        """Encode un lot, en retournant l'exception au lieu de la lever (voir `_iter_batches`)."""
+        try:
+            return self._embed_batch(docs)
+        except Exception as e:
+            print(f"└─ ✗ Erreur d'encodage d'un lot de {len(docs)} documents: {e}")
+            return e
+
+    def _embed_batch(self, docs: List[Document]):
+        """Encode les documents d'un lot (span ingest_embed)."""
+        # Lot de pages entièrement dédupliquées
+        if not docs:
+            return np.empty((0, 0), dtype=np.float32)
+        start = time.perf_counter()
+        with self.metrics.span("ingest_embed"):
+            vectors = self.embeddings.embed_array([doc.page_content for doc in docs])
+        self.embed_seconds += time.perf_counter() - start
+        self.embedded_documents += len(docs)
+        self.metrics.increment("ingest_embedded_documents_total", len(docs))
+        return vectors
+
+    def _iter_compressed(self, batches: Iterable) -> Iterator:
+        """Applique la compression aux vecteurs des lots.
+
+        Si le compresseur n'est pas encore ajusté, les premiers lots sont mis
+        en attente jusqu'à `compression_fit_size` vecteurs, le compresseur est
+        ajusté sur ceux-ci et sauvegardé, puis tous les lots sont transformés.
+        Si la collection compte moins de vecteurs que la dimension réduite, l'ACP
+        est impossible : la réduction se fait alors par troncature.
+
+        Yields:
+            Les lots de `_iter_batches`, avec des vecteurs réduits et normalisés.
+        """
+        pending = []
+        if not self.compressor.fitted:
+            for batch in batches:
+                pending.append(batch)
+                if sum(len(docs) for _, docs, vectors in pending if not isinstance(vectors, Exception)) >= self.compression_fit_size:
+                    break
+            sample = [vectors for _, docs, vectors in pending if docs and not isinstance(vectors, Exception)]
+            if sample:
+                try:
+                    sample = np.vstack(sample)
+                    if self.compressor.reduction == "pca" and self.compressor.dim is not None and len(sample) < min(self.compressor.dim, sample.shape[1]):
+                        print(f"├─ ⚠ {len(sample)} vecteurs seulement pour une ACP à {self.compressor.dim} dimensions : réduction par troncature")
+                        self.compressor.reduction = "truncate"
+                    self.compressor.fit(sample)
+                    self.compressor.save(self.compression_path)
+                    print(f"├─ Compresseur ajusté sur {len(sample)} vecteurs ({self.compressor.bytes_per_vector} octets/vecteur)")
+                except Exception as e:
+                    print(f"└─ ✗ Erreur d'ajustement du compresseur: {e}")
+                    self.metrics.increment("ingest_failures_total", stage="compress")
+        for entries, docs, vectors in itertools.chain(pending, batches):
+            if docs and not isinstance(vectors, Exception):
+                try:
+                    vectors = self.compressor.transform(vectors)
+                except Exception as e:
+                    # Compresseur non ajusté (échec ci-dessus) ou vecteurs invalides : le lot échoue
+                    vectors = e
+            yield entries, docs, vectors
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        """Indique si une erreur d'écriture MongoDB mérite une nouvelle tentative."""
+        if isinstance(error, (AutoReconnect, ExecutionTimeout)):
+            return True
+        if isinstance(error, PyMongoError) and error.has_error_label("RetryableWriteError"):
+            return True
+        if isinstance(error, BulkWriteError):
+            codes = [e.get("code") for e in error.details.get("writeErrors", [])]
+            if error.details.get("writeConcernErrors"):
+                codes.extend(e.get("code") for e in error.details["writeConcernErrors"])
+            return bool(codes) and all(code in TRANSIENT_ERROR_CODES for code in codes)
+        return False
+
+    def _write_documents(self, docs: List[Document], vectors) -> List[str]:
+        """Étape de stockage : écrit des documents déjà encodés dans le magasin de vecteurs.
+
+        L'écriture MongoDB est un bulk_write non ordonné d'upserts ; les erreurs
+        transitoires sont retentées avec un délai exponentiel. Les upserts étant
+        idempotents, rejouer un lot partiellement écrit est sans risque.
+
+        Args:
+            docs: Documents, avec leurs identifiants.
+            vectors: Matrice des embeddings alignée sur `docs`.
+
+        Returns:
+            Les identifiants écrits.
+        """
+        ids = [doc.id for doc in docs]
+        if hasattr(self.vector_store, "add_vectors"):
+            return self.vector_store.add_vectors(
+                [doc.page_content for doc in docs], vectors, metadatas=[doc.metadata for doc in docs], ids=ids
+            )
+
+        # Même format de document que MongoDBAtlasVectorSearch.add_texts, avec les champs fixés par create_vector_store
+        encode = self.compressor.to_bson if self.compressor is not None else lambda vector: vector.tolist()
+        operations = [
+            ReplaceOne(
+                {"_id": doc.id},
+                {"_id": doc.id, TEXT_KEY: doc.page_content, EMBEDDING_KEY: encode(vector), **doc.metadata},
+                upsert=True,
+            )
+            for doc, vector in zip(docs, vectors)
+        ]
+        for attempt in range(self.write_max_retries + 1):
+            try:
+                self.db[self.collection_name].bulk_write(operations, ordered=False)
+                return ids
+            except PyMongoError as e:
+                if attempt == self.write_max_retries or not self._is_transient(e):
+                    raise
+                delay = self.write_backoff * (2 ** attempt)
+                self.write_retries += 1
+                self.metrics.increment("ingest_write_retries_total")
+                print(f"├─ ⚠ Erreur transitoire ({type(e).__name__}), nouvelle tentative dans {delay:.1f}s")
+                time.sleep(delay)
+
+    @staticmethod
+    def _file_hash(path) -> str:
+        """Calcule le hash SHA-256 du contenu d'un fichier."""
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    @staticmethod
+    def _chunk_id(origin: str, content: str) -> str:
+        """Calcule un identifiant stable de chunk, dérivé de la page d'origine et du contenu."""
+        return hashlib.sha256(f"{Path(origin).stem}\n{content}".encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def _load_manifest(manifest_path: Path) -> dict:
+        """Charge le manifeste d'ingestion, ou un manifeste vide s'il n'existe pas."""
+        if manifest_path.exists():
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"files": {}}
+
+    @staticmethod
+    def _save_manifest(manifest_path: Path, manifest: dict):
+        """Écrit le manifeste d'ingestion de façon atomique."""
+        tmp_path = manifest_path.with_suffix(manifest_path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, manifest_path)
+
+    def _delete_ids(self, ids: List[str], owner_url: str = None) -> int:
+        """Supprime des chunks du magasin de vecteurs et retourne leur nombre.
+
+        Avec la déduplication, la page `owner_url` est retirée des propriétaires
+        de chaque chunk ; seuls les chunks sans autre propriétaire sont supprimés.
+        """
+        if self.dedup_index is not None and owner_url is not None:
+            orphans = []
+            with self._dedup_lock:
+                for doc_id in ids:
+                    if self.dedup_index.remove_owner(doc_id, owner_url):
+                        self._owner_updates.add(doc_id)
+                    else:
+                        orphans.append(doc_id)
+            ids = orphans
+        if not ids:
+            return 0
+        with self.metrics.span("ingest_delete"):
+            self.vector_store.delete(ids=list(ids))
+            if self.bm25_index is not None:
+                self.bm25_index.remove(ids)
+        self.metrics.increment("ingest_deleted_documents_total", len(ids))
+        return len(ids)
+
+    def _bump_generation(self):
+        """Incrémente la génération de la collection, ce qui invalide les caches de RAGTool.
+
+        Les titres modifiés sont enregistrés avec la génération, pour que le cache
+        des sujets ne recharge qu'eux.
+        """
+        # Titre inconnu (ancien manifeste) ou trop de titres : tout le magasin sera invalidé
+        titles = None
+        if None not in self.changed_titles and len(self.changed_titles) <= MAX_CHANGED_TITLES:
+            titles = sorted(self.changed_titles)
+        try:
+            self.db[GENERATIONS_COLLECTION].update_one(
+                {"_id": self.collection_name},
+                {"$inc": {"generation": 1}, "$set": {"titles": titles}, "$currentDate": {"updated_at": True}},
+                upsert=True,
+            )
+        except PyMongoError as e:
+            print(f"⚠ Génération de {self.collection_name} non mise à jour ({type(e).__name__}), les caches de résultats expireront par TTL")
+
+    def _save_indexes(self):
+        """Persiste les index locaux (instantané du backend local, index BM25) et signale la modification."""
+        if self.dedup_index is not None:
+            updated = self._apply_owner_updates()
+            self.dedup_index.save()
+            print(f"Index de déduplication sauvegardé dans: {self.dedup_index.path} ({len(self.dedup_index)} chunks, {updated} chunks partagés mis à jour)")
+        # Le backend local persiste un instantané partageable entre processus ; la date
+        # de son meta.json sert de génération aux caches de résultats
+        if hasattr(self.vector_store, "save"):
+            self.vector_store.save()
+            print(f"Instantané local sauvegardé dans: {self.vector_store.path}")
+        if self.bm25_index is not None:
+            self.bm25_index.save()
+            print(f"Index BM25 sauvegardé dans: {self.bm25_index.path} ({len(self.bm25_index)} chunks)")
+        if not hasattr(self.vector_store, "save"):
+            self._bump_generation()
 
     def process_folder(
         self,
         folder_path: str,
         pattern: str = "*.html",
-        skip_errors: bool = True
+        skip_errors: bool = True,
+        incremental: bool = False,
+        manifest_path: str = None,
+        write_markdown: bool = False
     ) -> dict:
         """Traite tous les fichiers d'un dossier.
+
+        Les pages passent en flux par trois étapes (conversion, embedding,
+        stockage) reliées par des files bornées, sans écriture intermédiaire
+        sur disque.
+
+        Les identifiants des chunks sont dérivés de leur contenu : relancer le
+        traitement est idempotent. Un manifeste (hash de chaque fichier et
+        identifiants de ses chunks) est écrit à chaque exécution ; en mode
+        incrémental, il permet d'ignorer les pages inchangées, de remplacer les
+        chunks des pages modifiées et de supprimer ceux des pages disparues.
         
         Args:
             folder_path: Chemin du dossier contenant les fichiers HTML.
             pattern: Pattern de fichiers à traiter (défaut: "*.html").
             skip_errors: Si True, continue même en cas d'erreur sur un fichier.
+            incremental: Si True, ne traite que les pages nouvelles ou modifiées.
+            manifest_path: Chemin du manifeste (défaut: <folder_path>/.ingest_manifest.json).
+            write_markdown: Écrit aussi chaque section en fichier markdown (sortie de débogage).
             
         Returns:
             Dictionnaire avec les statistiques du traitement.
@@ -244,89 +1038,188 @@ class DocumentProcessor:
         
         if not folder_path.is_dir():
             raise ValueError(f"{folder_path} n'est pas un dossier")
+
+        manifest_path = Path(manifest_path) if manifest_path else folder_path / ".ingest_manifest.json"
+        manifest = self._load_manifest(manifest_path)
+        previous_files = manifest["files"]
+        self.changed_titles = set()
+        self.dedup_stats = {"duplicates": 0, "saved_text_bytes": 0}
         
         # Récupérer tous les fichiers correspondant au pattern
-        html_files = list(folder_path.glob(pattern))
+        html_files = sorted(folder_path.glob(pattern))
+        page_keys = {f: f.relative_to(folder_path).as_posix() for f in html_files}
+        file_hashes = {page_keys[f]: self._file_hash(f) for f in html_files}
+
+        # Pages disparues : leurs chunks sont retirés du magasin
+        deleted_keys = [key for key in previous_files if key not in file_hashes]
+        removed_doc_ids = 0
+        for key in deleted_keys:
+            print(f"├─ Suppression des chunks de la page disparue {key}")
+            entry = previous_files.pop(key)
+            self.changed_titles.add(entry.get("title"))
+            removed_doc_ids += self._delete_ids(entry["ids"], owner_url=self._page_url(key))
+
+        if incremental:
+            changed_files = [f for f in html_files if previous_files.get(page_keys[f], {}).get("hash") != file_hashes[page_keys[f]]]
+        else:
+            changed_files = html_files
+        skipped_files = len(html_files) - len(changed_files)
         
-        if not html_files:
-            print(f"⚠ Aucun fichier correspondant à '{pattern}' trouvé dans {folder_path}")
+        if not changed_files:
+            if html_files:
+                print(f"✓ Aucune page modifiée dans {folder_path} ({skipped_files} inchangées)")
+            else:
+                print(f"⚠ Aucun fichier correspondant à '{pattern}' trouvé dans {folder_path}")
+            manifest["files"] = previous_files
+            self._save_manifest(manifest_path, manifest)
+            if removed_doc_ids or self._owner_updates:
+                self._save_indexes()
             return {
                 "total_files": 0,
                 "processed_files": 0,
                 "failed_files": 0,
                 "total_documents": 0,
-                "total_doc_ids": 0
+                "total_doc_ids": 0,
+                "skipped_files": skipped_files,
+                "deleted_files": len(deleted_keys),
+                "removed_doc_ids": removed_doc_ids
             }
         
         print(f"\n{'='*70}")
         print(f"Traitement des fichiers du dossier: {folder_path}")
-        print(f"Convertissement en markdrown vers: {folder_path}")
-        
-        # split tous les fichier en markdown
-        md_files = {}
-        doc_count = 0
-        for html_file in html_files:
-            md_file = self._html_to_splited_markdown_by_h3_headers(html_file, str(html_file.parent).replace("rawData","markdownData"))
-            md_files.update(md_file)
-            doc_count += len(md_file[list(md_file.keys())[0]]["file_list"])
-
-        print(f"Nombre de fichiers convertis en markdown: {doc_count}")
+        if write_markdown:
+            print(f"Sections markdown écrites dans: {str(folder_path).replace('rawData', 'markdownData')}")
+        if incremental:
+            print(f"Mode incrémental: {len(changed_files)} pages à traiter, {skipped_files} inchangées, {len(deleted_keys)} supprimées")
         print(f"{'='*70}\n")
 
         stats = {
-            "total_files": doc_count,
+            "total_files": 0,
             "processed_files": 0,
             "failed_files": 0,
             "total_documents": 0,
             "total_doc_ids": 0,
-            "failed_files_list": []
+            "skipped_files": skipped_files,
+            "deleted_files": len(deleted_keys),
+            "removed_doc_ids": removed_doc_ids,
+            "write_batches": 0,
+            "write_retries": 0,
+            "stored_bytes": 0,
+            "vector_bytes": 0,
+            "failed_files_list": [],
+            "conversion_failures": {}
         }
+
+        # Pipeline : conversion -> documents + embeddings -> stockage, reliés par des files bornées
+        start_time = time.perf_counter()
+        self.write_retries = 0
+        self.token_stats = {}
+        self.embed_seconds, self.embedded_documents = 0.0, 0
+        bytes_per_vector = 0
+        conversion_failures = []
+        pages = threaded_stage(self._iter_pages(changed_files, conversion_failures), self.pipeline_queue_size)
+        embedded = threaded_stage(self._iter_batches(pages, write_markdown), self.pipeline_queue_size)
+        batches = self._iter_compressed(embedded) if self.compressor is not None else embedded
+
         i = 0
-        doc_id = 1
-        for page_title, content in md_files.items():
-            file_list = content["file_list"]
-            origin_file = content["origin_file"]
-            page_docs = []
-            i += 1
-            
-            # Charger tous les documents de la page
-            print(f"[{i}/{len(list(md_files.items()))}] Chargement de [{page_title}]...")
-            for file_path in file_list:
-                try:
-                    docs = self._load_document(filename=str(file_path), title=page_title, origin=origin_file)
-                    
-                    if docs:
-                        page_docs.extend(docs)
-                        stats["processed_files"] += 1
-                        stats["total_documents"] += len(docs)
-                    else:
-                        stats["failed_files"] += 1
-                        stats["failed_files_list"].append(file_path)
-                        
-                except Exception as e:
-                    print(f"└─ ✗ Erreur critique pour {file_path}: {e}")
-                    stats["failed_files"] += 1
-                    stats["failed_files_list"].append(file_path)
-                    
-                    if not skip_errors:
-                        raise
-            if page_docs:
+        completed = False
+        # Pages dont un chunk partagé n'a pas pu être écrit par sa page d'origine
+        requeued_urls = set()
+        try:
+            for entries, batch_docs, vectors in batches:
+                batch_bytes = sum(len(doc.page_content.encode("utf-8")) for doc in batch_docs)
                 try:
-                    print(f"├─ Stockage des documents originant {origin_file} dans MongoDB Atlas...")
-                    ids = [str(x) for x in list(range(doc_id, doc_id + len(page_docs)))]
-                    doc_ids = self.vector_store.add_documents(documents=page_docs, ids=ids)
-                    print(f"└─ ✓ Ajoutés avec les IDs: [{doc_ids}]")
-                    doc_id += len(page_docs)
+                    if isinstance(vectors, Exception):
+                        # Échec de préparation ou d'encodage, remonté par l'étape d'embedding
+                        raise vectors
+                    doc_ids = []
+                    # Un lot peut ne contenir que des chunks dédupliqués
+                    if batch_docs:
+                        print(f"├─ Stockage d'un lot de {len(batch_docs)} documents ({len(entries)} pages) dans {self.collection_name}...")
+                        with self.metrics.span("ingest_write", backend=self.vector_backend):
+                            doc_ids = self._write_documents(batch_docs, vectors)
+                        stats["write_batches"] += 1
+                        # Liste de doubles BSON (8 octets par composante) sans compression
+                        bytes_per_vector = self.compressor.bytes_per_vector if self.compressor is not None else vectors.shape[1] * 8
+                    self.metrics.increment("ingest_documents_total", len(doc_ids))
                     stats["total_doc_ids"] += len(doc_ids)
+                    stats["stored_bytes"] += batch_bytes
+                    stats["vector_bytes"] += len(doc_ids) * bytes_per_vector
+                    batch_ok, batch_error = True, None
                 except Exception as e:
-                    print(f"└─ ✗ Erreur lors du stockage des documents: {e}")
-                    if not skip_errors:
-                        raise
-
-            print(f"\n{'='*70}")
-            print(f"Résumé du chargement: {stats['processed_files']}/{stats['total_files']} fichiers traités")
-            print(f"Nombre total de documents: {stats['total_documents']}")
-            print(f"{'='*70}\n")
+                    if e is vectors:
+                        print(f"└─ ✗ Erreur lors de l'encodage du lot: {e}")
+                        self.metrics.increment("ingest_failures_total", stage="embed")
+                    else:
+                        print(f"└─ ✗ Erreur lors du stockage du lot: {e}")
+                        self.metrics.increment("ingest_failures_total", stage="write")
+                    batch_ok, batch_error = False, e
+                if self.dedup_index is not None:
+                    requeued_urls.update(self._settle_dedup(batch_docs, batch_ok))
+
+                for html_file, page, page_docs in entries:
+                    page_key = page_keys[html_file]
+                    page_title = page["title"]
+                    page_url = self._page_url(page["origin_file"])
+                    # Chunks stockés de la page, puis chunks d'autres pages dont elle est propriétaire
+                    page_ids = list(dict.fromkeys([doc.id for doc in page_docs] + page.get("shared_ids", [])))
+                    old_ids = previous_files.get(page_key, {}).get("ids", [])
+                    i += 1
+                    stats["total_files"] += len(page["sections"])
+                    stats["processed_files"] += len(page["sections"])
+                    stats["total_documents"] += len(page_docs) + len(page.get("shared_ids", []))
+
+                    if batch_ok and page_url in requeued_urls:
+                        print(f"└─ ✗ [{page_title}] partage un chunk dont l'écriture a échoué, page à réingérer")
+                        self.metrics.increment("ingest_failures_total", stage="dedup")
+                    if not batch_ok or page_url in requeued_urls:
+                        stats["failed_files"] += 1
+                        stats["failed_files_list"].append(page["origin_file"])
+                        # Propriétés prises par la page pendant cette exécution, annulées
+                        if self.dedup_index is not None:
+                            self._delete_ids([x for x in page_ids if x not in set(old_ids)], owner_url=page_url)
+                        continue
+
+                    print(f"[{i}/{len(changed_files)}] ✓ [{page_title}] : {len(page_ids)} documents")
+                    self.metrics.increment("ingest_pages_total")
+                    # Les chunks de l'ancienne version absents de la nouvelle sont retirés
+                    stale_ids = [x for x in old_ids if x not in set(page_ids)]
+                    stats["removed_doc_ids"] += self._delete_ids(stale_ids, owner_url=page_url)
+                    self.changed_titles.add(page_title)
+                    if previous_files.get(page_key, {}).get("title") not in (None, page_title):
+                        self.changed_titles.add(previous_files[page_key]["title"])
+                    if self.bm25_index is not None:
+                        self.bm25_index.add_documents(page_docs)
+                    previous_files[page_key] = {"hash": file_hashes[page_key], "title": page_title, "ids": page_ids}
+                # Les propriétés des pages du lot en échec sont annulées avant d'interrompre l'ingestion
+                if batch_error is not None and not skip_errors:
+                    raise batch_error
+            completed = True
+        finally:
+            # Arrête les étapes encore actives (threads producteurs, pool de conversion),
+            # puis enregistre l'avancement pour que la prochaine exécution reprenne ici
+            batches.close()
+            embedded.close()
+            pages.close()
+            manifest["files"] = previous_files
+            self._save_manifest(manifest_path, manifest)
+            if not completed:
+                self._save_indexes()
+
+        for html_file, error in conversion_failures:
+            stats["failed_files"] += 1
+            stats["failed_files_list"].append(str(html_file))
+            stats["conversion_failures"][str(html_file)] = error
+        if conversion_failures and not skip_errors:
+            self._save_indexes()
+            raise RuntimeError(f"Échec de conversion de {len(conversion_failures)} fichiers: {conversion_failures}")
+
+        elapsed = time.perf_counter() - start_time
+        self.metrics.record("ingest_process_folder", elapsed)
+        stats["write_retries"] = self.write_retries
+        stats["ingest_seconds"] = elapsed
+        stats["docs_per_sec"] = stats["total_doc_ids"] / elapsed if elapsed > 0 else 0.0
+        stats["bytes_per_sec"] = stats["stored_bytes"] / elapsed if elapsed > 0 else 0.0
         
         print(f"{'='*70}")
         print(f"STATISTIQUES FINALES")
@@ -334,12 +1227,45 @@ class DocumentProcessor:
         print(f"Fichiers traités avec succès: {stats['processed_files']}/{stats['total_files']}")
         print(f"Documents chargés: {stats['total_documents']}")
         print(f"Documents stockés: {stats['total_doc_ids']}")
+        print(f"Pages inchangées ignorées: {stats['skipped_files']}")
+        print(f"Documents supprimés: {stats['removed_doc_ids']}")
+        print(f"Taille des vecteurs stockés: {stats['vector_bytes'] / 1024:.1f} Ko")
+        print(f"Débit: {stats['docs_per_sec']:.1f} documents/s, {stats['bytes_per_sec'] / 1024:.1f} Ko/s ({stats['write_batches']} lots, {stats['write_retries']} nouvelles tentatives)")
+        stats["embedding_cache"] = self.embeddings.cache_stats()["disk_cache"]
+        if stats["embedding_cache"]:
+            print(f"Cache d'embeddings: {stats['embedding_cache']['hits']} hits / {stats['embedding_cache']['misses']} misses")
+        # Mesurée seulement avec chunk_max_tokens (voir `_build_documents`)
+        before = self.token_stats.get("before")
+        if before:
+            after = self.token_stats["after"]
+            stats["truncation"] = {"before": before, "after": after}
+            print(f"Tokens tronqués par le modèle: {before['truncated_tokens']} dans {before['truncated_texts']}/{before['texts']} sections H3, "
+                  f"{after['truncated_tokens']} dans {after['truncated_texts']}/{after['texts']} chunks")
+        padding = self.embeddings.cache_stats()["length_batches"]
+        if padding["encoded_tokens"]:
+            print(f"Remplissage des lots par longueur: {padding['padding_tokens']} tokens pour {padding['encoded_tokens']} encodés")
+        if self.dedup_index is not None:
+            duplicates = self.dedup_stats["duplicates"]
+            seconds_per_doc = self.embed_seconds / self.embedded_documents if self.embedded_documents else 0.0
+            stats["dedup"] = {
+                "index_size": len(self.dedup_index),
+                "duplicates": duplicates,
+                "saved_text_bytes": self.dedup_stats["saved_text_bytes"],
+                "saved_vector_bytes": duplicates * bytes_per_vector,
+                # Durée moyenne d'encodage d'un chunk de cette exécution, multipliée par les doublons évités
+                "saved_embed_seconds": duplicates * seconds_per_doc,
+            }
+            print(f"Déduplication: {duplicates} chunks partagés au lieu d'être stockés, "
+                  f"{stats['dedup']['saved_vector_bytes'] / 1024:.1f} Ko de vecteurs et ~{stats['dedup']['saved_embed_seconds']:.1f}s d'encodage évités "
+                  f"(index de {stats['dedup']['index_size']} chunks)")
         
         if stats['failed_files_list']:
             print(f"\nFichiers échoués ({stats['failed_files']}):")
             for failed_file in stats['failed_files_list']:
                 print(f"  - {failed_file}")
         
+        self._save_indexes()
+
         with open("stats.json", 'w', encoding='utf-8') as f:
             json.dump(stats, f, indent=4)
         
@@ -349,6 +1275,7 @@ class DocumentProcessor:
     
     def close(self):
         """Ferme la connexion à MongoDB."""
+        self.embeddings.close()
         if self.client:
             self.client.close()
             print("✓ Connexion à MongoDB fermée")
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import weakref
+import numpy as np
+
+from typing import List, Optional
+
+class EmbeddingCache:
+    """Cache disque des embeddings, adressé par (nom du modèle, hash du texte).
+
+    Les vecteurs sont stockés en float32 dans une base SQLite. Lorsque le nombre
+    d'entrées dépasse `max_entries`, les entrées les moins récemment utilisées
+    sont supprimées.
+
+    La base n'est ouverte qu'au premier accès, et chaque processus forké ouvre
+    sa propre connexion : une connexion SQLite ne doit pas traverser un fork
+    (voir preload.py).
+    """
+
+    def __init__(self, path: str, model_name: str, max_entries: int = 500_000):
+        """Ouvre (ou crée) le cache.
+
+        Args:
+            path: Chemin du fichier SQLite.
+            model_name: Nom du modèle, inclus dans la clé pour isoler les modèles.
+            max_entries: Nombre maximal d'entrées conservées, tous modèles confondus.
+        """
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = None
+        self._count = 0
+        if hasattr(os, "register_at_fork"):
+            cache = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: cache() is not None and cache()._after_fork())
+
+    def _after_fork(self):
+        """Oublie la connexion et le verrou hérités du parent (sans fermer la connexion du parent)."""
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Retourne la connexion du processus courant, ouverte au premier appel (sous `_lock`)."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " key BLOB NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (model, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+            conn.commit()
+            self._count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def hash_text(text: str) -> bytes:
+        """Calcule la clé de contenu d'un texte."""
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Récupère les vecteurs en cache.
+
+        Args:
+            texts: Textes recherchés.
+
+        Returns:
+            Une liste alignée sur `texts`, avec None pour chaque absence.
+        """
+        keys = [self.hash_text(t) for t in texts]
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            # SQLite limite le nombre de paramètres par requête
+            for start in range(0, len(keys), 500):
+                chunk = list(set(keys[start:start + 500]))
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [self.model_name, *chunk],
+                ).fetchall()
+                found.update({bytes(k): v for k, v in rows})
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                    [(now, self.model_name, k) for k in found],
+                )
+                conn.commit()
+
+        results = []
+        for k in keys:
+            blob = found.get(k)
+            if blob is None:
+                self.misses += 1
+                results.append(None)
+            else:
+                self.hits += 1
+                results.append(np.frombuffer(blob, dtype=np.float32))
+        return results
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """Ajoute des vecteurs au cache puis applique l'éviction si nécessaire.
+
+        Args:
+            texts: Textes encodés.
+            vectors: Matrice des vecteurs correspondants.
+        """
+        now = time.time()
+        rows = [
+            (self.model_name, self.hash_text(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, key, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._count += max(cursor.rowcount, 0)
+            if self._count > self.max_entries:
+                excess = self._count - self.max_entries
+                conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+                self._count = self.max_entries
+            conn.commit()
+
+    def stats(self) -> dict:
+        """Retourne les compteurs du cache."""
+        total = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        """Ferme la base SQLite (elle sera rouverte au prochain accès)."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,527 @@
+import json
+import os
+import threading
+import uuid
+import numpy as np
+from pathlib import Path
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from typing import Any, Iterable, List, Optional, Tuple
+
+
+class LocalVectorStore(VectorStore):
+    """Magasin de vecteurs en mémoire, compatible avec l'interface LangChain.
+
+    Les vecteurs sont normalisés et rangés dans une matrice float32 contiguë.
+    La recherche est exacte (produit matriciel) pour les petits corpus, et passe
+    par un index IVF (k-means) au-delà de `ann_threshold` vecteurs. Les filtres
+    `pre_filter` acceptent la même forme que MongoDBAtlasVectorSearch pour les
+    cas utilisés ici : {"champ": valeur}, {"champ": {"$eq": v}} ou {"champ": {"$in": [...]}}.
+
+    Un instantané (`save`/`load`) est écrit dans un dossier ; la matrice y est
+    un fichier .npy chargé en mmap, partagé entre processus via le cache de pages.
+    Les fichiers d'un instantané portent un numéro de version et meta.json, écrit
+    en dernier, désigne ceux de l'instantané courant : un lecteur ne voit jamais
+    la matrice d'un instantané avec les métadonnées d'un autre.
+
+    Avec `dtype="float16"` ou `"int8"`, la matrice est stockée en format compact
+    (voir VectorCompressor) ; les scores sont calculés par blocs en float32.
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    SCALES_FILE = "scales.npy"
+    META_FILE = "meta.json"
+    IVF_FILE = "ivf.npz"
+    DTYPES = ("float32", "float16", "int8")
+    SCORE_BLOCK = 65536
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        path: Optional[str] = None,
+        ann_threshold: int = 50_000,
+        n_probe: int = 8,
+        filter_fields: Tuple[str, ...] = ("title", "titles"),
+        mmap: bool = True,
+        dtype: str = "float32"
+    ):
+        """Initialise le magasin, en chargeant l'instantané de `path` s'il existe.
+
+        Args:
+            embedding: Modèle d'embedding utilisé pour les textes et les requêtes.
+            path: Dossier de l'instantané persistant (None = purement en mémoire).
+            ann_threshold: Nombre de vecteurs à partir duquel l'index IVF est utilisé.
+            n_probe: Nombre de listes IVF explorées par requête.
+            filter_fields: Champs de métadonnées indexés pour les pré-filtres.
+            mmap: Charge la matrice de l'instantané en mémoire partagée (lecture seule).
+            dtype: Type de stockage de la matrice ("float32", "float16" ou "int8") ;
+                celui d'un instantané existant prévaut.
+        """
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Type de stockage inconnu : {dtype}, utilisez {', '.join(self.DTYPES)}")
+        self.embedding = embedding
+        self.path = Path(path) if path else None
+        self.ann_threshold = ann_threshold
+        self.n_probe = n_probe
+        self.filter_fields = tuple(filter_fields)
+        self.mmap = mmap
+        self.dtype = dtype
+
+        self._matrix = np.empty((0, 0), dtype=dtype)
+        # En int8 : inverse de la norme de chaque ligne quantifiée
+        self._scales = np.empty(0, dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._positions = {}
+        self._field_index = {f: {} for f in self.filter_fields}
+
+        # Index IVF publié d'un bloc : (centroïdes, ordre des positions, bornes des listes)
+        self._ivf = None
+        self._ivf_dirty = True
+        self._ivf_lock = threading.Lock()
+
+        if self.path is not None and (self.path / self.META_FILE).exists():
+            self.load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return self._size
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _reserve(self, extra: int, dim: int):
+        """Agrandit la matrice (capacité doublée) pour accueillir `extra` lignes."""
+        needed = self._size + extra
+        if self._matrix.shape[1] != dim and self._size == 0:
+            self._matrix = np.empty((0, dim), dtype=self.dtype)
+        if needed <= self._matrix.shape[0] and self._matrix.flags.writeable:
+            return
+        capacity = max(needed, 2 * self._matrix.shape[0], 64)
+        grown = np.empty((capacity, dim), dtype=self.dtype)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+        scales = np.ones(capacity, dtype=np.float32)
+        scales[:self._size] = self._scales[:self._size]
+        self._scales = scales
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Convertit des vecteurs normalisés dans le type de stockage.
+
+        Returns:
+            Les lignes à stocker et le facteur ramenant leur produit scalaire à un cosinus.
+        """
+        if self.dtype != "int8":
+            return vectors.astype(self.dtype), np.ones(len(vectors), dtype=np.float32)
+        peak = np.abs(vectors).max(axis=1, keepdims=True)
+        peak[peak == 0] = 1.0
+        rows = np.round(vectors / peak * 127).astype(np.int8)
+        norms = np.linalg.norm(rows.astype(np.float32), axis=1)
+        norms[norms == 0] = 1.0
+        return rows, (1.0 / norms).astype(np.float32)
+
+    def _rows(self, positions) -> np.ndarray:
+        """Lignes de la matrice en float32 (non normalisées en int8)."""
+        return np.asarray(self._matrix[positions], dtype=np.float32)
+
+    def _scores(self, query: np.ndarray, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosinus entre `query` et les lignes `positions` (toutes si None), calculés par blocs."""
+        if self.dtype == "float32":
+            return (self._matrix[:self._size] if positions is None else self._matrix[positions]) @ query
+        count = self._size if positions is None else len(positions)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, self.SCORE_BLOCK):
+            block = slice(start, min(start + self.SCORE_BLOCK, count)) if positions is None else positions[start:start + self.SCORE_BLOCK]
+            scores[start:start + self.SCORE_BLOCK] = (self._rows(block) @ query) * self._scales[block]
+        return scores
+
+    def _index_metadata(self, position: int, metadata: dict):
+        for field in self.filter_fields:
+            values = metadata.get(field)
+            for value in (values if isinstance(values, list) else [values]):
+                if value is not None:
+                    self._field_index[field].setdefault(value, set()).add(position)
+
+    def _unindex_metadata(self, position: int, metadata: dict):
+        for field in self.filter_fields:
+            values = metadata.get(field)
+            for value in (values if isinstance(values, list) else [values]):
+                positions = self._field_index[field].get(value)
+                if positions is not None:
+                    positions.discard(position)
+                    if not positions:
+                        del self._field_index[field][value]
+
+    def add_vectors(
+        self,
+        texts: List[str],
+        vectors: np.ndarray,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """Ajoute (ou remplace) des entrées dont les vecteurs sont déjà calculés.
+
+        Args:
+            texts: Contenus textuels.
+            vectors: Matrice des embeddings, alignée sur `texts`.
+            metadatas: Métadonnées de chaque entrée.
+            ids: Identifiants ; une entrée existante de même id est remplacée.
+
+        Returns:
+            Les identifiants des entrées ajoutées.
+        """
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = [str(i) for i in ids] if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors, scales = self._quantize(self._normalize(vectors))
+        self._reserve(len(texts), vectors.shape[1])
+
+        for text, vector, scale, metadata, doc_id in zip(texts, vectors, scales, metadatas, ids):
+            position = self._positions.get(doc_id)
+            if position is None:
+                position = self._size
+                self._size += 1
+                self._ids.append(doc_id)
+                self._texts.append(text)
+                self._metadatas.append(dict(metadata))
+                self._positions[doc_id] = position
+            else:
+                self._unindex_metadata(position, self._metadatas[position])
+                self._texts[position] = text
+                self._metadatas[position] = dict(metadata)
+            self._matrix[position] = vector
+            self._scales[position] = scale
+            self._index_metadata(position, metadata)
+
+        self._ivf_dirty = True
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        """Encode puis ajoute des textes au magasin."""
+        texts = list(texts)
+        vectors = np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+        return self.add_vectors(texts, vectors, metadatas=metadatas, ids=ids)
+
+    def update_metadata(self, ids: List[str], metadatas: List[dict]) -> int:
+        """Met à jour les métadonnées d'entrées existantes, sans toucher à leurs vecteurs.
+
+        Args:
+            ids: Identifiants des entrées (les identifiants inconnus sont ignorés).
+            metadatas: Champs à remplacer dans les métadonnées de chaque entrée.
+
+        Returns:
+            Le nombre d'entrées mises à jour.
+        """
+        updated = 0
+        for doc_id, metadata in zip(ids, metadatas):
+            position = self._positions.get(str(doc_id))
+            if position is None:
+                continue
+            self._unindex_metadata(position, self._metadatas[position])
+            self._metadatas[position] = {**self._metadatas[position], **metadata}
+            self._index_metadata(position, self._metadatas[position])
+            updated += 1
+        return updated
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Supprime des entrées par identifiant, en compactant la matrice."""
+        if not ids:
+            return False
+        doomed = sorted({self._positions[str(i)] for i in ids if str(i) in self._positions})
+        if not doomed:
+            return False
+        keep = np.ones(self._size, dtype=bool)
+        keep[doomed] = False
+
+        self._matrix = np.ascontiguousarray(self._matrix[:self._size][keep])
+        self._scales = np.ascontiguousarray(self._scales[:self._size][keep])
+        self._ids = [x for x, k in zip(self._ids, keep) if k]
+        self._texts = [x for x, k in zip(self._texts, keep) if k]
+        self._metadatas = [x for x, k in zip(self._metadatas, keep) if k]
+        self._size = len(self._ids)
+        self._positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._field_index = {f: {} for f in self.filter_fields}
+        for position, metadata in enumerate(self._metadatas):
+            self._index_metadata(position, metadata)
+        self._ivf_dirty = True
+        return True
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> "LocalVectorStore":
+        store = cls(embedding=embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    # ------------------------------------------------------------------
+    # Index IVF
+    # ------------------------------------------------------------------
+
+    def build_ann_index(self, n_lists: Optional[int] = None, iterations: int = 10, sample_size: int = 100_000, seed: int = 0):
+        """Entraîne l'index IVF (k-means sphérique) sur les vecteurs courants.
+
+        Args:
+            n_lists: Nombre de listes ; par défaut environ sqrt(N).
+            iterations: Nombre d'itérations de k-means.
+            sample_size: Nombre maximal de vecteurs utilisés pour l'entraînement.
+            seed: Graine aléatoire.
+        """
+        if self._size == 0:
+            self._ivf = None
+            self._ivf_dirty = False
+            return
+        n_lists = n_lists or max(1, int(np.sqrt(self._size)))
+        n_lists = min(n_lists, self._size)
+        rng = np.random.default_rng(seed)
+
+        sample_positions = np.arange(self._size) if self._size <= sample_size else rng.choice(self._size, sample_size, replace=False)
+        sample = self._normalize(self._rows(sample_positions))
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = self._normalize(centroids)
+
+        assign = np.empty(self._size, dtype=np.int32)
+        for start in range(0, self._size, 65536):
+            assign[start:start + 65536] = np.argmax(self._rows(slice(start, min(start + 65536, self._size))) @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        offsets = np.searchsorted(assign[order], np.arange(n_lists + 1)).astype(np.int64)
+        self._ivf = (centroids, order, offsets)
+        self._ivf_dirty = False
+
+    def _ann_candidates(self, query: np.ndarray) -> np.ndarray:
+        ivf = self._ivf
+        if ivf is None or self._ivf_dirty:
+            # Une seule construction pour les recherches concurrentes
+            with self._ivf_lock:
+                if self._ivf is None or self._ivf_dirty:
+                    self.build_ann_index()
+                ivf = self._ivf
+        centroids, order, offsets = ivf
+        n_probe = min(self.n_probe, len(centroids))
+        lists = np.argpartition(-(centroids @ query), n_probe - 1)[:n_probe]
+        return np.concatenate([order[offsets[c]:offsets[c + 1]] for c in lists])
+
+    # ------------------------------------------------------------------
+    # Recherche
+    # ------------------------------------------------------------------
+
+    def _filter_positions(self, pre_filter: Optional[dict]) -> Optional[np.ndarray]:
+        """Retourne les positions satisfaisant `pre_filter`, ou None s'il n'y a pas de filtre."""
+        if not pre_filter:
+            return None
+        selected = None
+        for field, condition in pre_filter.items():
+            if isinstance(condition, dict):
+                if "$eq" in condition:
+                    values = [condition["$eq"]]
+                elif "$in" in condition:
+                    values = list(condition["$in"])
+                else:
+                    raise ValueError(f"Opérateur de filtre non supporté : {condition}")
+            else:
+                values = [condition]
+
+            if field in self._field_index:
+                positions = set()
+                for value in values:
+                    positions |= self._field_index[field].get(value, set())
+            else:
+                positions = set()
+                for i, metadata in enumerate(self._metadatas):
+                    stored = metadata.get(field)
+                    stored = stored if isinstance(stored, list) else [stored]
+                    if any(v in stored for v in values):
+                        positions.add(i)
+            selected = positions if selected is None else selected & positions
+        return np.fromiter(sorted(selected), dtype=np.int64, count=len(selected))
+
+    def _search(self, query: np.ndarray, k: int, pre_filter: Optional[dict]) -> List[Tuple[int, float]]:
+        if self._size == 0:
+            return []
+        query = self._normalize(query)
+        candidates = self._filter_positions(pre_filter)
+        if candidates is None and self._size >= self.ann_threshold:
+            candidates = self._ann_candidates(query)
+
+        if candidates is None:
+            scores = self._scores(query)
+            positions = None
+        else:
+            if len(candidates) == 0:
+                return []
+            scores = self._scores(query, candidates)
+            positions = candidates
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        if positions is not None:
+            return [(int(positions[i]), float(scores[i])) for i in top]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        pre_filter: Optional[dict] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """Recherche par vecteur ; le score suit la convention Atlas (1 + cos) / 2."""
+        results = []
+        for position, cosine in self._search(np.asarray(embedding, dtype=np.float32), k, pre_filter):
+            doc = Document(
+                page_content=self._texts[position],
+                metadata=dict(self._metadatas[position]),
+                id=self._ids[position],
+            )
+            results.append((doc, (1.0 + cosine) / 2.0))
+        return results
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, pre_filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, pre_filter, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, pre_filter: Optional[dict] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, pre_filter, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, pre_filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, pre_filter, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    # ------------------------------------------------------------------
+    # Persistance
+    # ------------------------------------------------------------------
+
+    def save(self, path: Optional[str] = None):
+        """Écrit un instantané du magasin (matrice .npy, métadonnées JSON, index IVF).
+
+        Les fichiers de données sont écrits sous un nouveau numéro de version, puis
+        meta.json est remplacé atomiquement pour les désigner ; ceux de l'instantané
+        précédent sont ensuite supprimés.
+
+        Args:
+            path: Dossier de destination, par défaut celui du magasin.
+        """
+        path = Path(path) if path else self.path
+        if path is None:
+            raise ValueError("Aucun dossier de sauvegarde n'est défini pour ce magasin")
+        path.mkdir(parents=True, exist_ok=True)
+
+        if self._size >= self.ann_threshold and self._ivf_dirty:
+            with self._ivf_lock:
+                self.build_ann_index()
+
+        version = uuid.uuid4().hex
+        files = {"vectors": self._versioned(self.VECTORS_FILE, version)}
+        with open(path / files["vectors"], "wb") as f:
+            np.save(f, np.ascontiguousarray(self._matrix[:self._size]))
+        if self.dtype == "int8":
+            files["scales"] = self._versioned(self.SCALES_FILE, version)
+            with open(path / files["scales"], "wb") as f:
+                np.save(f, np.ascontiguousarray(self._scales[:self._size]))
+        ivf = self._ivf
+        if ivf is not None and not self._ivf_dirty:
+            files["ivf"] = self._versioned(self.IVF_FILE, version)
+            with open(path / files["ivf"], "wb") as f:
+                np.savez(f, centroids=ivf[0], order=ivf[1], offsets=ivf[2])
+
+        # meta.json est le seul pointeur vers l'instantané : il est remplacé en dernier
+        tmp_meta = path / (self.META_FILE + ".tmp")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"ids": self._ids, "texts": self._texts, "metadatas": self._metadatas, "rows": self._size, "files": files}, f, ensure_ascii=False)
+        os.replace(tmp_meta, path / self.META_FILE)
+        self._remove_stale_files(path, set(files.values()))
+
+    @staticmethod
+    def _versioned(name: str, version: str) -> str:
+        stem, suffix = os.path.splitext(name)
+        return f"{stem}-{version}{suffix}"
+
+    def _remove_stale_files(self, path: Path, current: set):
+        """Supprime les fichiers de données des instantanés précédents (ou d'une sauvegarde interrompue)."""
+        prefixes = tuple(os.path.splitext(name)[0] for name in (self.VECTORS_FILE, self.SCALES_FILE, self.IVF_FILE))
+        for file in path.iterdir():
+            if file.name in current or not file.name.startswith(prefixes):
+                continue
+            try:
+                file.unlink()
+            except OSError:
+                # Un autre processus a pu le supprimer, ou l'utilise encore (Windows)
+                pass
+
+    def load(self, path: Optional[str] = None):
+        """Charge un instantané écrit par `save`.
+
+        Args:
+            path: Dossier source, par défaut celui du magasin.
+        """
+        path = Path(path) if path else self.path
+        # Un instantané remplacé entre la lecture de meta.json et celle des données est relu
+        for attempt in range(3):
+            with open(path / self.META_FILE, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            files = meta.get("files", {"vectors": self.VECTORS_FILE, "scales": self.SCALES_FILE, "ivf": self.IVF_FILE})
+            try:
+                matrix = np.load(path / files["vectors"], mmap_mode="r" if self.mmap else None)
+                scales = np.load(path / files["scales"]) if matrix.dtype.name == "int8" else None
+                ivf = None
+                if "ivf" in files and (path / files["ivf"]).exists():
+                    with np.load(path / files["ivf"]) as data:
+                        ivf = (data["centroids"], data["order"], data["offsets"])
+                break
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+        rows = meta.get("rows", len(meta["ids"]))
+        if len(matrix) != rows or len(meta["ids"]) != rows:
+            raise ValueError(f"Instantané incohérent dans {path} : {len(matrix)} vecteurs pour {len(meta['ids'])} documents")
+
+        self._matrix = matrix
+        self.dtype = matrix.dtype.name
+        self._scales = scales if scales is not None else np.ones(len(matrix), dtype=np.float32)
+        self._ids = meta["ids"]
+        self._texts = meta["texts"]
+        self._metadatas = meta["metadatas"]
+        self._size = len(self._ids)
+        self._positions = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._field_index = {f: {} for f in self.filter_fields}
+        for position, metadata in enumerate(self._metadatas):
+            self._index_metadata(position, metadata)
+
+        self._ivf = ivf
+        self._ivf_dirty = ivf is None
@@ -0,0 +1,258 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from typing import Dict, Optional, Tuple
+
+
+# Bornes (en secondes) des histogrammes de durée
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    """Registre de métriques : compteurs, histogrammes et spans de durée.
+
+    Chaque étape instrumentée (`span`) alimente l'histogramme `<nom>_seconds`
+    et notifie les exportateurs enregistrés (journalisation, OpenTelemetry).
+    Le registre est partagé entre threads ; `registry` est l'instance par
+    défaut utilisée par RAGTool, DocumentProcessor et DPLNAgent.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, dict] = {}
+        self._exporters = []
+        self._lock = threading.Lock()
+
+    def add_exporter(self, exporter):
+        """Enregistre un exportateur (méthodes optionnelles on_span, on_increment, on_observe)."""
+        self._exporters.append(exporter)
+        return exporter
+
+    def _notify(self, method: str, *args):
+        for exporter in self._exporters:
+            callback = getattr(exporter, method, None)
+            if callback is not None:
+                callback(*args)
+
+    def increment(self, name: str, value: float = 1, **labels):
+        """Incrémente le compteur `name` pour ces labels."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+        self._notify("on_increment", name, value, labels)
+
+    def observe(self, name: str, value: float, buckets: Optional[Tuple[float, ...]] = None, **labels):
+        """Ajoute une observation à l'histogramme `name` (les bornes sont fixées à la première)."""
+        key = _label_key(labels)
+        with self._lock:
+            histogram = self._histograms.setdefault(name, {"buckets": tuple(buckets or self.buckets), "series": {}})
+            series = histogram["series"].get(key)
+            if series is None:
+                series = histogram["series"][key] = {"counts": [0] * len(histogram["buckets"]), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+        self._notify("on_observe", name, value, labels)
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Chronomètre un bloc : histogramme `<name>_seconds`, et `<name>_errors_total` en cas d'exception."""
+        start_wall = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.increment(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, start=start_wall, **labels)
+
+    def record(self, name: str, seconds: float, start: Optional[float] = None, **labels):
+        """Enregistre un span mesuré ailleurs (par exemple dans un processus worker)."""
+        self.observe(f"{name}_seconds", seconds, **labels)
+        self._notify("on_span", name, start if start is not None else time.time() - seconds, seconds, labels)
+
+    def snapshot(self) -> dict:
+        """Retourne l'état courant des métriques, sérialisable en JSON."""
+        with self._lock:
+            return {
+                "counters": {
+                    name: {_format_labels(key): value for key, value in series.items()}
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: {
+                        _format_labels(key): {
+                            "count": s["count"],
+                            "sum": s["sum"],
+                            "buckets": dict(zip([str(b) for b in h["buckets"]], s["counts"])),
+                        }
+                        for key, s in h["series"].items()
+                    }
+                    for name, h in self._histograms.items()
+                },
+            }
+
+    def reset(self):
+        """Remet toutes les métriques à zéro (les exportateurs sont conservés)."""
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+
+registry = Metrics()
+
+
+class LoggingExporter:
+    """Journalise chaque span et chaque compteur incrémenté."""
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.DEBUG):
+        self.logger = logger or logging.getLogger("dpln.metrics")
+        self.level = level
+
+    def on_span(self, name: str, start: float, seconds: float, labels: dict):
+        self.logger.log(self.level, "span %s %.2f ms %s", name, seconds * 1000, labels)
+
+    def on_increment(self, name: str, value: float, labels: dict):
+        self.logger.log(self.level, "counter %s +%s %s", name, value, labels)
+
+
+class PrometheusExporter:
+    """Expose un registre au format texte de Prometheus."""
+
+    def __init__(self, metrics: Metrics = registry):
+        self.metrics = metrics
+        self._server = None
+
+    def render(self) -> str:
+        """Retourne toutes les métriques au format d'exposition texte."""
+        metrics = self.metrics
+        lines = []
+        with metrics._lock:
+            for name, series in sorted(metrics._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, histogram in sorted(metrics._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, s in histogram["series"].items():
+                    for bound, count in zip(histogram["buckets"], s["counts"]):
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', str(bound)))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {s['count']}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {s['sum']}")
+                    lines.append(f"{name}_count{_format_labels(key)} {s['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Écrit les métriques dans un fichier (collecteur textfile de node_exporter)."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+
+    def serve(self, port: int = 9464, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Sert /metrics dans un thread d'arrière-plan."""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server
+
+
+class OpenTelemetryExporter:
+    """Transmet spans, compteurs et histogrammes à OpenTelemetry (si le paquet est installé)."""
+
+    def __init__(self, name: str = "dpln_rag"):
+        try:
+            from opentelemetry import metrics as otel_metrics, trace
+        except ImportError as e:
+            raise ImportError("OpenTelemetryExporter nécessite le paquet opentelemetry-api") from e
+        self.tracer = trace.get_tracer(name)
+        self.meter = otel_metrics.get_meter(name)
+        self._counters = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _attributes(labels: dict) -> dict:
+        return {k: str(v) for k, v in labels.items()}
+
+    def on_span(self, name: str, start: float, seconds: float, labels: dict):
+        span = self.tracer.start_span(name, start_time=int(start * 1e9), attributes=self._attributes(labels))
+        span.end(end_time=int((start + seconds) * 1e9))
+
+    def on_increment(self, name: str, value: float, labels: dict):
+        if name not in self._counters:
+            self._counters[name] = self.meter.create_counter(name)
+        self._counters[name].add(value, attributes=self._attributes(labels))
+
+    def on_observe(self, name: str, value: float, labels: dict):
+        if name not in self._histograms:
+            self._histograms[name] = self.meter.create_histogram(name)
+        self._histograms[name].record(value, attributes=self._attributes(labels))
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Callback LangChain mesurant la durée de chaque appel au LLM (histogramme agent_llm_seconds).
+
+    En streaming, le délai jusqu'au premier token de chaque appel est aussi
+    mesuré (histogramme agent_llm_first_token_seconds).
+    """
+
+    def __init__(self, metrics: Metrics = registry):
+        self.metrics = metrics
+        self._starts = {}
+        self._first_tokens = set()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        start = self._starts.get(run_id)
+        if start is not None and run_id not in self._first_tokens:
+            self._first_tokens.add(run_id)
+            self.metrics.observe("agent_llm_first_token_seconds", time.perf_counter() - start)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        self._first_tokens.discard(run_id)
+        if start is not None:
+            self.metrics.observe("agent_llm_seconds", time.perf_counter() - start)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._starts.pop(run_id, None)
+        self._first_tokens.discard(run_id)
+        self.metrics.increment("agent_llm_errors_total")
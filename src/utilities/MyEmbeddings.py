@@ -1,19 +1,250 @@
-
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.embeddings import Embeddings
-from sentence_transformers import SentenceTransformer
+import numpy as np
+
+from typing import List, Optional
 
-from typing import List
+from utilities.EmbeddingCache import EmbeddingCache
 
 class MyEmbeddings(Embeddings):
-    """Classe personnalisée pour les embeddings avec SentenceTransformer."""
-    
-    def __init__(self, model: str = 'bert-base-nli-mean-tokens'):
-        self.model = SentenceTransformer(model, trust_remote_code=True)
-    
+    """Classe personnalisée pour les embeddings avec SentenceTransformer.
+
+    Le modèle (et sentence_transformers / torch) n'est chargé qu'au premier
+    encodage, ou par `load` / `warmup` pour le précharger.
+    """
+
+    def __init__(
+        self,
+        model: str = 'bert-base-nli-mean-tokens',
+        batch_size: int = 32,
+        num_workers: int = 0,
+        cache_path: Optional[str] = None,
+        cache_max_entries: int = 500_000,
+        query_cache_size: int = 1024,
+        batch_tokens: Optional[int] = None
+    ):
+        """Initialise le modèle d'embedding.
+
+        Args:
+            model: Nom du modèle SentenceTransformer.
+            batch_size: Nombre de textes encodés par passe du modèle.
+            num_workers: Nombre de processus CPU pour l'encodage des documents (0 = pas de pool).
+            cache_path: Fichier SQLite du cache d'embeddings. Si None, pas de cache disque.
+            cache_max_entries: Nombre maximal d'entrées du cache disque.
+            query_cache_size: Nombre de requêtes gardées en mémoire par embed_query (0 = désactivé).
+            batch_tokens: Nombre maximal de tokens (remplissage compris) par passe du modèle. Si fourni,
+                les textes sont triés par longueur et regroupés en lots de taille variable : beaucoup
+                de textes courts ou peu de textes longs. Sinon, lots de `batch_size` textes.
+        """
+        self.model_name = model
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.batch_tokens = batch_tokens
+        # Tokens réellement encodés et tokens de remplissage des lots par longueur
+        self.encoded_tokens = 0
+        self.padding_tokens = 0
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._pool = None
+        # Exécuteur dédié à l'inférence pour les appels asynchrones
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embeddings")
+
+        self.cache = EmbeddingCache(cache_path, model, max_entries=cache_max_entries) if cache_path else None
+        self.query_cache_size = query_cache_size
+        self._query_cache = OrderedDict()
+        # Le cache des requêtes est partagé par les threads de recherche, l'exécuteur et les appelants synchrones
+        self._query_lock = threading.Lock()
+        self.query_hits = 0
+        self.query_misses = 0
+
+    @property
+    def model(self):
+        """Le modèle SentenceTransformer, chargé au premier accès."""
+        if self._model is None:
+            self.load()
+        return self._model
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        """Charge le modèle s'il ne l'est pas déjà (sans risque depuis plusieurs threads)."""
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name, trust_remote_code=True)
+        return self._model
+
+    def warmup(self):
+        """Charge le modèle et exécute une première inférence, hors caches."""
+        self._encode(["échauffement"], batch_size=1)
+
+    @property
+    def max_seq_length(self) -> int:
+        """Nombre maximal de tokens vus par le modèle, au-delà duquel un texte est tronqué."""
+        return self.model.max_seq_length
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Compte les tokens de chaque texte (jetons spéciaux compris), sans troncature."""
+        if not texts:
+            return []
+        encoded = self.model.tokenizer(list(texts), add_special_tokens=True, truncation=False, verbose=False)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def _length_batches(self, texts: List[str]) -> List[List[int]]:
+        """Regroupe les indices des textes en lots de longueurs voisines, bornés à `batch_tokens`.
+
+        Chaque lot est rempli jusqu'à la longueur de son plus long texte : trier
+        par longueur réduit ce remplissage, et borner les tokens plutôt que le
+        nombre de textes garde un coût par passe à peu près constant.
+        """
+        max_length = self.max_seq_length
+        lengths = [min(n, max_length) for n in self.count_tokens(texts)]
+        order = sorted(range(len(texts)), key=lengths.__getitem__, reverse=True)
+        batches, batch = [], []
+        for i in order:
+            # Tri décroissant : le premier texte du lot fixe sa longueur
+            if batch and (len(batch) + 1) * lengths[batch[0]] > self.batch_tokens:
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        for batch in batches:
+            self.encoded_tokens += sum(lengths[i] for i in batch)
+            self.padding_tokens += sum(lengths[batch[0]] - lengths[i] for i in batch)
+        return batches
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """Encode des textes avec le modèle, sans passer par le cache."""
+        if self.num_workers > 1 and len(texts) > batch_size:
+            if self._pool is None:
+                self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.num_workers)
+            vectors = self.model.encode_multi_process(texts, self._pool, batch_size=batch_size)
+        elif self.batch_tokens and len(texts) > 1:
+            vectors = np.empty((len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+            for batch in self._length_batches(texts):
+                vectors[batch] = self.model.encode(
+                    [texts[i] for i in batch], batch_size=len(batch), convert_to_numpy=True, show_progress_bar=False
+                )
+        else:
+            vectors = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def embed_array(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Génère les embeddings d'une liste de textes sous forme de matrice float32.
+
+        Seuls les textes absents du cache disque passent par le modèle.
+
+        Args:
+            texts: Textes à encoder.
+            batch_size: Taille de batch, par défaut celle de l'instance.
+
+        Returns:
+            Matrice de forme (len(texts), dimension).
+        """
+        batch_size = batch_size or self.batch_size
+        if len(texts) == 0:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        if self.cache is None:
+            return self._encode(texts, batch_size)
+
+        cached = self.cache.get_many(texts)
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            encoded = self._encode([texts[i] for i in missing], batch_size)
+            self.cache.put_many([texts[i] for i in missing], encoded)
+            for i, vector in zip(missing, encoded):
+                cached[i] = vector
+        return np.vstack(cached).astype(np.float32, copy=False)
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Génère les embeddings pour une liste de textes."""
-        return [self.model.encode(t).tolist() for t in texts]
-    
+        return self.embed_array(texts).tolist()
+
     def embed_query(self, query: str) -> List[float]:
         """Génère l'embedding pour une requête."""
-        return self.model.encode([query]).tolist()[0]
\ No newline at end of file
+        return self.embed_queries([query])[0].tolist()
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Génère les embeddings de plusieurs requêtes en une seule passe du modèle.
+
+        Les requêtes déjà présentes dans le cache mémoire ne sont pas réencodées.
+
+        Args:
+            queries: Requêtes à encoder.
+
+        Returns:
+            Matrice float32 de forme (len(queries), dimension).
+        """
+        if self.query_cache_size <= 0:
+            return self.embed_array(queries)
+
+        vectors = [None] * len(queries)
+        missing = {}
+        with self._query_lock:
+            for i, query in enumerate(queries):
+                vector = self._query_cache.get(query)
+                if vector is not None:
+                    self._query_cache.move_to_end(query)
+                    self.query_hits += 1
+                    vectors[i] = vector
+                else:
+                    self.query_misses += 1
+                    missing.setdefault(query, []).append(i)
+
+        if missing:
+            # Encodage hors du verrou : les autres requêtes restent servies par le cache
+            encoded = self.embed_array(list(missing))
+            with self._query_lock:
+                for (query, positions), vector in zip(missing.items(), encoded):
+                    self._query_cache[query] = vector
+                    for i in positions:
+                        vectors[i] = vector
+                while len(self._query_cache) > self.query_cache_size:
+                    self._query_cache.popitem(last=False)
+        return np.vstack(vectors).astype(np.float32, copy=False)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Version asynchrone de embed_documents, exécutée hors de la boucle d'événements."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embed_documents, texts)
+
+    async def aembed_query(self, query: str) -> List[float]:
+        """Version asynchrone de embed_query, exécutée hors de la boucle d'événements."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embed_query, query)
+
+    async def aembed_queries(self, queries: List[str]) -> np.ndarray:
+        """Version asynchrone de embed_queries, exécutée hors de la boucle d'événements."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embed_queries, queries)
+
+    def cache_stats(self) -> dict:
+        """Retourne les compteurs des caches mémoire et disque."""
+        return {
+            "query_cache": {
+                "entries": len(self._query_cache),
+                "hits": self.query_hits,
+                "misses": self.query_misses,
+            },
+            "disk_cache": self.cache.stats() if self.cache else None,
+            "length_batches": {
+                "encoded_tokens": self.encoded_tokens,
+                "padding_tokens": self.padding_tokens,
+            },
+        }
+
+    def close(self):
+        """Arrête le pool de processus d'encodage et ferme le cache disque."""
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+        self._executor.shutdown(wait=False)
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
@@ -0,0 +1,220 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from typing import Dict, List, Optional
+
+from utilities.text_similarity import SOURCE_PREFIX, shingles
+
+
+# Nombre premier de Mersenne des fonctions de hachage universelles (a * x + b) mod P
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+class NearDuplicateIndex:
+    """Index MinHash/LSH des chunks stockés, avec les pages propriétaires de chacun.
+
+    Deux chunks sont quasi identiques si la similarité de Jaccard de leurs
+    suites de `shingle_size` mots, estimée par MinHash, atteint `threshold`.
+    Le LSH (signature découpée en `bands` bandes) ne compare un chunk qu'aux
+    chunks partageant au moins une bande. La ligne "Source:", propre à chaque
+    page, est ignorée.
+
+    Un chunk canonique est stocké une seule fois ; ses propriétaires
+    {URL: titre} sont toutes les pages qui le contiennent. Il n'est supprimé
+    qu'avec son dernier propriétaire.
+
+    Un chunk ajouté avec `pending=True` n'est pas encore écrit : il sert déjà de
+    canonique aux pages suivantes de l'exécution (le résultat ne dépend pas de
+    l'avancement du thread d'écriture), qui sont notées comme dépendantes.
+    `commit` le confirme ; `discard` l'oublie si son écriture échoue et retourne
+    ces pages, à réingérer. `save` ne persiste pas les chunks en attente.
+    """
+
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.85, num_perm: int = 128, bands: int = 16, shingle_size: int = 5, seed: int = 0):
+        """Initialise l'index, en chargeant celui de `path` s'il existe.
+
+        Args:
+            path: Fichier .npz de persistance (None = en mémoire uniquement).
+            threshold: Similarité de Jaccard estimée à partir de laquelle deux chunks sont des doublons.
+            num_perm: Nombre de fonctions de hachage de la signature MinHash.
+            bands: Nombre de bandes du LSH (`num_perm` doit en être un multiple).
+            shingle_size: Nombre de mots par suite comparée.
+            seed: Graine des fonctions de hachage (à conserver entre deux ingestions).
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) doit être un multiple de bands ({bands})")
+        self.path = Path(path) if path else None
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._owners: Dict[str, Dict[str, str]] = {}
+        self._buckets: Dict[tuple, set] = {}
+        # Chunks en attente d'écriture -> pages devenues propriétaires entre-temps
+        self._pending: Dict[str, set] = {}
+
+        if self.path is not None and self.path.exists():
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> np.ndarray:
+        """Calcule la signature MinHash d'un texte de chunk."""
+        hashes = shingles(SOURCE_PREFIX.sub("", text, count=1), self.shingle_size)
+        if not hashes:
+            return np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint32)
+        # x et a sont inférieurs à 2**31 : le produit tient sur 64 bits
+        x = np.fromiter(hashes, dtype=np.uint64, count=len(hashes)) % np.uint64(MERSENNE_PRIME)
+        hashed = (x[:, None] * self._a[None, :] + self._b[None, :]) % np.uint64(MERSENNE_PRIME)
+        return hashed.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[tuple]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def find(self, signature: np.ndarray, exclude_owner: Optional[str] = None) -> Optional[str]:
+        """Retourne le chunk indexé le plus proche d'une signature, s'il atteint le seuil.
+
+        Args:
+            signature: Signature MinHash du chunk à placer.
+            exclude_owner: URL d'une page dont les chunks propres sont ignorés (ses anciennes
+                versions, remplacées par la réingestion en cours).
+        """
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates |= self._buckets.get(key, set())
+        best, best_score = None, self.threshold
+        for chunk_id in candidates:
+            owners = self._owners[chunk_id]
+            if exclude_owner is not None and set(owners) <= {exclude_owner}:
+                continue
+            score = float(np.mean(self._signatures[chunk_id] == signature))
+            if score >= best_score:
+                best, best_score = chunk_id, score
+        return best
+
+    def add(self, chunk_id: str, signature: np.ndarray, url: str, title: str, pending: bool = False) -> Dict[str, str]:
+        """Indexe un chunk (ou ajoute un propriétaire s'il l'est déjà) et retourne ses propriétaires.
+
+        Args:
+            pending: Le chunk n'est pas encore écrit par la page `url` (voir `commit` et
+                `discard`) ; sans effet sur un chunk déjà indexé.
+        """
+        if chunk_id in self._signatures:
+            return self.add_owner(chunk_id, url, title)
+        self._signatures[chunk_id] = signature
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, set()).add(chunk_id)
+        owners = self.add_owner(chunk_id, url, title)
+        if pending:
+            self._pending[chunk_id] = set()
+        return owners
+
+    def commit(self, chunk_ids: List[str]):
+        """Confirme l'écriture de chunks ajoutés en attente : leurs pages dépendantes n'ont plus rien à faire."""
+        for chunk_id in chunk_ids:
+            self._pending.pop(chunk_id, None)
+
+    def discard(self, chunk_ids: List[str]) -> List[str]:
+        """Oublie les chunks en attente parmi `chunk_ids` (écriture échouée).
+
+        Returns:
+            Les URL des pages dépendantes de ces chunks : elles n'ont stocké ni
+            leur copie ni le canonique, et doivent être réingérées.
+        """
+        dependents = set()
+        for chunk_id in chunk_ids:
+            if chunk_id in self._pending:
+                dependents |= self._pending[chunk_id]
+                self._drop(chunk_id)
+        return sorted(dependents)
+
+    def add_owner(self, chunk_id: str, url: str, title: str) -> Dict[str, str]:
+        """Ajoute une page propriétaire à un chunk et retourne ses propriétaires.
+
+        Une page ajoutée à un chunk en attente est notée comme dépendante de son écriture.
+        """
+        owners = self._owners.setdefault(chunk_id, {})
+        if chunk_id in self._pending and url not in owners:
+            self._pending[chunk_id].add(url)
+        owners[url] = title
+        return owners
+
+    def owners(self, chunk_id: str) -> Dict[str, str]:
+        """Retourne les propriétaires {URL: titre} d'un chunk (vide s'il n'est pas indexé)."""
+        return self._owners.get(chunk_id, {})
+
+    def remove_owner(self, chunk_id: str, url: str) -> Dict[str, str]:
+        """Retire une page des propriétaires d'un chunk et retourne ceux qui restent.
+
+        Un chunk sans propriétaire est retiré de l'index ; un chunk inconnu
+        retourne un dictionnaire vide.
+        """
+        owners = self._owners.get(chunk_id)
+        if owners is None:
+            return {}
+        owners.pop(url, None)
+        if chunk_id in self._pending:
+            self._pending[chunk_id].discard(url)
+        if not owners:
+            self._drop(chunk_id)
+        return owners
+
+    def _drop(self, chunk_id: str):
+        self._owners.pop(chunk_id, None)
+        self._pending.pop(chunk_id, None)
+        signature = self._signatures.pop(chunk_id)
+        for key in self._band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(chunk_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def save(self, path: Optional[str] = None):
+        """Écrit l'index (signatures en matrice, propriétaires en JSON) de façon atomique."""
+        path = Path(path) if path else self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        ids = [i for i in self._signatures if i not in self._pending]
+        signatures = np.vstack([self._signatures[i] for i in ids]) if ids else np.empty((0, self.num_perm), dtype=np.uint32)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                signatures=signatures,
+                meta=np.array(json.dumps({
+                    "ids": ids,
+                    "owners": {i: self._owners[i] for i in ids},
+                    "threshold": self.threshold,
+                    "bands": self.bands,
+                    "shingle_size": self.shingle_size,
+                }, ensure_ascii=False)),
+            )
+        os.replace(tmp_path, path)
+
+    def load(self, path: Optional[str] = None):
+        """Charge un index écrit par `save` (les bandes LSH sont reconstruites)."""
+        path = Path(path) if path else self.path
+        with np.load(path) as data:
+            signatures = data["signatures"]
+            meta = json.loads(str(data["meta"]))
+        if signatures.shape[1] != self.num_perm:
+            raise ValueError(f"Index de {signatures.shape[1]} permutations, {self.num_perm} attendues")
+        self.bands, self.shingle_size = meta["bands"], meta["shingle_size"]
+        self.rows = self.num_perm // self.bands
+        self._signatures, self._owners, self._buckets, self._pending = {}, {}, {}, {}
+        for chunk_id, signature in zip(meta["ids"], signatures):
+            self._signatures[chunk_id] = signature
+            self._owners[chunk_id] = meta["owners"].get(chunk_id, {})
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, set()).add(chunk_id)
@@ -0,0 +1,141 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.documents import Document
+
+from typing import List, Optional, Tuple
+
+from utilities.TitleIndex import normalize_title
+
+
+# Collection où DocumentProcessor incrémente la génération de chaque collection Vec_* modifiée,
+# avec la liste des titres réingérés
+GENERATIONS_COLLECTION = "Ingest_Generations"
+# Au-delà, la liste des titres modifiés n'est pas enregistrée (tout le magasin est invalidé)
+MAX_CHANGED_TITLES = 1000
+
+
+class ResultCache:
+    """Cache des résultats de recherche de RAGTool, borné (LRU) et à durée de vie.
+
+    Le niveau exact est indexé par (magasin, sujet résolu, question normalisée).
+    Le niveau sémantique, optionnel, réutilise le résultat d'une question déjà
+    vue dont l'embedding est à une similarité cosinus d'au moins
+    `semantic_threshold`, pour le même magasin et le même sujet.
+
+    RAGTool vide les entrées d'un magasin quand la génération de sa collection
+    change (voir GENERATIONS_COLLECTION).
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 600.0, semantic_threshold: Optional[float] = None):
+        """Initialise le cache.
+
+        Args:
+            max_entries: Nombre maximal d'entrées (les moins récemment utilisées sont évincées).
+            ttl: Durée de vie d'une entrée, en secondes.
+            semantic_threshold: Similarité cosinus minimale du niveau sémantique (None = désactivé).
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+
+        self._entries = OrderedDict()
+        # (magasin, sujet) -> {clé: embedding normalisé}, pour le niveau sémantique
+        self._scopes = {}
+        self._lock = threading.Lock()
+        self.hits = {"exact": 0, "semantic": 0}
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(store_name: str, subject_name: Optional[str], question: str) -> Tuple[str, str, str]:
+        return store_name, subject_name or "", normalize_title(question)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            scope = self._scopes.get(key[:2])
+            if scope is not None:
+                scope.pop(key, None)
+                if not scope:
+                    del self._scopes[key[:2]]
+
+    @staticmethod
+    def _copy(docs: List[Document]) -> List[Document]:
+        """Copie des documents (métadonnées comprises) : modifier un résultat ne doit pas modifier le cache."""
+        return [Document(page_content=doc.page_content, metadata=copy.deepcopy(doc.metadata), id=doc.id) for doc in docs]
+
+    def _fresh(self, key) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires"] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, store_name: str, subject_name: Optional[str], question: str) -> Optional[List[Document]]:
+        """Cherche le résultat exact d'une question (None si absent ou expiré)."""
+        with self._lock:
+            entry = self._fresh(self._key(store_name, subject_name, question))
+            if entry is None:
+                # Sans niveau sémantique, l'échec est compté ici plutôt que dans get_similar
+                if self.semantic_threshold is None:
+                    self.misses += 1
+                return None
+            self.hits["exact"] += 1
+            return self._copy(entry["docs"])
+
+    def get_similar(self, store_name: str, subject_name: Optional[str], vector) -> Optional[List[Document]]:
+        """Cherche le résultat d'une question sémantiquement proche (None si aucune n'atteint le seuil)."""
+        if self.semantic_threshold is None:
+            return None
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self._lock:
+            scope = self._scopes.get((store_name, subject_name or ""))
+            if scope:
+                keys = list(scope)
+                scores = np.vstack([scope[k] for k in keys]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.semantic_threshold:
+                    entry = self._fresh(keys[best])
+                    if entry is not None:
+                        self.hits["semantic"] += 1
+                        return self._copy(entry["docs"])
+            self.misses += 1
+            return None
+
+    def put(self, store_name: str, subject_name: Optional[str], question: str, vector, docs: List[Document]):
+        """Ajoute le résultat d'une question, avec son embedding pour le niveau sémantique."""
+        key = self._key(store_name, subject_name, question)
+        docs = self._copy(docs)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = {"docs": docs, "expires": time.monotonic() + self.ttl}
+            if self.semantic_threshold is not None and vector is not None:
+                vector = np.asarray(vector, dtype=np.float32)
+                self._scopes.setdefault(key[:2], {})[key] = vector / (np.linalg.norm(vector) or 1.0)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, store_name: Optional[str] = None):
+        """Supprime les entrées d'un magasin, ou toutes si `store_name` est None."""
+        with self._lock:
+            for key in [k for k in self._entries if store_name is None or k[0] == store_name]:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        """Retourne les compteurs du cache."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from bson.binary import Binary
+from langchain_core.documents import Document
+
+from typing import Iterable, List, Optional, Tuple
+
+
+class SubjectVectorCache:
+    """Cache LRU des chunks et de la matrice d'embeddings de chaque (magasin, titre).
+
+    Un donjon ou une quête ne compte que quelques chunks : une fois chargés,
+    les recherches filtrées sur ce titre sont un simple produit scalaire local,
+    exact, sans aller-retour vers l'index vectoriel d'Atlas.
+
+    Les entrées sont invalidées par RAGTool quand le titre est réingéré, et
+    expirent après `ttl` secondes par sécurité.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600.0):
+        """Initialise le cache.
+
+        Args:
+            max_entries: Nombre maximal de titres gardés en mémoire.
+            max_bytes: Taille maximale cumulée des matrices, en octets.
+            ttl: Durée de vie d'une entrée, en secondes.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def from_records(records: Iterable[dict], text_key: str = "text", embedding_key: str = "embedding") -> Tuple[List[Document], np.ndarray]:
+        """Construit les documents et la matrice normalisée à partir des documents MongoDB d'un titre.
+
+        Les embeddings stockés en liste de doubles ou en vecteur BSON (float32 ou
+        int8, voir VectorCompressor.to_bson) sont acceptés.
+        """
+        docs, rows = [], []
+        for record in records:
+            record = dict(record)
+            vector = record.pop(embedding_key, None)
+            if vector is None:
+                continue
+            if isinstance(vector, Binary):
+                vector = vector.as_vector().data
+            rows.append(np.asarray(vector, dtype=np.float32))
+            text = record.pop(text_key, "")
+            doc_id = record["_id"] = str(record["_id"])
+            # Même format de résultat que RAGTool._avector_search (le score est ajouté par `search`)
+            docs.append(Document(page_content=text, metadata=record, id=doc_id))
+        if not rows:
+            return [], np.empty((0, 0), dtype=np.float32)
+        matrix = np.vstack(rows)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return docs, matrix
+
+    def get(self, store_name: str, title: str) -> Optional[Tuple[List[Document], np.ndarray]]:
+        """Retourne (documents, matrice) d'un titre, ou None s'il n'est pas chargé ou a expiré."""
+        key = (store_name, title)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires"] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["docs"], entry["matrix"]
+
+    def put(self, store_name: str, title: str, docs: List[Document], matrix: np.ndarray):
+        """Ajoute les chunks d'un titre, en évinçant les titres les moins récemment utilisés."""
+        key = (store_name, title)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = {"docs": docs, "matrix": matrix, "expires": time.monotonic() + self.ttl}
+            self._bytes += matrix.nbytes
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    @staticmethod
+    def search(docs: List[Document], matrix: np.ndarray, query_vector, k: int) -> List[Document]:
+        """Retourne les `k` chunks les plus proches de la requête (similarité cosinus exacte).
+
+        Les documents retournés sont des copies portant leur score dans metadata["score"],
+        comme les résultats de MongoDBAtlasVectorSearch ; les entrées du cache restent intactes.
+        """
+        if not docs:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = matrix @ (query / (np.linalg.norm(query) or 1.0))
+        top = np.argsort(-scores)[:k]
+        return [
+            Document(page_content=docs[i].page_content, metadata={**docs[i].metadata, "score": float(scores[i])}, id=docs[i].id)
+            for i in top
+        ]
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry["matrix"].nbytes
+
+    def invalidate(self, store_name: Optional[str] = None, titles: Optional[Iterable[str]] = None):
+        """Supprime les titres `titles` d'un magasin, tout le magasin, ou tout le cache."""
+        with self._lock:
+            if titles is not None:
+                keys = [(store_name, title) for title in titles]
+            else:
+                keys = [key for key in self._entries if store_name is None or key[0] == store_name]
+            for key in keys:
+                self._remove(key)
+
+    def stats(self) -> dict:
+        """Retourne le nombre de titres, la mémoire occupée et les compteurs du cache."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+                "evictions": self.evictions,
+            }
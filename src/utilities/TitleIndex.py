@@ -0,0 +1,228 @@
+import time
+import unicodedata
+import numpy as np
+from collections import defaultdict
+from rapidfuzz import fuzz, process
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+def normalize_title(text: str) -> str:
+    """Normalise un titre : minuscules, accents supprimés, espaces compactés.
+
+    Exemple: "Aquadôme de Merkator" -> "aquadome de merkator".
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleSnapshot(NamedTuple):
+    """Titres d'une version de la collection, remplacés en bloc à chaque rechargement."""
+    titles: List[str]
+    normalized: List[str]
+    lengths: np.ndarray
+    postings: Dict[str, np.ndarray]
+
+
+class TitleIndex:
+    """Index en mémoire des titres d'une collection List_* pour la recherche floue.
+
+    Les titres sont normalisés une seule fois, puis comparés en bloc avec
+    `rapidfuzz.process.cdist`. Pour les grandes listes, un index de trigrammes
+    restreint le calcul aux titres partageant des trigrammes avec la requête.
+    L'index n'est rechargé que lorsque la collection change (nombre de documents,
+    dernier _id ou plus récent champ "updated_at"), vérifié au plus toutes les
+    `check_interval` secondes. Les titres modifiés sur place doivent donc mettre
+    à jour "updated_at" pour être vus avant le redémarrage.
+
+    Chaque rechargement construit un nouvel instantané (TitleSnapshot), remplacé
+    en une seule affectation : une recherche concurrente lit toujours une seule
+    version des titres.
+    """
+
+    def __init__(self, collection=None, prefilter_threshold: int = 5000, max_candidates: int = 2000, check_interval: float = 30.0):
+        """Initialise l'index.
+
+        Args:
+            collection: Collection MongoDB contenant des documents {"title": ...}.
+            prefilter_threshold: Taille de liste à partir de laquelle le préfiltre par trigrammes est utilisé.
+            max_candidates: Nombre maximal de candidats retenus par le préfiltre.
+            check_interval: Délai minimal en secondes entre deux vérifications de la collection.
+        """
+        self.collection = collection
+        self.prefilter_threshold = prefilter_threshold
+        self.max_candidates = max_candidates
+        self.check_interval = check_interval
+
+        self._snapshot = TitleSnapshot([], [], np.empty(0, dtype=np.int32), {})
+        self._signature = None
+        self._last_check = 0.0
+
+    @classmethod
+    def from_titles(cls, titles: List[str], **kwargs) -> "TitleIndex":
+        """Construit un index à partir d'une liste de titres, sans collection."""
+        index = cls(collection=None, **kwargs)
+        index._build(titles)
+        return index
+
+    @property
+    def titles(self) -> List[str]:
+        return self._snapshot.titles
+
+    @property
+    def normalized(self) -> List[str]:
+        return self._snapshot.normalized
+
+    def _collection_signature(self):
+        last = self.collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        updated = self.collection.find_one({"updated_at": {"$exists": True}}, {"updated_at": 1}, sort=[("updated_at", -1)])
+        return (
+            self.collection.estimated_document_count(),
+            last["_id"] if last else None,
+            updated["updated_at"] if updated else None,
+        )
+
+    def _build(self, titles: List[str]):
+        titles = list(titles)
+        normalized = [normalize_title(t) for t in titles]
+        lengths = np.fromiter((len(t) for t in normalized), dtype=np.int32, count=len(normalized))
+        postings = {}
+        if len(titles) >= self.prefilter_threshold:
+            grams = defaultdict(list)
+            for i, title in enumerate(normalized):
+                for gram in _trigrams(title):
+                    grams[gram].append(i)
+            postings = {g: np.asarray(ids, dtype=np.int32) for g, ids in grams.items()}
+        self._snapshot = TitleSnapshot(titles, normalized, lengths, postings)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Recharge les titres si la collection a changé.
+
+        Args:
+            force: Recharge sans vérifier la signature ni le délai.
+
+        Returns:
+            True si l'index a été reconstruit.
+        """
+        if self.collection is None:
+            return False
+        now = time.monotonic()
+        if not force and self._signature is not None and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+
+        signature = self._collection_signature()
+        if not force and signature == self._signature:
+            return False
+        docs = self.collection.find({}, {"_id": 0, "title": 1})
+        self._build([d["title"] for d in docs if d.get("title")])
+        self._signature = signature
+        return True
+
+    async def arefresh(self, collection, force: bool = False) -> bool:
+        """Version asynchrone de `refresh`, à partir d'une collection du pilote asynchrone.
+
+        Args:
+            collection: Collection pymongo asynchrone (AsyncMongoClient) équivalente à `self.collection`.
+            force: Recharge sans vérifier la signature ni le délai.
+
+        Returns:
+            True si l'index a été reconstruit.
+        """
+        now = time.monotonic()
+        if not force and self._signature is not None and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+
+        last = await collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        updated = await collection.find_one({"updated_at": {"$exists": True}}, {"updated_at": 1}, sort=[("updated_at", -1)])
+        signature = (
+            await collection.estimated_document_count(),
+            last["_id"] if last else None,
+            updated["updated_at"] if updated else None,
+        )
+        if not force and signature == self._signature:
+            return False
+        docs = await collection.find({}, {"_id": 0, "title": 1}).to_list(None)
+        self._build([d["title"] for d in docs if d.get("title")])
+        self._signature = signature
+        return True
+
+    @staticmethod
+    def _length_ok(snapshot: TitleSnapshot, query: str, score_cutoff: float) -> np.ndarray:
+        """Masque des titres dont la longueur permet d'atteindre `score_cutoff`."""
+        # ratio >= cutoff impose 2 * min(l1, l2) / (l1 + l2) >= cutoff / 100
+        r = score_cutoff / 100.0
+        q_len = len(query)
+        min_len = int(np.floor(q_len * r / (2 - r))) if r > 0 else 0
+        max_len = int(np.ceil(q_len * (2 - r) / r)) if r > 0 else np.iinfo(np.int32).max
+        return (snapshot.lengths >= min_len) & (snapshot.lengths <= max_len)
+
+    def _candidates(self, snapshot: TitleSnapshot, query: str, score_cutoff: float) -> Tuple[np.ndarray, bool]:
+        """Sélectionne les indices des titres susceptibles d'atteindre `score_cutoff`.
+
+        Returns:
+            Les indices candidats, et True s'ils ont été tronqués à `max_candidates`.
+        """
+        length_ok = self._length_ok(snapshot, query, score_cutoff)
+
+        if not snapshot.postings:
+            return np.flatnonzero(length_ok), False
+
+        postings = [snapshot.postings[g] for g in _trigrams(query) if g in snapshot.postings]
+        if not postings:
+            return np.empty(0, dtype=np.int32), False
+        shared = np.bincount(np.concatenate(postings), minlength=len(snapshot.titles))
+        shared[~length_ok] = 0
+        candidates = np.flatnonzero(shared)
+        if len(candidates) > self.max_candidates:
+            top = np.argpartition(-shared[candidates], self.max_candidates)[:self.max_candidates]
+            return np.sort(candidates[top]), True
+        return candidates, False
+
+    @staticmethod
+    def _score(snapshot: TitleSnapshot, query: str, candidates: np.ndarray) -> Tuple[int, float]:
+        """Retourne l'indice et le score du meilleur candidat."""
+        choices = [snapshot.normalized[i] for i in candidates]
+        scores = process.cdist([query], choices, scorer=fuzz.ratio, processor=None, workers=-1)[0]
+        # argmax renvoie le premier maximum : même départage que la boucle d'origine
+        best = int(np.argmax(scores))
+        return int(candidates[best]), float(scores[best])
+
+    def best_match(self, query: str, score_cutoff: float = 70, refresh: bool = True) -> Tuple[Optional[str], float]:
+        """Cherche le titre le plus proche de `query`.
+
+        Args:
+            query: Nom recherché.
+            score_cutoff: Score minimal (0-100) pour accepter une correspondance.
+            refresh: Vérifie d'abord si la collection a changé (False si `arefresh` vient d'être appelé).
+
+        Returns:
+            Un tuple (titre original ou None, meilleur score).
+        """
+        if refresh:
+            self.refresh()
+        snapshot = self._snapshot
+        if not snapshot.titles:
+            return None, 0.0
+
+        normalized_query = normalize_title(query)
+        candidates, truncated = self._candidates(snapshot, normalized_query, score_cutoff)
+        if len(candidates) == 0:
+            return None, 0.0
+
+        best, best_score = self._score(snapshot, normalized_query, candidates)
+        if truncated and best_score < score_cutoff:
+            # Le vrai meilleur titre peut partager moins de trigrammes (requête courte avec une faute) :
+            # tous les titres de longueur compatible sont alors comparés
+            everything = np.flatnonzero(self._length_ok(snapshot, normalized_query, score_cutoff))
+            if len(everything):
+                best, best_score = self._score(snapshot, normalized_query, everything)
+        best_title = snapshot.titles[best]
+        return (None if best_score < score_cutoff else best_title), best_score
@@ -0,0 +1,173 @@
+import os
+import numpy as np
+from pathlib import Path
+
+from langchain_core.embeddings import Embeddings
+
+from typing import List, Optional
+
+
+class VectorCompressor:
+    """Représentation compacte des embeddings : réduction de dimension puis quantification.
+
+    La réduction est une ACP ajustée à l'ingestion ("pca"), ou une simple
+    troncature aux premières composantes ("truncate"), adaptée aux modèles
+    entraînés façon Matryoshka. Les vecteurs réduits sont normalisés, puis
+    stockés en float32, float16 ou int8. En int8, chaque vecteur est mis à
+    l'échelle de sa plus grande composante : la similarité cosinus n'en
+    dépend pas, aucune échelle n'est donc à conserver côté requête.
+
+    La même transformation doit être appliquée aux documents et aux requêtes :
+    l'instance ajustée est sauvegardée (`save`) par DocumentProcessor et
+    rechargée (`load`) par RAGTool.
+    """
+
+    DTYPES = ("float32", "float16", "int8")
+    REDUCTIONS = ("pca", "truncate")
+
+    def __init__(self, dtype: str = "float16", dim: Optional[int] = None, reduction: str = "pca"):
+        """Initialise un compresseur non ajusté.
+
+        Args:
+            dtype: Type de stockage ("float32", "float16" ou "int8").
+            dim: Dimension après réduction (None = pas de réduction).
+            reduction: "pca" ou "truncate".
+        """
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Type de stockage inconnu : {dtype}, utilisez {', '.join(self.DTYPES)}")
+        if reduction not in self.REDUCTIONS:
+            raise ValueError(f"Réduction inconnue : {reduction}, utilisez {', '.join(self.REDUCTIONS)}")
+        self.dtype = dtype
+        self.dim = dim
+        self.reduction = reduction
+
+        self.input_dim = None
+        self.mean = None
+        self.components = None
+
+    @property
+    def fitted(self) -> bool:
+        return self.input_dim is not None
+
+    @property
+    def output_dim(self) -> int:
+        if not self.fitted:
+            raise ValueError("Le compresseur n'est pas ajusté")
+        return self.input_dim if self.dim is None else min(self.dim, self.input_dim)
+
+    @property
+    def bytes_per_vector(self) -> int:
+        """Taille d'un vecteur stocké, en octets."""
+        return self.output_dim * np.dtype(self.dtype).itemsize
+
+    def fit(self, vectors: np.ndarray) -> "VectorCompressor":
+        """Ajuste la réduction sur un échantillon d'embeddings pleine précision.
+
+        Args:
+            vectors: Matrice (n, dimension d'origine).
+
+        Returns:
+            L'instance, pour chaîner les appels.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.input_dim = vectors.shape[1]
+        self.mean, self.components = None, None
+        if self.reduction == "pca" and self.output_dim < self.input_dim:
+            if len(vectors) < self.output_dim:
+                raise ValueError(f"L'ACP à {self.output_dim} dimensions nécessite au moins autant de vecteurs ({len(vectors)} fournis)")
+            self.mean = vectors.mean(axis=0)
+            _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+            self.components = np.ascontiguousarray(vt[:self.output_dim].T)
+        return self
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """Réduit et normalise des vecteurs pleine précision (documents ou requêtes).
+
+        Args:
+            vectors: Un vecteur ou une matrice de vecteurs.
+
+        Returns:
+            Vecteur(s) float32 de dimension `output_dim`, de norme 1.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        single = vectors.ndim == 1
+        vectors = np.atleast_2d(vectors)
+        if self.components is not None:
+            vectors = (vectors - self.mean) @ self.components
+        else:
+            vectors = vectors[:, :self.output_dim]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        return vectors[0] if single else vectors
+
+    def quantize(self, vectors: np.ndarray) -> np.ndarray:
+        """Convertit des vecteurs transformés dans le type de stockage."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dtype != "int8":
+            return vectors.astype(self.dtype)
+        scale = np.abs(vectors).max(axis=-1, keepdims=True)
+        scale[scale == 0] = 1.0
+        return np.round(vectors / scale * 127).astype(np.int8)
+
+    def to_bson(self, vector: np.ndarray):
+        """Encode un vecteur transformé en vecteur binaire BSON pour MongoDB Atlas.
+
+        Le float16 n'existant pas en BSON, il est stocké en float32 (deux fois
+        plus compact que la liste de doubles d'origine).
+        """
+        from bson.binary import Binary, BinaryVectorDtype
+
+        if self.dtype == "int8":
+            return Binary.from_vector(self.quantize(vector).tolist(), BinaryVectorDtype.INT8)
+        return Binary.from_vector(np.asarray(vector, dtype=np.float32).tolist(), BinaryVectorDtype.FLOAT32)
+
+    def save(self, path: str):
+        """Écrit les paramètres du compresseur dans un fichier .npz, de façon atomique."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {
+            "dtype": np.array(self.dtype),
+            "dim": np.array(-1 if self.dim is None else self.dim),
+            "reduction": np.array(self.reduction),
+            "input_dim": np.array(self.input_dim),
+        }
+        if self.components is not None:
+            arrays.update(mean=self.mean, components=self.components)
+        # Fichier temporaire puis remplacement : RAGTool ne lit jamais un compresseur à moitié écrit
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "VectorCompressor":
+        """Charge un compresseur écrit par `save`."""
+        with np.load(path) as data:
+            dim = int(data["dim"])
+            compressor = cls(str(data["dtype"]), None if dim < 0 else dim, str(data["reduction"]))
+            compressor.input_dim = int(data["input_dim"])
+            if "components" in data:
+                compressor.mean = data["mean"]
+                compressor.components = data["components"]
+        return compressor
+
+
+class CompressedEmbeddings(Embeddings):
+    """Applique la transformation d'un VectorCompressor à un modèle d'embedding.
+
+    Sert de modèle aux magasins de vecteurs dont les documents ont été compressés,
+    pour que leurs propres appels à embed_query restent dans le même espace.
+    """
+
+    def __init__(self, embeddings: Embeddings, compressor: VectorCompressor):
+        self.embeddings = embeddings
+        self.compressor = compressor
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.compressor.transform(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.compressor.transform(np.asarray(self.embeddings.embed_query(text), dtype=np.float32)).tolist()
@@ -21,4 +21,29 @@ def setup_PATH_and_connect_to_local_mongodb_db(config_file: dict):
     except Exception as e:
         print(f"Error connecting to local MongoDB: {e}")
     
-    return db
\ No newline at end of file
+    return db
+
+
+def connect_async_db(config_file: str):
+    """Ouvre la même base que setup_PATH_and_connect_to_local_mongodb_db avec le pilote asynchrone de pymongo.
+
+    Args:
+        config_file: Chemin du fichier de configuration JSON.
+
+    Returns:
+        La base DPLN_RAG (AsyncMongoClient), ou None en cas d'erreur.
+    """
+    from pymongo import AsyncMongoClient
+
+    with open(config_file, "r", encoding="utf-8") as f:
+        config_data = json.load(f)
+
+    db = None
+    try:
+        client = AsyncMongoClient(config_data["Atlas_MongoDB"]["address"] + config_data["Atlas_MongoDB"]["pass"] + config_data["Atlas_MongoDB"]["db_name"])
+        db = client["DPLN_RAG"]
+        print("Connected to MongoDB (async)")
+    except Exception as e:
+        print(f"Error connecting to MongoDB (async): {e}")
+    
+    return db
@@ -0,0 +1,30 @@
+import re
+import zlib
+
+
+# Fonctions de similarité lexicale partagées par ContextPacker (doublons et MMR au moment de la
+# requête) et NearDuplicates (MinHash à l'ingestion)
+
+WORD_PATTERN = re.compile(r"\w+")
+SOURCE_PREFIX = re.compile(r"^Source: [^\n]*\n+")
+
+
+def shingles(text: str, size: int = 3) -> frozenset:
+    """Ensemble (haché) des suites de `size` mots d'un texte, en minuscules."""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return frozenset(zlib.crc32(w.encode("utf-8")) for w in words)
+    return frozenset(zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def containment(a: frozenset, b: frozenset) -> float:
+    """Part du plus petit ensemble contenue dans l'autre (1.0 si un chunk en recouvre un autre)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
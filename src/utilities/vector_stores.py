@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+# Champs des documents des collections Vec_* (backend "atlas"), fixés explicitement :
+# DocumentProcessor écrit les documents et RAGTool les relit sans passer par le magasin
+TEXT_KEY = "text"
+EMBEDDING_KEY = "embedding"
+
+def create_vector_store(
+    backend: str,
+    embedding: Embeddings,
+    database=None,
+    collection_name: str = "Vec_Dungeons",
+    index_name: str = "embedding",
+    local_dir: str = None,
+    dtype: str = "float32"
+) -> VectorStore:
+    """Crée le magasin de vecteurs d'une collection selon le backend choisi.
+
+    Args:
+        backend: "atlas" (MongoDBAtlasVectorSearch) ou "local" (LocalVectorStore).
+        embedding: Modèle d'embedding.
+        database: Base MongoDB, requise pour le backend "atlas".
+        collection_name: Nom de la collection (et du sous-dossier de l'instantané local).
+        index_name: Nom de l'index vectoriel Atlas.
+        local_dir: Dossier racine des instantanés locaux, requis pour le backend "local".
+        dtype: Type de stockage des vecteurs du backend "local" ("float32", "float16" ou "int8").
+
+    Returns:
+        Un magasin de vecteurs LangChain.
+    """
+    match backend:
+        case "atlas":
+            from langchain_mongodb import MongoDBAtlasVectorSearch
+            return MongoDBAtlasVectorSearch(
+                embedding=embedding,
+                collection=database[collection_name],
+                index_name=index_name,
+                text_key=TEXT_KEY,
+                embedding_key=EMBEDDING_KEY,
+                relevance_score_fn="cosine",
+            )
+        case "local":
+            from utilities.LocalVectorStore import LocalVectorStore
+            if local_dir is None:
+                raise ValueError("Le backend 'local' nécessite un dossier local_dir")
+            return LocalVectorStore(embedding=embedding, path=str(Path(local_dir) / collection_name), dtype=dtype)
+        case _:
+            raise ValueError(f"Backend de vecteurs inconnu : {backend}, utilisez 'atlas' ou 'local'")